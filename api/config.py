@@ -9,5 +9,23 @@ INFLUXDB_ORG = os.getenv("INFLUXDB_ORG", "iptv")
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET", "metrics")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# 实时状态来源：redis（状态流）或 uds（与探针同机时经 Unix 域套接字直连，见 probe/config.py）
+STATUS_TRANSPORT = os.getenv("STATUS_TRANSPORT", "redis")
+STATUS_SOCKET = os.getenv("STATUS_SOCKET", "/run/iptv/status.sock")
 SQLITE_PATH = os.getenv("SQLITE_PATH", "/data/db/iptv.db")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
 THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "/data/thumbnails")
+METRICS_CACHE_TTL_SEC = float(os.getenv("METRICS_CACHE_TTL_SEC", "5"))
+
+# InfluxDB 降采样层："窗口:保留天数"，逗号分隔、由细到粗；留空则不建降采样层
+INFLUX_ROLLUPS = [
+    (every, int(days))
+    for every, _, days in (t.strip().partition(":") for t in os.getenv("INFLUX_ROLLUPS", "1m:90,1h:730").split(","))
+    if every
+]
+# 原始数据桶保留天数；0 表示不修改现有保留策略
+INFLUX_RAW_RETENTION_DAYS = int(os.getenv("INFLUX_RAW_RETENTION_DAYS", "0"))
+# 探针健康频道的导出间隔（与 probe/config.py 一致），sparkline 步长不低于此值
+INFLUX_EXPORT_INTERVAL_SEC = int(os.getenv("INFLUX_EXPORT_INTERVAL_SEC", "10"))
+# 探针写入的本地环形存储（只读挂载），覆盖范围内的历史查询不经过 Influx；留空则不用
+RING_DIR = os.getenv("RING_DIR", "/data/ring")
@@ -1,15 +1,64 @@
+import asyncio
+import collections
 import logging
-from typing import List
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
 
-from config import INFLUXDB_BUCKET, INFLUXDB_ORG, INFLUXDB_TOKEN, INFLUXDB_URL
-from models.channel import MetricPoint
+from config import (
+    INFLUX_EXPORT_INTERVAL_SEC,
+    INFLUXDB_BUCKET,
+    INFLUXDB_ORG,
+    INFLUXDB_TOKEN,
+    INFLUXDB_URL,
+    METRICS_CACHE_TTL_SEC,
+)
+from db import ring
+from db.downsample import lttb
+from db.rollup import FLUX_IMPORTS, WEIGHT_FIELD, Tier, select_tier, weighted_mean
 
 logger = logging.getLogger(__name__)
 
 _client: InfluxDBClientAsync | None = None
 
+METRICS_CACHE_MAX_ENTRIES = 256
+# 增量刷新时与缓存尾部重叠的时长，覆盖探针批量写入造成的迟到点
+TAIL_OVERLAP = 10
+# 聚合后行数约为目标点数的倍数，留给 LTTB 挑选尖峰
+LTTB_OVERSAMPLE = 4
+
+_RANGE_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+# 均值聚合的连续量；错误计数、告警标志与状态码（0 正常 / 1 警告 / 2 告警 / 3 离线）
+# 取窗口最大值，避免尖峰被平均掉。探针聚合的点里同名字段是窗口均值 / 最后状态，
+# 窗口极值在 *_max（status_code_max）中，原始桶按 max 聚合时一并读取
+_MEAN_FIELDS = ("bitrate_kbps", "pcr_jitter_ms", "video_brightness", "audio_rms")
+_MAX_FIELDS = ("cc_errors_per_sec", "is_black", "is_frozen", "is_silent", "status_code")
+METRIC_FIELDS = _MEAN_FIELDS + _MAX_FIELDS
+
+MetricsKey = Tuple[str, str, int, Optional[str]]  # (channel_id, range, points, resolution)
+
+
+@dataclass
+class _MetricsEntry:
+    times: np.ndarray  # epoch 秒
+    columns: Dict[str, np.ndarray]
+    fetched_at: float
+    result: Dict = field(default_factory=dict)
+
+
+_metrics_cache: "collections.OrderedDict[MetricsKey, _MetricsEntry]" = collections.OrderedDict()
+_inflight: Dict[tuple, asyncio.Task] = {}
+
+SparklineKey = Tuple[Tuple[str, ...], str, int, str]  # (频道, 范围, 点数, 字段)
+_sparkline_cache: "collections.OrderedDict[SparklineKey, Tuple[float, Dict]]" = collections.OrderedDict()
+
 
 async def get_influx() -> InfluxDBClientAsync:
     global _client
@@ -29,39 +78,288 @@ async def close_influx():
         _client = None
 
 
-async def query_channel_metrics(channel_id: str, range_str: str = "5m") -> List[MetricPoint]:
-    try:
-        client = await get_influx()
-        query_api = client.query_api()
-        flux = f"""
-from(bucket: "{INFLUXDB_BUCKET}")
-  |> range(start: -{range_str})
-  |> filter(fn: (r) => r._measurement == "channel_metrics")
-  |> filter(fn: (r) => r.channel_id == "{channel_id}")
-  |> filter(fn: (r) => r._field =~ /bitrate_kbps|cc_errors_per_sec|pcr_jitter_ms|video_brightness|audio_rms|is_black|is_frozen|is_silent|status/)
+def _parse_range(range_str: str) -> timedelta:
+    return timedelta(**{_RANGE_UNITS[range_str[-1]]: int(range_str[:-1])})
+
+
+def _metrics_window(range_str: str, points: int, resolution: Optional[str]) -> int:
+    """聚合窗口秒数：使行数不超过 points * LTTB_OVERSAMPLE，resolution 为下限；1 表示原始点"""
+    span = _parse_range(range_str).total_seconds()
+    window = max(1, math.ceil(span / (points * LTTB_OVERSAMPLE)))
+    if resolution:
+        window = max(window, int(_parse_range(resolution).total_seconds()))
+    return window
+
+
+def _regex(names) -> str:
+    return "/^(" + "|".join(names) + ")$/"
+
+
+def _segments(start: int, stop: int, window: int, tier: Optional[Tier]) -> List[Tuple[str, bool, int, int]]:
+    """(bucket, 是否降采样层, 起, 止)：降采样层只覆盖到任务已完成的窗口，之后的部分查原始桶"""
+    if tier is None:
+        return [(INFLUXDB_BUCKET, False, start, stop)]
+    cutoff = min(tier.complete_until(time.time()) // window * window, stop)
+    if cutoff <= start:
+        return [(INFLUXDB_BUCKET, False, start, stop)]
+    segments = [(tier.bucket, True, start, cutoff)]
+    if cutoff < stop:
+        segments.append((INFLUXDB_BUCKET, False, cutoff, stop))
+    return segments
+
+
+def _windowed(segments, channel_filter: str, fields, fn: str, window: int) -> List[str]:
+    """各时间段按窗口聚合的 Flux 表达式（需 FLUX_IMPORTS）；降采样层取与 fn 同名的 agg 序列，
+    原始桶取 min/max 时把探针聚合点的 *_min/*_max 并入同名字段，mean 按 samples 加权"""
+    out = []
+    for bucket, rollup, start, stop in segments:
+        agg = f' and r.agg == "{fn}"' if rollup else ""
+        if fn == "mean":
+            # 加权均值不生成空窗口，缺数据的窗口由调用方按 None 处理
+            out.append(f"""from(bucket: "{bucket}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "channel_metrics" and {channel_filter})
+  |> filter(fn: (r) => r._field =~ {_regex((*fields, WEIGHT_FIELD))}{agg}){weighted_mean(f"{window}s")}""")
+            continue
+        names, fold = _regex(fields), ""
+        if not rollup and fn in ("min", "max"):
+            names = "/^(" + "|".join(fields) + f")(_{fn})?$/"
+            fold = f'\n  |> map(fn: (r) => ({{r with _field: strings.trimSuffix(v: r._field, suffix: "_{fn}")}}))'
+        # 按 channel_id/_field 重新分组：兼容尚未迁移、带 channel_name/status 标签的旧数据
+        out.append(f"""from(bucket: "{bucket}")
+  |> range(start: {start}, stop: {stop})
+  |> filter(fn: (r) => r._measurement == "channel_metrics" and {channel_filter})
+  |> filter(fn: (r) => r._field =~ {names}{agg}){fold}
+  |> group(columns: ["channel_id", "_field"])
+  |> aggregateWindow(every: {window}s, fn: {fn}, createEmpty: false, timeSrc: "_start")""")
+    return out
+
+
+async def _fetch_metrics(
+    channel_id: str, start: int, window: int, tier: Optional[Tier]
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    channel_filter = f'r.channel_id == "{channel_id}"'
+    pivot = """
   |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
   |> sort(columns: ["_time"])
 """
-        tables = await query_api.query(flux)
-        points = []
-        for table in tables:
-            for record in table.records:
-                values = record.values
-                points.append(
-                    MetricPoint(
-                        time=str(record.get_time()),
-                        bitrate_kbps=float(values.get("bitrate_kbps", 0) or 0),
-                        cc_errors_per_sec=float(values.get("cc_errors_per_sec", 0) or 0),
-                        pcr_jitter_ms=float(values.get("pcr_jitter_ms", 0) or 0),
-                        video_brightness=float(values.get("video_brightness", 0) or 0),
-                        audio_rms=float(values.get("audio_rms", 0) or 0),
-                        is_black=int(values.get("is_black", 0) or 0),
-                        is_frozen=int(values.get("is_frozen", 0) or 0),
-                        is_silent=int(values.get("is_silent", 0) or 0),
-                        status=str(values.get("status", "NORMAL") or "NORMAL"),
-                    )
-                )
-        return points
+    stop = int(time.time()) + 1
+    # 窗口为 1 秒时同样走 aggregateWindow：原始桶里的聚合点需要并入 *_max
+    segments = _segments(start, stop, window, tier)
+    tables = (
+        _windowed(segments, channel_filter, _MEAN_FIELDS, "mean", window)
+        + _windowed(segments, channel_filter, _MAX_FIELDS, "max", window)
+    )
+    names = [f"t{i}" for i in range(len(tables))]
+    flux = FLUX_IMPORTS + "".join(f"{n} = {t}\n" for n, t in zip(names, tables))
+    flux += f"union(tables: [{', '.join(names)}])\n  |> group(){pivot}"
+
+    client = await get_influx()
+    tables = await client.query_api().query(flux)
+    times: List[float] = []
+    rows: Dict[str, List[float]] = {f: [] for f in METRIC_FIELDS}
+    for table in tables:
+        for record in table.records:
+            values = record.values
+            times.append(record.get_time().timestamp())
+            for f, column in rows.items():
+                v = values.get(f)
+                column.append(np.nan if v is None else float(v))
+    return np.asarray(times, dtype=np.float64), {f: np.asarray(c, dtype=np.float64) for f, c in rows.items()}
+
+
+def _downsample(times: np.ndarray, columns: Dict[str, np.ndarray], points: int) -> Dict[str, Dict[str, list]]:
+    """每个字段独立做 LTTB，返回列式 {field: {time: [...], value: [...]}}"""
+    series = {}
+    for f, values in columns.items():
+        valid = ~np.isnan(values)
+        t, v = times[valid], values[valid]
+        idx = lttb(t, v, points)
+        series[f] = {
+            "time": t[idx].astype(np.int64).tolist(),
+            "value": np.round(v[idx], 4).tolist(),
+        }
+    return series
+
+
+async def _refresh_metrics(key: MetricsKey, entry: Optional[_MetricsEntry]) -> Dict:
+    channel_id, range_str, points, resolution = key
+    window = _metrics_window(range_str, points, resolution)
+    now = time.time()
+    window_start = now - _parse_range(range_str).total_seconds()
+    tier = select_tier(window_start, window, now) if window > 1 else None
+    if tier:
+        window = math.ceil(window / tier.every_sec) * tier.every_sec
+    bucket = tier.bucket if tier else INFLUXDB_BUCKET
+    local = await asyncio.to_thread(_ring_metrics, channel_id, window_start, window)
+    if local is not None:
+        # 范围在探针本地环形存储内：逐秒原始数据，直接按窗口聚合
+        times, columns = local
+        bucket = "ring"
+    else:
+        fetched = await _influx_metrics(channel_id, window, window_start, tier, bucket, entry)
+        if fetched is None:
+            return entry.result
+        times, columns = fetched
+
+    result = {
+        "channel_id": channel_id,
+        "range": range_str,
+        "window_sec": window,
+        "bucket": bucket,
+        "series": _downsample(times, columns, points),
+    }
+    _metrics_cache[key] = _MetricsEntry(times, columns, time.monotonic(), result)
+    _metrics_cache.move_to_end(key)
+    while len(_metrics_cache) > METRICS_CACHE_MAX_ENTRIES:
+        _metrics_cache.popitem(last=False)
+    return result
+
+
+def _ring_metrics(
+    channel_id: str, window_start: float, window: int
+) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    start = int(window_start) // window * window
+    stop = (int(time.time()) // window + 1) * window
+    raw = ring.read(channel_id, start, stop, METRIC_FIELDS, int(window_start))
+    if raw is None:
+        return None
+    columns = {f: ring.pool(v, window, "mean" if f in _MEAN_FIELDS else "max") for f, v in raw.items()}
+    times = np.arange(start, stop, window, dtype=np.float64)
+    return times, columns
+
+
+async def _influx_metrics(
+    channel_id: str, window: int, window_start: float, tier: Optional[Tier], bucket: str,
+    entry: Optional[_MetricsEntry],
+) -> Optional[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """查询失败且有旧缓存时返回 None"""
+    try:
+        if (
+            entry and len(entry.times) and entry.times[-1] > window_start
+            and entry.result.get("window_sec") == window and entry.result.get("bucket") == bucket
+        ):
+            # 增量：只取缓存尾部（减去重叠）之后的点，替换重叠部分并裁掉窗口外的头部；
+            # 起点对齐到聚合窗口边界，避免首个窗口只聚合了部分数据
+            tail = int(entry.times[-1] - TAIL_OVERLAP) // window * window
+            new_times, new_columns = await _fetch_metrics(channel_id, tail, window, tier)
+            keep = (entry.times >= window_start) & (entry.times < tail)
+            times = np.concatenate([entry.times[keep], new_times])
+            columns = {f: np.concatenate([entry.columns[f][keep], new_columns[f]]) for f in METRIC_FIELDS}
+        else:
+            start = int(window_start) // window * window
+            times, columns = await _fetch_metrics(channel_id, start, window, tier)
     except Exception as e:
         logger.warning("InfluxDB query error: %s", e)
-        return []
+        if entry:
+            return None
+        times, columns = np.empty(0), {f: np.empty(0) for f in METRIC_FIELDS}
+    return times, columns
+
+
+async def query_channel_metrics(
+    channel_id: str, range_str: str = "5m", points: int = 300, resolution: Optional[str] = None
+) -> Dict:
+    """频道历史指标：按范围与目标点数选择聚合窗口，再逐字段 LTTB 降到 points 个点。
+
+    Influx 返回行数与 pydantic 校验量都只取决于 points，与范围长短无关。
+    带 TTL 缓存；相同参数的并发请求共享同一次 Influx 查询。
+    """
+    key = (channel_id, range_str, points, resolution)
+    entry = _metrics_cache.get(key)
+    if entry and time.monotonic() - entry.fetched_at < METRICS_CACHE_TTL_SEC:
+        return entry.result
+    return await _single_flight(key, lambda: _refresh_metrics(key, entry))
+
+
+async def _single_flight(key: tuple, factory):
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield：发起请求的客户端断开不会取消其他等待者共享的查询
+    return await asyncio.shield(task)
+
+
+async def _fetch_sparklines(key: SparklineKey) -> Dict:
+    channel_ids, range_str, points, field = key
+    span = int(_parse_range(range_str).total_seconds())
+    # 健康频道每 INFLUX_EXPORT_INTERVAL_SEC 才有一个点，更细的步长只会产生空洞
+    step = max(INFLUX_EXPORT_INTERVAL_SEC, math.ceil(span / points))
+    tier = select_tier(time.time() - span, step)
+    if tier:
+        step = math.ceil(step / tier.every_sec) * tier.every_sec
+        points = math.ceil(span / step)
+    # 网格对齐到 step 整数倍，所有频道共用同一组时间戳
+    stop = (int(time.time()) // step + 1) * step
+    start = stop - step * points
+    series = await asyncio.to_thread(_ring_sparklines, channel_ids, start, stop, step, field)
+    if series is None:
+        series = await _influx_sparklines(channel_ids, start, stop, step, tier, field)
+    result = {
+        "field": field,
+        "start": start,
+        "step": step,
+        "times": list(range(start, stop, step)),
+        "series": series,
+    }
+    _sparkline_cache[key] = (time.monotonic(), result)
+    _sparkline_cache.move_to_end(key)
+    while len(_sparkline_cache) > METRICS_CACHE_MAX_ENTRIES:
+        _sparkline_cache.popitem(last=False)
+    return result
+
+
+def _ring_sparklines(
+    channel_ids: Tuple[str, ...], start: int, stop: int, step: int, field: str
+) -> Optional[Dict[str, List[Optional[float]]]]:
+    """全部频道都在本地环形存储覆盖范围内时直接从中聚合，否则返回 None"""
+    series = {}
+    for cid in channel_ids:
+        raw = ring.read(cid, start, stop, (field,))
+        if raw is None:
+            return None
+        values = np.round(ring.pool(raw[field], step, "mean"), 1)
+        series[cid] = [None if v != v else v for v in values.tolist()]
+    return series
+
+
+async def _influx_sparklines(
+    channel_ids: Tuple[str, ...], start: int, stop: int, step: int, tier: Optional[Tier], field: str
+) -> Dict[str, List[Optional[float]]]:
+    id_filter = "|".join(re.escape(cid) for cid in channel_ids)
+    tables = _windowed(
+        _segments(start, stop, step, tier), f"r.channel_id =~ /^({id_filter})$/", (field,), "mean", step
+    )
+    names = [f"t{i}" for i in range(len(tables))]
+    flux = FLUX_IMPORTS + "".join(f"{n} = {t}\n" for n, t in zip(names, tables))
+    flux += f'union(tables: [{", ".join(names)}])\n  |> keep(columns: ["_time", "_value", "channel_id"])\n'
+    points = (stop - start) // step
+    series: Dict[str, List[Optional[float]]] = {cid: [None] * points for cid in channel_ids}
+    try:
+        client = await get_influx()
+        tables = await client.query_api().query(flux)
+    except Exception as e:
+        logger.warning("InfluxDB sparkline query error: %s", e)
+        tables = []
+    for table in tables:
+        for record in table.records:
+            values = series.get(record.values.get("channel_id"))
+            idx = (int(record.get_time().timestamp()) - start) // step
+            if values is not None and 0 <= idx < points and record.get_value() is not None:
+                values[idx] = round(float(record.get_value()), 1)
+    return series
+
+
+async def query_sparklines(
+    channel_ids: List[str], range_str: str = "15m", points: int = 60, field: str = "bitrate_kbps"
+) -> Dict:
+    """多频道迷你曲线：一次 Flux 查询按公共时间网格聚合，返回列式数组（缺数据的窗口为 None）"""
+    key = (tuple(sorted(set(channel_ids))), range_str, points, field)
+    if not key[0]:
+        return {"field": field, "start": 0, "step": 0, "times": [], "series": {}}
+    cached = _sparkline_cache.get(key)
+    if cached and time.monotonic() - cached[0] < METRICS_CACHE_TTL_SEC:
+        return cached[1]
+    return await _single_flight(("sparklines",) + key, lambda: _fetch_sparklines(key))
@@ -1,8 +1,53 @@
+import json
+import time
+from typing import Any, Dict, List
+
 import redis.asyncio as aioredis
 from config import REDIS_URL
 
 _redis_pool: aioredis.Redis | None = None
 
+STATUS_TTL = 30
+
+# 探针写入时原子维护的频道状态索引（见 probe/storage/redis_writer.py）
+INDEX_KEY = "channels:index"                  # zset: channel_id -> updated_at
+LAST_STATUS_KEY = "channels:last_status"      # hash: channel_id -> status
+STATUS_COUNTS_KEY = "channels:status_counts"  # hash: status -> 频道数
+
+# 探针事件流，条目为 {"data": <JSON 消息>}
+STATUS_STREAM = "stream:status"
+ALERT_STREAM = "stream:alerts"
+
+INFLUX_WRITER_STATS_KEY = "probe:influx_writer"  # hash: worker_id -> JSON 统计
+
+# 剔除超过 TTL 未更新的频道（状态 hash 已过期）并返回 (在线总数, 状态计数)
+# KEYS: 索引, last_status, status_counts；ARGV: cutoff
+_OVERVIEW_LUA = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+for _, cid in ipairs(stale) do
+  local prev = redis.call('HGET', KEYS[2], cid)
+  if prev then
+    redis.call('HINCRBY', KEYS[3], prev, -1)
+    redis.call('HDEL', KEYS[2], cid)
+  end
+end
+if #stale > 0 then
+  redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+end
+return {redis.call('ZCARD', KEYS[1]), redis.call('HGETALL', KEYS[3])}
+"""
+
+# 删除频道时同步移出索引与计数；KEYS: 状态 hash, 索引, last_status, status_counts；ARGV: channel_id
+_FORGET_LUA = """
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+local prev = redis.call('HGET', KEYS[3], ARGV[1])
+if prev then
+  redis.call('HINCRBY', KEYS[4], prev, -1)
+  redis.call('HDEL', KEYS[3], ARGV[1])
+end
+"""
+
 
 async def get_redis() -> aioredis.Redis:
     global _redis_pool
@@ -11,6 +56,53 @@ async def get_redis() -> aioredis.Redis:
     return _redis_pool
 
 
+async def get_channel_statuses(channel_ids: List[str]) -> Dict[str, Dict[str, str]]:
+    """一次 pipeline 读取多个频道的状态 hash；无状态的频道不出现在结果中"""
+    if not channel_ids:
+        return {}
+    redis = await get_redis()
+    pipe = redis.pipeline(transaction=False)
+    for channel_id in channel_ids:
+        pipe.hgetall(f"channel:{channel_id}:status")
+    return {cid: data for cid, data in zip(channel_ids, await pipe.execute()) if data}
+
+
+async def get_live_channel_statuses() -> Dict[str, Dict[str, str]]:
+    """索引中 TTL 内有更新的全部频道状态，两次往返"""
+    redis = await get_redis()
+    channel_ids = await redis.zrangebyscore(INDEX_KEY, time.time() - STATUS_TTL, "+inf")
+    return await get_channel_statuses(channel_ids)
+
+
+async def get_status_overview() -> Dict[str, int]:
+    redis = await get_redis()
+    overview = redis.register_script(_OVERVIEW_LUA)
+    total, flat = await overview(
+        keys=[INDEX_KEY, LAST_STATUS_KEY, STATUS_COUNTS_KEY], args=[time.time() - STATUS_TTL]
+    )
+    stats = {"NORMAL": 0, "WARNING": 0, "ALARM": 0, "OFFLINE": 0}
+    for status, count in zip(flat[::2], flat[1::2]):
+        if status in stats:
+            stats[status] = int(count)
+    stats["total"] = int(total)
+    return stats
+
+
+async def get_influx_writer_stats() -> List[Dict[str, Any]]:
+    """各探针 worker 的 Influx 写入与磁盘缓冲统计（由探针每 5 秒上报）"""
+    redis = await get_redis()
+    raw = await redis.hgetall(INFLUX_WRITER_STATS_KEY)
+    return sorted((json.loads(v) for v in raw.values()), key=lambda s: s.get("worker_id", 0))
+
+
+async def forget_channel(channel_id: str):
+    redis = await get_redis()
+    forget = redis.register_script(_FORGET_LUA)
+    await forget(
+        keys=[f"channel:{channel_id}:status", INDEX_KEY, LAST_STATUS_KEY, STATUS_COUNTS_KEY], args=[channel_id]
+    )
+
+
 async def close_redis():
     global _redis_pool
     if _redis_pool:
@@ -0,0 +1,110 @@
+"""读取探针写入的本地环形存储（probe/storage/ring_store.py）。
+
+每个频道一个目录，每个指标一个定长 .npy 文件，以只读内存映射打开；
+槽位 = 采样秒 % 容量，ts.npy 中的秒数与期望一致才是有效数据；
+since 文件为环开始写入的时刻，更早的范围不由环形存储回答。
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+from config import RING_DIR
+
+logger = logging.getLogger(__name__)
+
+TS_COLUMN = "ts"
+SINCE_FILE = "since"
+
+
+@dataclass
+class _Ring:
+    stamp: int  # since 文件的修改时间；探针重建任一列时重写，需要重新映射
+    since: int
+    columns: Dict[str, np.ndarray]
+
+
+_rings: Dict[str, _Ring] = {}
+
+
+def _open(channel_id: str) -> Optional[_Ring]:
+    directory = os.path.join(RING_DIR, quote(channel_id, safe=""))
+    try:
+        stamp = os.stat(os.path.join(directory, SINCE_FILE)).st_mtime_ns
+    except OSError:
+        _rings.pop(channel_id, None)
+        return None
+    cached = _rings.get(channel_id)
+    if cached and cached.stamp == stamp:
+        return cached
+    try:
+        with open(os.path.join(directory, SINCE_FILE)) as f:
+            since = int(f.read())
+        columns = {
+            name[:-4]: np.load(os.path.join(directory, name), mmap_mode="r")
+            for name in os.listdir(directory)
+            if name.endswith(".npy")
+        }
+    except Exception as e:
+        logger.warning("Ring store for %s unreadable: %s", channel_id, e)
+        return None
+    _rings[channel_id] = _Ring(stamp, since, columns)
+    return _rings[channel_id]
+
+
+def _slice(arr: np.ndarray, start: int, n: int) -> np.ndarray:
+    """环上 [start, start + n) 秒对应的槽位；不跨越环尾时为零拷贝视图"""
+    capacity = arr.shape[0]
+    a = start % capacity
+    if a + n <= capacity:
+        return arr[a:a + n]
+    return np.concatenate([arr[a:], arr[:a + n - capacity]])
+
+
+def read(
+    channel_id: str, start: int, stop: int, fields: Iterable[str], since: Optional[int] = None
+) -> Optional[Dict[str, np.ndarray]]:
+    """[start, stop) 内逐秒的指标列（float64，缺失为 NaN）。
+
+    since 为调用方真正需要的起点（默认 start），start 可为对齐到窗口边界的更早时刻，
+    超出环容量的部分补 NaN。频道没有环形存储、环未覆盖 since 之后的范围或缺少字段时
+    返回 None，由调用方改查 Influx。
+    """
+    if not RING_DIR or stop <= start:
+        return None
+    r = _open(channel_id)
+    if r is None or TS_COLUMN not in r.columns or any(f not in r.columns for f in fields):
+        return None
+    since = start if since is None else since
+    ts = r.columns[TS_COLUMN]
+    first = max(start, stop - ts.shape[0])
+    if since < max(first, r.since):
+        return None
+    n = stop - first
+    valid = _slice(ts, first, n) == np.arange(first, stop, dtype=np.uint32)
+    pad = first - start
+    return {
+        f: np.concatenate([
+            np.full(pad, np.nan), np.where(valid, _slice(r.columns[f], first, n).astype(np.float64), np.nan)
+        ])
+        for f in fields
+    }
+
+
+def pool(values: np.ndarray, window: int, how: str) -> np.ndarray:
+    """逐秒数据按 window 秒聚合为 mean / max，忽略 NaN；窗口内无数据为 NaN"""
+    if window <= 1:
+        return values
+    pad = -len(values) % window
+    grid = np.pad(values, (0, pad), constant_values=np.nan).reshape(-1, window)
+    valid = ~np.isnan(grid)
+    count = valid.sum(axis=1)
+    if how == "max":
+        out = np.where(valid, grid, -np.inf).max(axis=1)
+    else:
+        out = np.where(valid, grid, 0.0).sum(axis=1) / np.maximum(count, 1)
+    out[count == 0] = np.nan
+    return out
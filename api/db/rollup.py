@@ -0,0 +1,250 @@
+"""InfluxDB 降采样层。
+
+每层一个 bucket（如 metrics_1m、metrics_1h），由 Influx 任务从上一层按窗口聚合写入
+min/max/mean 三条序列（tag agg 区分），各层独立设置保留期。首层的 min/max 同时取
+探针聚合点的 *_min/*_max（status_code_max），窗口内的尖峰在各层都保留；mean 按 samples
+加权（见 weighted_mean），各层的 mean 序列另写 samples 供下一层加权。API 启动时创建或更新
+bucket 与任务，查询时由 select_tier 选出满足范围与分辨率的最粗一层。
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from influxdb_client import BucketRetentionRules, InfluxDBClient, TaskCreateRequest
+
+from config import (
+    INFLUX_RAW_RETENTION_DAYS,
+    INFLUX_ROLLUPS,
+    INFLUXDB_BUCKET,
+    INFLUXDB_ORG,
+    INFLUXDB_TOKEN,
+    INFLUXDB_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+# 探针写入的全部数值字段
+ROLLUP_FIELDS = (
+    "bitrate_kbps", "cc_errors_per_sec", "pcr_jitter_ms", "video_brightness", "audio_rms",
+    "is_black", "is_frozen", "is_silent", "is_clipping", "is_mosaic", "mosaic_ratio",
+    "is_stuttering", "stutter_count", "status_code", "rx_dropped_per_sec",
+)
+AGGREGATES = ("min", "max", "mean")
+WEIGHT_FIELD = "samples"  # 探针聚合点代表的采样数；降采样层的 mean 序列同样写入该字段
+
+FLUX_IMPORTS = 'import "experimental"\nimport "strings"\n'
+
+_UNIT_SEC = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _seconds(spec: str) -> int:
+    return int(spec[:-1]) * _UNIT_SEC[spec[-1]]
+
+
+def weighted_mean(every: str) -> str:
+    """按 samples 加权的窗口均值（接在 filter 之后的 Flux 管道片段）。
+
+    同一 bucket 里既有代表 N 个采样的聚合点，也有事故期间的逐秒点，等权平均会偏向逐秒点。
+    输入为若干字段与 samples 字段的行，没有 samples 的点按 1 计；输出每个
+    (channel_id, _field) 每窗口一行，_time 为窗口起点，samples 列为权重合计。
+    """
+    return f"""
+  |> toFloat()
+  |> keep(columns: ["_time", "_field", "_value", "channel_id"])
+  |> group(columns: ["channel_id"])
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> map(fn: (r) => ({{r with _w: if exists r.{WEIGHT_FIELD} then r.{WEIGHT_FIELD} else 1.0}}))
+  |> drop(fn: (column) => column == "{WEIGHT_FIELD}")
+  |> experimental.unpivot(otherColumns: ["_time", "_w"])
+  |> group(columns: ["channel_id", "_field"])
+  |> window(every: {every}, createEmpty: false)
+  |> reduce(
+      fn: (r, accumulator) => ({{sum: accumulator.sum + r._value * r._w, w: accumulator.w + r._w}}),
+      identity: {{sum: 0.0, w: 0.0}},
+  )
+  |> map(fn: (r) => ({{
+      _time: r._start, _measurement: "channel_metrics", channel_id: r.channel_id,
+      _field: r._field, _value: r.sum / r.w, {WEIGHT_FIELD}: r.w,
+  }}))
+  |> group(columns: ["_measurement", "channel_id", "_field"])"""
+
+
+@dataclass
+class Tier:
+    every: str
+    retention_days: int
+    bucket: str
+    source: str  # 聚合来源 bucket
+    ready_since: float = math.inf  # 该层数据覆盖的最早时刻；未完成配置前不参与选择
+
+    @property
+    def every_sec(self) -> int:
+        return _seconds(self.every)
+
+    @property
+    def offset_sec(self) -> int:
+        # 任务在窗口结束后延迟执行，等待探针批量写入的迟到点
+        return min(300, max(30, self.every_sec // 12))
+
+    @property
+    def task_name(self) -> str:
+        return f"rollup_{self.bucket}"
+
+    def complete_until(self, now: float) -> int:
+        """该层已由任务写入的窗口截止时刻"""
+        return int(now - self.offset_sec) // self.every_sec * self.every_sec
+
+    def task_flux(self) -> str:
+        fields = "|".join(ROLLUP_FIELDS)
+        first = self.source == INFLUXDB_BUCKET
+        outputs = []
+        for agg in AGGREGATES:
+            # 首层从原始点聚合，min/max 并入探针聚合点的 *_min/*_max；之后各层对上一层同名 agg 序列再聚合
+            agg_filter = "" if first else f' and r.agg == "{agg}"'
+            if agg == "mean":
+                # 按 samples 加权，并把权重合计写成本层的 samples，供下一层继续加权
+                outputs.append(f"""
+mean = from(bucket: "{self.source}")
+  |> range(start: -task.every)
+  |> filter(fn: (r) => r._measurement == "channel_metrics" and r._field =~ /^({fields}|{WEIGHT_FIELD})$/{agg_filter}){weighted_mean(self.every)}
+  |> set(key: "agg", value: "mean")
+mean
+  |> drop(columns: ["{WEIGHT_FIELD}"])
+  |> to(bucket: "{self.bucket}", org: "{INFLUXDB_ORG}", tagColumns: ["channel_id", "agg"])
+mean
+  |> filter(fn: (r) => r._field == "bitrate_kbps")
+  |> map(fn: (r) => ({{r with _field: "{WEIGHT_FIELD}", _value: r.{WEIGHT_FIELD}}}))
+  |> drop(columns: ["{WEIGHT_FIELD}"])
+  |> to(bucket: "{self.bucket}", org: "{INFLUXDB_ORG}", tagColumns: ["channel_id", "agg"])
+""")
+                continue
+            if first:
+                selector = f"r._field =~ /^({fields})(_{agg})?$/"
+                fold = f'\n  |> map(fn: (r) => ({{r with _field: strings.trimSuffix(v: r._field, suffix: "_{agg}")}}))'
+            else:
+                selector, fold = f"r._field =~ /^({fields})$/{agg_filter}", ""
+            outputs.append(f"""
+from(bucket: "{self.source}")
+  |> range(start: -task.every)
+  |> filter(fn: (r) => r._measurement == "channel_metrics" and {selector}){fold}
+  |> group(columns: ["_measurement", "channel_id", "_field"])
+  |> toFloat()
+  |> aggregateWindow(every: {self.every}, fn: {agg}, createEmpty: false, timeSrc: "_start")
+  |> set(key: "agg", value: "{agg}")
+  |> to(bucket: "{self.bucket}", org: "{INFLUXDB_ORG}", tagColumns: ["channel_id", "agg"])
+""")
+        header = FLUX_IMPORTS + f'option task = {{name: "{self.task_name}", every: {self.every}, offset: {self.offset_sec}s}}\n'
+        return header + "".join(outputs)
+
+
+def _build_tiers() -> List[Tier]:
+    tiers, source = [], INFLUXDB_BUCKET
+    for every, days in INFLUX_ROLLUPS:
+        bucket = f"{INFLUXDB_BUCKET}_{every}"
+        tiers.append(Tier(every=every, retention_days=days, bucket=bucket, source=source))
+        source = bucket
+    return tiers
+
+
+TIERS = _build_tiers()
+
+
+def select_tier(start: float, window: int, now: Optional[float] = None) -> Optional[Tier]:
+    """窗口不小于层粒度、且起点在该层数据覆盖范围内的最粗一层；None 表示查原始桶"""
+    now = time.time() if now is None else now
+    for tier in reversed(TIERS):
+        if (
+            tier.every_sec <= window
+            and start >= tier.ready_since
+            and start >= now - tier.retention_days * 86400
+        ):
+            return tier
+    return None
+
+
+def _ensure_bucket(client: InfluxDBClient, org_id: str, name: str, days: int):
+    api = client.buckets_api()
+    rules = [BucketRetentionRules(type="expire", every_seconds=days * 86400)]
+    bucket = api.find_bucket_by_name(name)
+    if bucket is None:
+        try:
+            api.create_bucket(bucket_name=name, retention_rules=rules, org_id=org_id)
+            logger.info("Created InfluxDB bucket %s (retention %dd)", name, days)
+            return
+        except Exception:
+            # 多个 API 进程同时启动时可能已被其他进程创建
+            bucket = api.find_bucket_by_name(name)
+            if bucket is None:
+                raise
+    current = bucket.retention_rules[0].every_seconds if bucket.retention_rules else 0
+    if current != days * 86400:
+        bucket.retention_rules = rules
+        api.update_bucket(bucket)
+        logger.info("Updated InfluxDB bucket %s retention to %dd", name, days)
+
+
+def _ensure_task(client: InfluxDBClient, org_id: str, tier: Tier):
+    api = client.tasks_api()
+    flux = tier.task_flux()
+    existing = api.find_tasks(name=tier.task_name, org_id=org_id)
+    if not existing:
+        api.create_task(task_create_request=TaskCreateRequest(
+            flux=flux, org_id=org_id, status="active", description=f"Rollup {tier.source} -> {tier.bucket}",
+        ))
+        logger.info("Created InfluxDB task %s", tier.task_name)
+        # 多个 API 进程同时启动时可能各建了一个，重新查询后去重
+        existing = api.find_tasks(name=tier.task_name, org_id=org_id)
+    # 各进程按 id 保留同一个，其余删除，否则重复的任务会一直运行旧的 Flux
+    task, *duplicates = sorted(existing, key=lambda t: t.id)
+    for dup in duplicates:
+        try:
+            api.delete_task(dup.id)
+            logger.info("Deleted duplicate InfluxDB task %s (%s)", tier.task_name, dup.id)
+        except Exception:
+            pass  # 已被其他进程删除
+    if task.flux != flux:
+        task.flux = flux
+        api.update_task(task)
+        logger.info("Updated InfluxDB task %s", tier.task_name)
+
+
+def _earliest(client: InfluxDBClient, tier: Tier) -> Optional[float]:
+    flux = f"""
+from(bucket: "{tier.bucket}")
+  |> range(start: 0)
+  |> filter(fn: (r) => r._measurement == "channel_metrics" and r._field == "bitrate_kbps" and r.agg == "mean")
+  |> first()
+"""
+    times = [r.get_time().timestamp() for t in client.query_api().query(flux) for r in t.records]
+    return min(times) if times else None
+
+
+def _provision_sync():
+    with InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG, timeout=10_000) as client:
+        org_id = client.organizations_api().find_organizations(org=INFLUXDB_ORG)[0].id
+        if INFLUX_RAW_RETENTION_DAYS > 0:
+            _ensure_bucket(client, org_id, INFLUXDB_BUCKET, INFLUX_RAW_RETENTION_DAYS)
+        for tier in TIERS:
+            _ensure_bucket(client, org_id, tier.bucket, tier.retention_days)
+            _ensure_task(client, org_id, tier)
+            # 新建的层从首个完整窗口开始有数据，之前的范围仍查更细的层
+            earliest = _earliest(client, tier)
+            tier.ready_since = earliest if earliest is not None else tier.complete_until(time.time()) + tier.every_sec
+
+
+async def provision_rollups():
+    """创建/更新降采样 bucket 与任务（管理 API 只有同步客户端，放到线程中执行）"""
+    if not TIERS and INFLUX_RAW_RETENTION_DAYS <= 0:
+        return
+    try:
+        await asyncio.to_thread(_provision_sync)
+        logger.info(
+            "InfluxDB rollup tiers ready: %s",
+            ", ".join(f"{t.bucket} since {time.strftime('%Y-%m-%d %H:%M', time.localtime(t.ready_since))}" for t in TIERS),
+        )
+    except Exception as e:
+        # 配置失败不影响启动，查询全部走原始桶
+        logger.warning("InfluxDB rollup provisioning failed: %s", e)
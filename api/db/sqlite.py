@@ -1,19 +1,109 @@
+import asyncio
+import collections
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List
+
 import aiosqlite
-from config import SQLITE_PATH
+from config import SQLITE_PATH, SQLITE_READ_POOL_SIZE
 
 _db: aiosqlite.Connection | None = None
+_write_lock = asyncio.Lock()
+
+
+class _ReadPool:
+    """只读连接池：归还时直接交给最早等待者，避免 asyncio.Queue 的插队饥饿"""
+
+    def __init__(self, conns: List[aiosqlite.Connection]):
+        self.conns = conns
+        self._free: Deque[aiosqlite.Connection] = collections.deque(conns)
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+
+    async def acquire(self) -> aiosqlite.Connection:
+        if self._free and not self._waiters:
+            return self._free.popleft()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(fut.result())
+            else:
+                self._waiters.remove(fut)
+            raise
+
+    def release(self, conn: aiosqlite.Connection):
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(conn)
+                return
+        self._free.append(conn)
+
+    async def close(self):
+        for conn in self.conns:
+            await conn.close()
+
+
+_read_pool: _ReadPool | None = None
+_pool_lock = asyncio.Lock()
 
 
 async def get_db() -> aiosqlite.Connection:
+    """写连接：仅用于 ack/CRUD/导入等修改型接口"""
     global _db
     if _db is None:
-        _db = await aiosqlite.connect(SQLITE_PATH)
-        _db.row_factory = aiosqlite.Row
+        async with _write_lock:
+            if _db is None:
+                db = await aiosqlite.connect(SQLITE_PATH)
+                db.row_factory = aiosqlite.Row
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA busy_timeout=5000")
+                _db = db
     return _db
 
 
+async def _open_reader() -> aiosqlite.Connection:
+    # 只读 URI 连接，每个连接有独立的后台线程，WAL 模式下读不阻塞写
+    db = await aiosqlite.connect(f"file:{SQLITE_PATH}?mode=ro", uri=True)
+    db.row_factory = aiosqlite.Row
+    await db.execute("PRAGMA query_only=1")
+    await db.execute("PRAGMA busy_timeout=5000")
+    return db
+
+
+async def _get_read_pool() -> _ReadPool:
+    global _read_pool
+    if _read_pool is None:
+        async with _pool_lock:
+            if _read_pool is None:
+                conns = [await _open_reader() for _ in range(max(1, SQLITE_READ_POOL_SIZE))]
+                _read_pool = _ReadPool(conns)
+    return _read_pool
+
+
+async def init_db():
+    """启动时预先打开写连接与只读连接池，避免首批请求排队建连"""
+    await get_db()
+    await _get_read_pool()
+
+
+@asynccontextmanager
+async def read_db() -> AsyncIterator[aiosqlite.Connection]:
+    """从只读连接池借出一个连接，用于查询型接口"""
+    pool = await _get_read_pool()
+    conn = await pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
 async def close_db():
-    global _db
+    global _db, _read_pool
     if _db:
         await _db.close()
         _db = None
+    if _read_pool:
+        await _read_pool.close()
+        _read_pool = None
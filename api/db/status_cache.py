@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from db.redis_client import STATUS_TTL, get_live_channel_statuses
+from db.sqlite import read_db
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_CONFIG_TTL_SEC = 30
+
+_FLOAT_FIELDS = {
+    "bitrate_kbps", "mosaic_ratio", "cc_errors_per_sec", "rx_dropped_per_sec", "pcr_jitter_ms",
+    "audio_rms", "video_brightness", "updated_at",
+}
+_INT_FIELDS = {"stutter_count"}
+_BOOL_FIELDS = {"is_black", "is_frozen", "is_silent", "is_clipping", "is_mosaic", "is_stuttering"}
+
+
+class _VersionClock:
+    """状态表与配置表共用的单调版本号；epoch 区分 API 进程，重启后旧版本号失效。
+
+    API 以多个 worker 进程运行，同一客户端的轮询会落到不同进程上：客户端回传的版本号
+    是各进程分量的组合（epoch-value，以 . 分隔），每个进程只读取并更新自己的分量，
+    其余分量原样带回，在每个进程上各全量一次之后，空闲轮询在所有进程上都是空增量。
+    """
+
+    MAX_COMPONENTS = 8  # 只保留最近启动的进程的分量，重启留下的旧分量逐步淘汰
+
+    def __init__(self):
+        self.epoch = int(time.time() * 1000)
+        self.value = 0
+
+    def tick(self) -> int:
+        self.value += 1
+        return self.value
+
+    @property
+    def local(self) -> str:
+        """本进程的分量"""
+        return f"{self.epoch}-{self.value}"
+
+    def token(self, prev: Optional[str] = None) -> str:
+        """把本进程当前分量并入客户端回传的版本号"""
+        parts = {}
+        for part in (prev or "").split("."):
+            epoch, _, value = part.partition("-")
+            if epoch.isdigit() and value.isdigit() and int(epoch) != self.epoch:
+                parts[int(epoch)] = value
+        parts[self.epoch] = str(self.value)
+        newest = sorted(parts, reverse=True)[: self.MAX_COMPONENTS]
+        return ".".join(f"{epoch}-{parts[epoch]}" for epoch in sorted(newest))
+
+    def parse(self, token: str) -> Optional[int]:
+        """取出本进程签发的分量；没有或无效时返回 None"""
+        for part in token.split("."):
+            epoch, _, value = part.partition("-")
+            if epoch == str(self.epoch):
+                if not value.isdigit() or int(value) > self.value:
+                    return None
+                return int(value)
+        return None
+
+
+version_clock = _VersionClock()
+
+
+def _typed(field: str, value: Any) -> Any:
+    # Redis hash 中均为字符串，流消息中为 JSON 数值
+    if field in _FLOAT_FIELDS:
+        return float(value)
+    if field in _INT_FIELDS:
+        return int(float(value))
+    if field in _BOOL_FIELDS:
+        return bool(int(value))
+    return value
+
+
+class StatusCache:
+    """进程内频道实时状态表：启动时从 Redis 播种，之后由事件流消费者增量更新。
+
+    每次变化（含因超时转为离线）都从 version_clock 取新版本号记到该频道上。
+    """
+
+    def __init__(self):
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._stale: Set[str] = set()
+        self.ready = False
+        self._stream_pos: Dict[int, Tuple[int, int]] = {}  # worker_id -> (epoch, seq)
+        self._seeding: List[Dict[str, Set[str]]] = []  # 进行中的播种：等待期间批次写过的字段
+
+    def _bump(self, channel_id: str):
+        self._versions[channel_id] = version_clock.tick()
+        self._stale.discard(channel_id)
+
+    def version_of(self, channel_id: str) -> int:
+        return self._versions.get(channel_id, 0)
+
+    def sweep_stale(self):
+        """超过 TTL 未更新的频道在读取侧变为 OFFLINE，这里为其递增版本号"""
+        cutoff = time.time() - STATUS_TTL
+        for channel_id, data in self._status.items():
+            if data.get("updated_at", 0) < cutoff and channel_id not in self._stale:
+                self._versions[channel_id] = version_clock.tick()
+                self._stale.add(channel_id)
+
+    async def seed(self):
+        """从 Redis 状态 hash 整体重建；等待快照期间已合并的批次比快照新，其字段保留"""
+        touched: Dict[str, Set[str]] = {}
+        self._seeding.append(touched)
+        try:
+            statuses = await get_live_channel_statuses()
+        finally:
+            self._seeding.remove(touched)
+        for channel_id, data in statuses.items():
+            seeded = {f: _typed(f, v) for f, v in data.items()}
+            current = self._status.get(channel_id)
+            if current is not None and channel_id in touched:
+                for field in touched[channel_id]:
+                    if field in current:
+                        seeded[field] = current[field]
+                seeded["updated_at"] = max(seeded.get("updated_at", 0.0), current.get("updated_at", 0.0))
+            self._status[channel_id] = seeded
+            self._bump(channel_id)
+        self.ready = True
+        logger.info("Status cache seeded with %d channels", len(statuses))
+
+    def apply_batch(self, msg: Dict[str, Any]) -> Tuple[bool, Dict[str, Set[str]]]:
+        """合并一条 channel_status_batch。
+
+        返回 (序号是否连续, 各频道值真正发生变化的字段)；序号缺口时调用方应重新播种。
+        """
+        ts = float(msg.get("ts", time.time()))
+        changes: Dict[str, Set[str]] = {}
+        for entry in msg.get("channels", []):
+            channel_id = entry["channel_id"]
+            current = self._status.setdefault(channel_id, {})
+            if ts < current.get("updated_at", 0.0):
+                # 播种之前就已发出、排在其后送达的批次：快照已包含这些值
+                continue
+            for touched in self._seeding:
+                touched.setdefault(channel_id, set()).update(entry)
+            changed = set()
+            for field, value in entry.items():
+                if field == "channel_id":
+                    continue
+                value = _typed(field, value)
+                if current.get(field) != value:
+                    current[field] = value
+                    changed.add(field)
+            current["updated_at"] = ts
+            self._bump(channel_id)
+            if changed:
+                changes[channel_id] = changed
+
+        worker_id, epoch, seq = msg.get("worker_id"), msg.get("epoch"), msg.get("seq")
+        if seq is None:
+            return True, changes
+        prev = self._stream_pos.get(worker_id)
+        self._stream_pos[worker_id] = (epoch, seq)
+        return prev is None or bool(msg.get("keyframe")) or prev == (epoch, seq - 1), changes
+
+    def forget(self, channel_id: str):
+        if self._status.pop(channel_id, None) is not None:
+            self._versions.pop(channel_id, None)
+            self._stale.discard(channel_id)
+            version_clock.tick()
+
+    def get(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        return self._status.get(channel_id)
+
+    def live(self) -> Dict[str, Dict[str, Any]]:
+        """TTL 内有更新的频道（与 Redis 中状态 hash 的存活范围一致）"""
+        cutoff = time.time() - STATUS_TTL
+        return {cid: data for cid, data in self._status.items() if data.get("updated_at", 0) >= cutoff}
+
+    def overview(self) -> Dict[str, int]:
+        stats = {"NORMAL": 0, "WARNING": 0, "ALARM": 0, "OFFLINE": 0, "total": 0}
+        for data in self.live().values():
+            s = data.get("status", "OFFLINE")
+            if s in stats:
+                stats[s] += 1
+            stats["total"] += 1
+        return stats
+
+
+class ChannelConfigCache:
+    """channels 表的内存副本：本进程 CRUD 后立即失效，并按 TTL 刷新以获取
+    其他 API 进程的修改和探针同步的元数据。
+
+    重新加载时内容有变化的启用频道取新版本号，被删除或停用的频道记入 removed。
+    """
+
+    def __init__(self, ttl: float = CHANNEL_CONFIG_TTL_SEC):
+        self.ttl = ttl
+        self._rows: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._removed: Dict[str, int] = {}  # channel_id -> 删除/停用时的版本号
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._generation += 1
+        self._loaded_at = 0.0
+
+    async def _ensure_loaded(self):
+        if time.time() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if time.time() - self._loaded_at < self.ttl:
+                return
+            generation = self._generation
+            async with read_db() as db:
+                async with db.execute("SELECT * FROM channels ORDER BY sort_order ASC") as cur:
+                    rows = [dict(row) for row in await cur.fetchall()]
+            by_id = {row["id"]: row for row in rows}
+            self._track_changes(by_id)
+            self._rows = rows
+            self._by_id = by_id
+            # 加载期间发生过失效则不标记为新鲜，下次访问重新加载
+            if generation == self._generation:
+                self._loaded_at = time.time()
+
+    def _track_changes(self, by_id: Dict[str, Dict[str, Any]]):
+        for channel_id, row in by_id.items():
+            if row["enabled"] and self._by_id.get(channel_id) != row:
+                self._versions[channel_id] = version_clock.tick()
+                self._removed.pop(channel_id, None)
+        for channel_id, row in self._by_id.items():
+            if row["enabled"] and not (channel_id in by_id and by_id[channel_id]["enabled"]):
+                self._versions.pop(channel_id, None)
+                self._removed[channel_id] = version_clock.tick()
+
+    def version_of(self, channel_id: str) -> int:
+        return self._versions.get(channel_id, 0)
+
+    def group_of(self, channel_id: str) -> Optional[str]:
+        """最近一次加载的配置中频道所属分组（不触发重新加载）"""
+        row = self._by_id.get(channel_id)
+        return (row["group_name"] or "default") if row else None
+
+    def removed_since(self, version: int) -> List[str]:
+        return [cid for cid, v in self._removed.items() if v > version]
+
+    async def enabled(self) -> List[Dict[str, Any]]:
+        await self._ensure_loaded()
+        return [row for row in self._rows if row["enabled"]]
+
+    async def get(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        await self._ensure_loaded()
+        return self._by_id.get(channel_id)
+
+
+status_cache = StatusCache()
+channel_config_cache = ChannelConfigCache()
@@ -1,13 +1,16 @@
 import logging
+import re
 from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
 from db.influx import close_influx
-from db.redis_client import close_redis
-from db.sqlite import close_db
-from routers import alerts, channels, simulator, thumbnails
+from db.redis_client import close_redis, get_influx_writer_stats
+from db.rollup import provision_rollups
+from db.sqlite import close_db, init_db
+from routers import alerts, analytics, channels, simulator, thumbnails
 from websocket.manager import ws_manager
 
 logging.basicConfig(
@@ -19,6 +22,8 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await init_db()
+    await provision_rollups()
     await ws_manager.start()
     logger.info("WebSocket manager started")
     yield
@@ -41,10 +46,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Channels-Version"],
 )
 
 app.include_router(channels.router)
 app.include_router(alerts.router)
+app.include_router(analytics.router)
 app.include_router(thumbnails.router)
 app.include_router(simulator.router)
 
@@ -54,12 +61,39 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/api/v1/realtime/clients")
+async def realtime_clients():
+    """各 WebSocket 客户端的发送队列深度、延迟与丢弃计数"""
+    return ws_manager.stats()
+
+
+@app.get("/api/v1/probe/influx-writer")
+async def influx_writer_stats():
+    """各探针 worker 的 Influx 写缓冲、磁盘缓冲大小与回放进度"""
+    return await get_influx_writer_stats()
+
+
+_STREAM_ID = re.compile(r"^\d+-\d+$")
+
+
 @app.websocket("/ws/realtime")
-async def ws_realtime(websocket: WebSocket):
-    await ws_manager.connect(websocket)
+async def ws_realtime(
+    websocket: WebSocket,
+    status_since: Optional[str] = None,
+    alerts_since: Optional[str] = None,
+    format: str = "json",
+):
+    """status_since / alerts_since 为客户端最后收到的流条目 ID，用于重连补发；
+    format=msgpack 时以二进制帧推送（见 websocket/codec.py）"""
+    await ws_manager.connect(
+        websocket,
+        status_since if status_since and _STREAM_ID.match(status_since) else None,
+        alerts_since if alerts_since and _STREAM_ID.match(alerts_since) else None,
+        binary=format == "msgpack",
+    )
     try:
         while True:
-            await websocket.receive_text()
+            await ws_manager.handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
     except Exception:
@@ -0,0 +1,23 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class AlertCountItem(BaseModel):
+    key: str
+    opened: int
+    resolved: int
+
+
+class MTTRItem(BaseModel):
+    key: str
+    resolved: int
+    mttr_sec: Optional[float] = None
+
+
+class ChannelAvailability(BaseModel):
+    channel_id: str
+    channel_name: str
+    group_name: str
+    alerts: int
+    outage_seconds: float
+    availability: float
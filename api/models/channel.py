@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -16,6 +16,7 @@ class ChannelStatus(BaseModel):
     is_stuttering: bool = False
     stutter_count: int = 0
     cc_errors_per_sec: float = 0.0
+    rx_dropped_per_sec: float = 0.0
     pcr_jitter_ms: float = 0.0
     audio_rms: float = 0.0
     video_brightness: float = 0.0
@@ -23,6 +24,22 @@ class ChannelStatus(BaseModel):
     updated_at: float = 0.0
     group_name: str = "default"
     sort_order: int = 0
+    service_name: str = ""
+    provider_name: str = ""
+    event_name: str = ""
+    video_pid: int = -1
+    audio_pid: int = -1
+    pcr_pid: int = -1
+    video_codec: str = ""
+    audio_codec: str = ""
+
+
+class ChannelListDelta(BaseModel):
+    """GET /channels?since= 的增量响应；full=True 表示版本号已失效，channels 为全量"""
+    version: str
+    full: bool = False
+    channels: List[ChannelStatus]
+    removed: List[str] = []
 
 
 class ChannelConfig(BaseModel):
@@ -36,17 +53,28 @@ class ChannelConfig(BaseModel):
     expected_bitrate_kbps: float = 0.0
 
 
-class MetricPoint(BaseModel):
-    time: str
-    bitrate_kbps: float = 0.0
-    cc_errors_per_sec: float = 0.0
-    pcr_jitter_ms: float = 0.0
-    video_brightness: float = 0.0
-    audio_rms: float = 0.0
-    is_black: int = 0
-    is_frozen: int = 0
-    is_silent: int = 0
-    status: str = "NORMAL"
+class MetricSeries(BaseModel):
+    time: List[int]  # epoch 秒
+    value: List[float]
+
+
+class ChannelMetricSeries(BaseModel):
+    """频道历史指标（列式，逐字段 LTTB 降采样）；window_sec 为 Influx 聚合窗口，1 表示原始点，
+    bucket 为所用的数据层"""
+    channel_id: str
+    range: str
+    window_sec: int
+    bucket: str
+    series: Dict[str, MetricSeries]
+
+
+class ChannelSparklines(BaseModel):
+    """多频道迷你曲线（列式）：series[channel_id][i] 对应 times[i]，无数据为 null"""
+    field: str
+    start: int
+    step: int
+    times: List[int]
+    series: Dict[str, List[Optional[float]]]
 
 
 class ChannelCreate(BaseModel):
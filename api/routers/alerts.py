@@ -1,8 +1,9 @@
-from typing import List, Optional
+import base64
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 
-from db.sqlite import get_db
+from db.sqlite import get_db, read_db
 from models.alert import Alert, AlertAck
 
 router = APIRouter(prefix="/api/v1/alerts", tags=["alerts"])
@@ -24,37 +25,64 @@ def _row_to_alert(row) -> Alert:
     )
 
 
+def _encode_cursor(started_at: str, alert_id: int) -> str:
+    raw = f"{started_at}|{alert_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        started_at, alert_id = raw.rsplit("|", 1)
+        return started_at, int(alert_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("", response_model=List[Alert])
 async def list_alerts(
+    response: Response,
     status: Optional[str] = Query(default=None),
     channel_id: Optional[str] = Query(default=None),
+    alert_type: Optional[str] = Query(default=None),
+    cursor: Optional[str] = Query(default=None, description="上一页响应头 X-Next-Cursor 的值"),
     limit: int = Query(default=100, le=500),
     offset: int = Query(default=0),
 ):
-    db = await get_db()
+    """按 (started_at, id) 倒序分页；传 cursor 时走游标分页，offset 仅为兼容保留"""
     conditions = []
-    params = []
+    params: list = []
     if status:
         conditions.append("status=?")
         params.append(status)
     if channel_id:
         conditions.append("channel_id=?")
         params.append(channel_id)
+    if alert_type:
+        conditions.append("alert_type=?")
+        params.append(alert_type)
+    if cursor:
+        conditions.append("(started_at, id) < (?, ?)")
+        params.extend(_decode_cursor(cursor))
+        offset = 0
     where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
     params.extend([limit, offset])
-    async with db.execute(
-        f"SELECT * FROM alerts {where} ORDER BY started_at DESC LIMIT ? OFFSET ?",
-        params,
-    ) as cur:
-        rows = await cur.fetchall()
+    async with read_db() as db:
+        async with db.execute(
+            f"SELECT * FROM alerts {where} ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?",
+            params,
+        ) as cur:
+            rows = await cur.fetchall()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1]["started_at"], rows[-1]["id"])
     return [_row_to_alert(r) for r in rows]
 
 
 @router.get("/{alert_id}", response_model=Alert)
 async def get_alert(alert_id: int):
-    db = await get_db()
-    async with db.execute("SELECT * FROM alerts WHERE id=?", (alert_id,)) as cur:
-        row = await cur.fetchone()
+    async with read_db() as db:
+        async with db.execute("SELECT * FROM alerts WHERE id=?", (alert_id,)) as cur:
+            row = await cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Alert not found")
     return _row_to_alert(row)
@@ -0,0 +1,108 @@
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Query
+
+from db.sqlite import read_db
+from models.analytics import AlertCountItem, ChannelAvailability, MTTRItem
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+
+# 只读汇总表（由探针增量维护），查询量与告警历史规模无关
+_GROUP_COLUMNS = {"day": "day", "group": "group_name", "type": "alert_type"}
+
+
+def _summary_filters(days: int, group_name: Optional[str], alert_type: Optional[str]):
+    conditions = ["day >= date('now', ?)"]
+    params: list = [f"-{days - 1} days"]
+    if group_name:
+        conditions.append("group_name=?")
+        params.append(group_name)
+    if alert_type:
+        conditions.append("alert_type=?")
+        params.append(alert_type)
+    return " AND ".join(conditions), params
+
+
+@router.get("/alert-counts", response_model=List[AlertCountItem])
+async def alert_counts(
+    by: str = Query(default="day", pattern="^(day|group|type)$"),
+    days: int = Query(default=7, ge=1, le=366),
+    group_name: Optional[str] = Query(default=None),
+    alert_type: Optional[str] = Query(default=None),
+):
+    column = _GROUP_COLUMNS[by]
+    where, params = _summary_filters(days, group_name, alert_type)
+    async with read_db() as db:
+        async with db.execute(
+            f"SELECT {column} AS k, SUM(opened) AS opened, SUM(resolved) AS resolved "
+            f"FROM alert_stats_daily WHERE {where} GROUP BY {column} ORDER BY {column}",
+            params,
+        ) as cur:
+            rows = await cur.fetchall()
+    return [AlertCountItem(key=row["k"], opened=row["opened"] or 0, resolved=row["resolved"] or 0) for row in rows]
+
+
+@router.get("/mttr", response_model=List[MTTRItem])
+async def mttr(
+    by: str = Query(default="type", pattern="^(day|group|type)$"),
+    days: int = Query(default=7, ge=1, le=366),
+    group_name: Optional[str] = Query(default=None),
+    alert_type: Optional[str] = Query(default=None),
+):
+    column = _GROUP_COLUMNS[by]
+    where, params = _summary_filters(days, group_name, alert_type)
+    async with read_db() as db:
+        async with db.execute(
+            f"SELECT {column} AS k, SUM(resolved) AS resolved, SUM(resolve_seconds) AS seconds "
+            f"FROM alert_stats_daily WHERE {where} GROUP BY {column} ORDER BY {column}",
+            params,
+        ) as cur:
+            rows = await cur.fetchall()
+    return [
+        MTTRItem(
+            key=row["k"],
+            resolved=row["resolved"] or 0,
+            mttr_sec=(row["seconds"] / row["resolved"]) if row["resolved"] else None,
+        )
+        for row in rows
+    ]
+
+
+@router.get("/availability", response_model=List[ChannelAvailability])
+async def availability(
+    days: int = Query(default=7, ge=1, le=366),
+    channel_id: Optional[str] = Query(default=None),
+    group_name: Optional[str] = Query(default=None),
+):
+    # 统计窗口 = 之前整天 + 今天已过去的秒数（UTC，与 CURRENT_TIMESTAMP 一致）
+    period = (days - 1) * 86400 + (time.time() % 86400)
+    conditions = []
+    params: list = [f"-{days - 1} days"]
+    if channel_id:
+        conditions.append("c.id=?")
+        params.append(channel_id)
+    if group_name:
+        conditions.append("c.group_name=?")
+        params.append(group_name)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with read_db() as db:
+        async with db.execute(
+            "SELECT c.id, c.name, c.group_name, COALESCE(SUM(s.alerts), 0) AS alerts, "
+            "COALESCE(SUM(s.outage_seconds), 0) AS outage "
+            "FROM channels c LEFT JOIN channel_stats_daily s ON s.channel_id = c.id AND s.day >= date('now', ?) "
+            f"{where} GROUP BY c.id ORDER BY c.sort_order ASC",
+            params,
+        ) as cur:
+            rows = await cur.fetchall()
+    return [
+        ChannelAvailability(
+            channel_id=row["id"],
+            channel_name=row["name"],
+            group_name=row["group_name"] or "default",
+            alerts=row["alerts"],
+            outage_seconds=float(row["outage"]),
+            availability=max(0.0, 1.0 - float(row["outage"]) / period),
+        )
+        for row in rows
+    ]
@@ -1,104 +1,168 @@
 import csv
+import hashlib
 import io
 import ipaddress
 import re
 import time
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from pydantic import TypeAdapter
 
-from db.influx import query_channel_metrics
-from db.redis_client import get_redis
-from db.sqlite import get_db
+from db.influx import query_channel_metrics, query_sparklines
+from db.redis_client import forget_channel, get_status_overview
+from db.sqlite import get_db, read_db
+from db.status_cache import channel_config_cache, status_cache, version_clock
 from models.channel import (
     BatchImportRequest,
     BatchImportResult,
     ChannelConfig,
     ChannelCreate,
+    ChannelListDelta,
     ChannelManageItem,
+    ChannelMetricSeries,
+    ChannelSparklines,
     ChannelStatus,
     ChannelUpdate,
-    MetricPoint,
 )
 
 router = APIRouter(prefix="/api/v1/channels", tags=["channels"])
 
+_CHANNEL_LIST = TypeAdapter(List[ChannelStatus])
+_list_body: tuple = ("", b"", "")  # (本进程版本号, 已序列化的全量列表, ETag)
+_SPARKLINE_FIELDS = ("bitrate_kbps", "cc_errors_per_sec", "pcr_jitter_ms", "video_brightness", "audio_rms", "mosaic_ratio")
+
+
+def _metadata_fields(row) -> dict:
+    """探针从 SDT/EIT/PMT 同步到 channels 表的元数据"""
+    return {
+        "service_name": row["service_name"] or "",
+        "provider_name": row["provider_name"] or "",
+        "event_name": row["event_name"] or "",
+        "video_pid": row["video_pid"] if row["video_pid"] is not None else -1,
+        "audio_pid": row["audio_pid"] if row["audio_pid"] is not None else -1,
+        "pcr_pid": row["pcr_pid"] if row["pcr_pid"] is not None else -1,
+        "video_codec": row["video_codec"] or "",
+        "audio_codec": row["audio_codec"] or "",
+    }
+
+
+def _channel_status(row, data: Optional[dict]) -> ChannelStatus:
+    """频道配置行 + 状态缓存条目 -> ChannelStatus；超过 30 秒未更新视为离线"""
+    data = data or {}
+    updated_at = data.get("updated_at", 0.0)
+    is_offline = (time.time() - updated_at > 30) if updated_at > 0 else True
+    return ChannelStatus(
+        channel_id=row["id"],
+        channel_name=data.get("channel_name", row["name"]),
+        status=data.get("status", "OFFLINE") if not is_offline else "OFFLINE",
+        bitrate_kbps=data.get("bitrate_kbps", 0.0),
+        is_black=data.get("is_black", False),
+        is_frozen=data.get("is_frozen", False),
+        is_silent=data.get("is_silent", False),
+        is_clipping=data.get("is_clipping", False),
+        is_mosaic=data.get("is_mosaic", False),
+        mosaic_ratio=data.get("mosaic_ratio", 0.0),
+        is_stuttering=data.get("is_stuttering", False),
+        stutter_count=data.get("stutter_count", 0),
+        cc_errors_per_sec=data.get("cc_errors_per_sec", 0.0),
+        rx_dropped_per_sec=data.get("rx_dropped_per_sec", 0.0),
+        pcr_jitter_ms=data.get("pcr_jitter_ms", 0.0),
+        audio_rms=data.get("audio_rms", 0.0),
+        video_brightness=data.get("video_brightness", 0.0),
+        thumbnail_path=data.get("thumbnail_path", ""),
+        updated_at=updated_at,
+        group_name=row["group_name"] or "default",
+        sort_order=row["sort_order"] or 0,
+        **_metadata_fields(row),
+    )
 
-@router.get("", response_model=List[ChannelStatus])
-async def list_channels():
-    db = await get_db()
-    async with db.execute(
-        "SELECT id, name, group_name, sort_order, multicast_ip, multicast_port FROM channels WHERE enabled=1 ORDER BY sort_order ASC"
-    ) as cur:
-        rows = await cur.fetchall()
-
-    redis = await get_redis()
-    channels = []
-    for row in rows:
-        channel_id = row["id"]
-        data = await redis.hgetall(f"channel:{channel_id}:status")
-        updated_at = float(data.get("updated_at", 0)) if data else 0
-        now = time.time()
-        is_offline = (now - updated_at > 30) if updated_at > 0 else True
-
-        status = data.get("status", "OFFLINE") if data and not is_offline else "OFFLINE"
-        channels.append(
-            ChannelStatus(
-                channel_id=channel_id,
-                channel_name=data.get("channel_name", row["name"]) if data else row["name"],
-                status=status,
-                bitrate_kbps=float(data.get("bitrate_kbps", 0)) if data else 0.0,
-                is_black=bool(int(data.get("is_black", 0))) if data else False,
-                is_frozen=bool(int(data.get("is_frozen", 0))) if data else False,
-                is_silent=bool(int(data.get("is_silent", 0))) if data else False,
-                is_clipping=bool(int(data.get("is_clipping", 0))) if data else False,
-                is_mosaic=bool(int(data.get("is_mosaic", 0))) if data else False,
-                mosaic_ratio=float(data.get("mosaic_ratio", 0)) if data else 0.0,
-                is_stuttering=bool(int(data.get("is_stuttering", 0))) if data else False,
-                stutter_count=int(data.get("stutter_count", 0)) if data else 0,
-                cc_errors_per_sec=float(data.get("cc_errors_per_sec", 0)) if data else 0.0,
-                pcr_jitter_ms=float(data.get("pcr_jitter_ms", 0)) if data else 0.0,
-                audio_rms=float(data.get("audio_rms", 0)) if data else 0.0,
-                video_brightness=float(data.get("video_brightness", 0)) if data else 0.0,
-                thumbnail_path=data.get("thumbnail_path", "") if data else "",
-                updated_at=updated_at,
-                group_name=row["group_name"] or "default",
-                sort_order=row["sort_order"] or 0,
+
+async def _ensure_status_cache():
+    # 正常情况下由 WebSocket 事件流消费者在启动时播种
+    if not status_cache.ready:
+        await status_cache.seed()
+
+
+@router.get(
+    "",
+    response_model=List[ChannelStatus],
+    responses={200: {"description": "全量列表；带 since 参数时为 ChannelListDelta"}, 304: {}},
+)
+async def list_channels(
+    since: Optional[str] = Query(default=None, description="上次响应的 X-Channels-Version，只返回之后变化的频道"),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    global _list_body
+    await _ensure_status_cache()
+    rows = await channel_config_cache.enabled()
+    status_cache.sweep_stale()
+    if since is not None:
+        version = version_clock.token(since)
+        headers = {"X-Channels-Version": version, "Cache-Control": "no-cache"}
+        base = version_clock.parse(since)
+        if base is None:
+            channels = [_channel_status(row, status_cache.get(row["id"])) for row in rows]
+            delta = ChannelListDelta(version=version, full=True, channels=channels)
+        else:
+            channels = [
+                _channel_status(row, status_cache.get(row["id"]))
+                for row in rows
+                if max(channel_config_cache.version_of(row["id"]), status_cache.version_of(row["id"])) > base
+            ]
+            delta = ChannelListDelta(
+                version=version, channels=channels, removed=channel_config_cache.removed_since(base)
             )
-        )
-    return channels
+        return Response(delta.model_dump_json(), media_type="application/json", headers=headers)
+
+    # 同一版本的全量列表只序列化一次；ETag 取内容摘要，各 API 进程对相同内容给出相同 ETag
+    if _list_body[0] != version_clock.local:
+        channels = [_channel_status(row, status_cache.get(row["id"])) for row in rows]
+        body = _CHANNEL_LIST.dump_json(channels)
+        _list_body = (version_clock.local, body, f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    _, body, etag = _list_body
+    headers = {"ETag": etag, "X-Channels-Version": version_clock.token(), "Cache-Control": "no-cache"}
+    if if_none_match and etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/stats/overview")
 async def get_overview():
-    redis = await get_redis()
-    keys = await redis.keys("channel:*:status")
-    stats = {"NORMAL": 0, "WARNING": 0, "ALARM": 0, "OFFLINE": 0, "total": 0}
-    now = time.time()
-    for key in keys:
-        data = await redis.hgetall(key)
-        if not data:
-            continue
-        updated_at = float(data.get("updated_at", 0))
-        if now - updated_at > 30:
-            stats["OFFLINE"] += 1
-        else:
-            s = data.get("status", "OFFLINE")
-            if s in stats:
-                stats[s] += 1
-        stats["total"] += 1
-    return stats
+    if not status_cache.ready:
+        return await get_status_overview()
+    return status_cache.overview()
+
+
+@router.get("/sparklines", response_model=ChannelSparklines)
+async def get_sparklines(
+    channel_ids: Optional[str] = Query(default=None, description="逗号分隔的频道 ID"),
+    group: Optional[str] = Query(default=None),
+    range: str = Query(default="15m", pattern="^[0-9]+[smhd]$"),
+    points: int = Query(default=60, ge=2, le=500),
+    field: str = Query(default="bitrate_kbps", pattern=f"^({'|'.join(_SPARKLINE_FIELDS)})$"),
+):
+    """多频道迷你曲线；channel_ids 与 group 都未给出时为全部启用频道"""
+    rows = await channel_config_cache.enabled()
+    if channel_ids:
+        wanted = {cid.strip() for cid in channel_ids.split(",") if cid.strip()}
+        ids = [row["id"] for row in rows if row["id"] in wanted]
+    elif group:
+        ids = [row["id"] for row in rows if (row["group_name"] or "default") == group]
+    else:
+        ids = [row["id"] for row in rows]
+    return await query_sparklines(ids, range, points, field)
 
 
 @router.get("/manage", response_model=List[ChannelManageItem])
 async def list_channels_manage():
     """返回全部频道含disabled，用于管理界面"""
-    db = await get_db()
-    async with db.execute(
-        "SELECT id, name, multicast_ip, multicast_port, group_name, sort_order, enabled, expected_bitrate_kbps "
-        "FROM channels ORDER BY sort_order ASC"
-    ) as cur:
-        rows = await cur.fetchall()
+    async with read_db() as db:
+        async with db.execute(
+            "SELECT id, name, multicast_ip, multicast_port, group_name, sort_order, enabled, expected_bitrate_kbps "
+            "FROM channels ORDER BY sort_order ASC"
+        ) as cur:
+            rows = await cur.fetchall()
     return [
         ChannelManageItem(
             id=row["id"],
@@ -214,57 +278,27 @@ async def batch_import(body: BatchImportRequest):
         success += 1
 
     await db.commit()
+    channel_config_cache.invalidate()
     return BatchImportResult(success=success, failed=failed, errors=errors)
 
 
-@router.get("/{channel_id}/metrics", response_model=List[MetricPoint])
+@router.get("/{channel_id}/metrics", response_model=ChannelMetricSeries)
 async def get_channel_metrics(
     channel_id: str,
     range: str = Query(default="5m", pattern="^[0-9]+[smhd]$"),
+    points: int = Query(default=300, ge=10, le=2000, description="每个字段最多返回的点数"),
+    resolution: Optional[str] = Query(default=None, pattern="^[0-9]+[smh]$", description="最小聚合窗口"),
 ):
-    return await query_channel_metrics(channel_id, range)
+    return await query_channel_metrics(channel_id, range, points, resolution)
 
 
 @router.get("/{channel_id}", response_model=ChannelStatus)
 async def get_channel(channel_id: str):
-    db = await get_db()
-    async with db.execute(
-        "SELECT id, name, group_name, sort_order FROM channels WHERE id=?",
-        (channel_id,),
-    ) as cur:
-        row = await cur.fetchone()
+    row = await channel_config_cache.get(channel_id)
     if not row:
         raise HTTPException(status_code=404, detail="Channel not found")
-
-    redis = await get_redis()
-    data = await redis.hgetall(f"channel:{channel_id}:status")
-    updated_at = float(data.get("updated_at", 0)) if data else 0
-    now = time.time()
-    is_offline = (now - updated_at > 30) if updated_at > 0 else True
-    status = data.get("status", "OFFLINE") if data and not is_offline else "OFFLINE"
-
-    return ChannelStatus(
-        channel_id=channel_id,
-        channel_name=data.get("channel_name", row["name"]) if data else row["name"],
-        status=status,
-        bitrate_kbps=float(data.get("bitrate_kbps", 0)) if data else 0.0,
-        is_black=bool(int(data.get("is_black", 0))) if data else False,
-        is_frozen=bool(int(data.get("is_frozen", 0))) if data else False,
-        is_silent=bool(int(data.get("is_silent", 0))) if data else False,
-        is_clipping=bool(int(data.get("is_clipping", 0))) if data else False,
-        is_mosaic=bool(int(data.get("is_mosaic", 0))) if data else False,
-        mosaic_ratio=float(data.get("mosaic_ratio", 0)) if data else 0.0,
-        is_stuttering=bool(int(data.get("is_stuttering", 0))) if data else False,
-        stutter_count=int(data.get("stutter_count", 0)) if data else 0,
-        cc_errors_per_sec=float(data.get("cc_errors_per_sec", 0)) if data else 0.0,
-        pcr_jitter_ms=float(data.get("pcr_jitter_ms", 0)) if data else 0.0,
-        audio_rms=float(data.get("audio_rms", 0)) if data else 0.0,
-        video_brightness=float(data.get("video_brightness", 0)) if data else 0.0,
-        thumbnail_path=data.get("thumbnail_path", "") if data else "",
-        updated_at=updated_at,
-        group_name=row["group_name"] or "default",
-        sort_order=row["sort_order"] or 0,
-    )
+    await _ensure_status_cache()
+    return _channel_status(row, status_cache.get(channel_id))
 
 
 @router.post("/{channel_id}/enable")
@@ -272,6 +306,7 @@ async def toggle_channel(channel_id: str, enabled: bool = True):
     db = await get_db()
     await db.execute("UPDATE channels SET enabled=? WHERE id=?", (int(enabled), channel_id))
     await db.commit()
+    channel_config_cache.invalidate()
     return {"channel_id": channel_id, "enabled": enabled}
 
 
@@ -316,6 +351,7 @@ async def create_channel(body: ChannelCreate):
         ),
     )
     await db.commit()
+    channel_config_cache.invalidate()
 
     return ChannelManageItem(
         id=new_id,
@@ -375,6 +411,7 @@ async def update_channel(channel_id: str, body: ChannelUpdate):
     params.append(channel_id)
     await db.execute(f"UPDATE channels SET {', '.join(fields)} WHERE id=?", params)
     await db.commit()
+    channel_config_cache.invalidate()
 
     # Return updated channel
     async with db.execute(
@@ -409,4 +446,7 @@ async def delete_channel(channel_id: str):
 
     await db.execute("DELETE FROM channels WHERE id=?", (channel_id,))
     await db.commit()
+    channel_config_cache.invalidate()
+    await forget_channel(channel_id)
+    status_cache.forget(channel_id)
     return {"channel_id": channel_id, "deleted": True}
@@ -0,0 +1,154 @@
+import asyncio
+import collections
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+from websocket.codec import Frame
+from websocket.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+CLIENT_QUEUE_MAX = 256
+CLIENT_ALERT_BACKLOG_MAX = 1000
+SLOW_CLIENT_TIMEOUT_SEC = 15
+
+# 队列条目类型
+STATUS = "status"
+ALERT = "alert"
+SNAPSHOT = "snapshot"  # 占位：由 writer 在发送时从状态缓存生成全量快照
+
+_client_ids = itertools.count(1)
+
+
+class ClientConnection:
+    """单个 WebSocket 客户端：有界发送队列 + 独立 writer 任务。
+
+    队列满时丢弃排队中的状态消息并以一个全量快照占位代替（状态消息是增量，
+    不能只丢一部分）；告警消息从不丢弃，积压过多或队首等待超时则断开该客户端，
+    由前端带流条目 ID 重连补发。
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        snapshot: Callable[["ClientConnection"], Awaitable[str]],
+        binary: bool = False,
+    ):
+        self.websocket = websocket
+        self.binary = binary
+        self.id = next(_client_ids)
+        self.remote = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else ""
+        self.connected_at = time.time()
+        self._snapshot = snapshot
+        self.subscription: Optional[Subscription] = None
+        self._queue: Deque[Tuple[str, Optional[Frame], float]] = collections.deque()
+        self._alerts_queued = 0
+        self._wakeup = asyncio.Event()
+        self._writer_task: asyncio.Task | None = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.snapshots = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def start(self):
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def stop(self):
+        self.closed = True
+        if self._writer_task:
+            self._writer_task.cancel()
+
+    @property
+    def lag_sec(self) -> float:
+        """队首消息已等待的时长"""
+        return time.time() - self._queue[0][2] if self._queue else 0.0
+
+    def is_slow(self) -> bool:
+        return self._alerts_queued > CLIENT_ALERT_BACKLOG_MAX or self.lag_sec > SLOW_CLIENT_TIMEOUT_SEC
+
+    def enqueue(self, kind: str, message: Optional[Frame]):
+        now = time.time()
+        if kind == STATUS and len(self._queue) >= CLIENT_QUEUE_MAX:
+            self._coalesce_status(now)
+        else:
+            self._queue.append((kind, message, now))
+            if kind == ALERT:
+                self._alerts_queued += 1
+        self._wakeup.set()
+
+    def _coalesce_status(self, now: float):
+        kept: Deque[Tuple[str, Optional[Frame], float]] = collections.deque()
+        has_snapshot = False
+        for item in self._queue:
+            if item[0] == STATUS:
+                self.dropped += 1
+            else:
+                has_snapshot = has_snapshot or item[0] == SNAPSHOT
+                kept.append(item)
+        self.dropped += 1  # 本条
+        if not has_snapshot:
+            kept.append((SNAPSHOT, None, now))
+        self._queue = kept
+
+    async def _writer(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._queue:
+                    kind, message, enqueued_at = self._queue.popleft()
+                    if kind == ALERT:
+                        self._alerts_queued -= 1
+                    elif kind == SNAPSHOT:
+                        message = Frame(await self._snapshot(self))
+                        self.snapshots += 1
+                    await self.send(message)
+                    self.sent += 1
+                    self.last_lag_ms = (time.time() - enqueued_at) * 1000
+                    self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("WebSocket client %d send failed: %s", self.id, e)
+            self.closed = True
+
+    async def send(self, frame: Frame):
+        if self.binary:
+            await self.websocket.send_bytes(frame.binary)
+        else:
+            await self.websocket.send_text(frame.text)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.stop()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=2)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict:
+        return {
+            "id": self.id,
+            "remote": self.remote,
+            "format": "msgpack" if self.binary else "json",
+            "connected_at": self.connected_at,
+            "queue_depth": len(self._queue),
+            "alerts_queued": self._alerts_queued,
+            "lag_ms": round(self.lag_sec * 1000, 1),
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "snapshots": self.snapshots,
+            "subscription": {
+                "groups": sorted(self.subscription.groups),
+                "channel_ids": sorted(self.subscription.channel_ids),
+                "fields": sorted(self.subscription.fields) if self.subscription.fields else None,
+                "interval": self.subscription.interval,
+            } if self.subscription else None,
+        }
@@ -0,0 +1,87 @@
+"""WebSocket 二进制协议（?format=msgpack）。
+
+消息结构与 JSON 相同，但：
+- 已知字段名按 FIELDS 中的下标编码为整数键，未知字段保留字符串键；
+- status 取值按 STATUSES 编码为整数；
+- ts / updated_at 编码为整数毫秒，其余浮点数按 float32 打包；
+压缩由 WebSocket permessage-deflate 完成。字典只允许在末尾追加。
+"""
+import json
+from typing import Any, Optional
+
+import msgpack
+
+FIELDS = [
+    "type", "stream", "sid", "ts", "worker_id", "epoch", "seq", "keyframe", "full", "channels",
+    "channel_id", "status", "channel_name", "bitrate_kbps", "is_black", "is_frozen", "is_silent",
+    "is_clipping", "is_mosaic", "mosaic_ratio", "is_stuttering", "stutter_count", "cc_errors_per_sec",
+    "pcr_jitter_ms", "audio_rms", "video_brightness", "thumbnail_path", "updated_at",
+    "alert_id", "alert_type", "severity", "detail", "rx_dropped_per_sec",
+]
+STATUSES = ["NORMAL", "WARNING", "ALARM", "OFFLINE"]
+
+_FIELD_CODES = {name: i for i, name in enumerate(FIELDS)}
+_STATUS_CODES = {name: i for i, name in enumerate(STATUSES)}
+_MS_FIELDS = {"ts", "updated_at"}
+
+
+def _to_wire(value: Any) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for key, v in value.items():
+            if key in _MS_FIELDS and isinstance(v, (int, float)):
+                v = int(v * 1000)
+            elif key == "status" and v in _STATUS_CODES:
+                v = _STATUS_CODES[v]
+            else:
+                v = _to_wire(v)
+            out[_FIELD_CODES.get(key, key)] = v
+        return out
+    if isinstance(value, list):
+        return [_to_wire(v) for v in value]
+    return value
+
+
+def encode(obj: Any) -> bytes:
+    return msgpack.packb(_to_wire(obj), use_single_float=True)
+
+
+def _from_wire(value: Any) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for key, v in value.items():
+            name = FIELDS[key] if isinstance(key, int) and key < len(FIELDS) else key
+            if name in _MS_FIELDS and isinstance(v, int):
+                v = v / 1000
+            elif name == "status" and isinstance(v, int):
+                v = STATUSES[v]
+            else:
+                v = _from_wire(v)
+            out[name] = v
+        return out
+    if isinstance(value, list):
+        return [_from_wire(v) for v in value]
+    return value
+
+
+def decode(data: bytes) -> Any:
+    """参考解码实现（用于测试与基准）"""
+    return _from_wire(msgpack.unpackb(data, strict_map_key=False))
+
+
+class Frame:
+    """一条待发送的消息：JSON 文本与二进制编码各自最多生成一次，由所有客户端共享"""
+
+    __slots__ = ("text", "_obj", "_binary")
+
+    def __init__(self, text: str, obj: Optional[Any] = None):
+        self.text = text
+        self._obj = obj
+        self._binary: Optional[bytes] = None
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            obj = self._obj if self._obj is not None else json.loads(self.text)
+            self._binary = encode(obj)
+        return self._binary
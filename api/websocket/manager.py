@@ -1,98 +1,365 @@
 import asyncio
 import json
 import logging
+import os
+import socket
 import time
-from typing import Set
+from typing import Any, Dict, List, Optional, Set
 
+import msgpack
 import redis.asyncio as aioredis
 from fastapi import WebSocket
 
-from config import REDIS_URL
-from db.redis_client import get_redis
+from config import REDIS_URL, STATUS_SOCKET, STATUS_TRANSPORT
+from db.redis_client import ALERT_STREAM, STATUS_STREAM, get_redis
+from db.status_cache import channel_config_cache, status_cache
+from websocket.client import ALERT, STATUS, ClientConnection
+from websocket.codec import Frame
+from websocket.subscription import Subscription, SubscriptionGroup
 
 logger = logging.getLogger(__name__)
 
+STREAM_LABELS = {STATUS_STREAM: "status", ALERT_STREAM: "alerts"}
+REPLAY_PAGE_SIZE = 500
+# 消费者超过该时长未读取的 api:* 消费组视为已退出的 API 进程遗留
+STALE_GROUP_IDLE_MS = 10 * 60 * 1000
+FRAME_TICK_SEC = 0.1
+
+
+def _id_lt(a: str, b: str) -> bool:
+    return tuple(map(int, a.split("-"))) < tuple(map(int, b.split("-")))
+
+
+def _with_sid(stream: str, sid: str, data: str) -> str:
+    # 探针写入的是 JSON 对象，直接拼接流名与条目 ID，避免重新序列化
+    return '{"stream":"%s","sid":"%s",%s' % (STREAM_LABELS[stream], sid, data[1:])
+
 
 class WebSocketManager:
+    """从 Redis Stream 消费探针事件并广播给 WebSocket 客户端。
+
+    每个 API 进程使用独立的消费组，因此每个进程都能收到全部事件；
+    客户端重连时携带最后见到的条目 ID，从流中补发期间错过的消息。
+    广播只把消息放入各客户端的有界队列，由各自的 writer 任务发送，慢客户端不影响其他客户端。
+
+    客户端发送 subscribe 消息后不再接收原始状态流，改为按订阅（分组/频道/字段/频率）
+    合并的 channel_update 帧；订阅相同的客户端共用同一帧。告警始终全量推送。
+
+    STATUS_TRANSPORT=uds 时状态批次改从探针发布进程的 Unix 域套接字读取（msgpack），
+    只有告警走 Redis Stream；状态没有条目 ID，重连的客户端直接收到快照。
+    """
+
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        self.clients: Dict[WebSocket, ClientConnection] = {}
         self._subscriber_task: asyncio.Task | None = None
+        self._group = f"api:{socket.gethostname()}:{os.getpid()}"
+        self._last_ids: Dict[str, str] = {}  # stream -> 最后一条已广播的条目 ID
+        self._reseed_task: asyncio.Task | None = None
+        self._sub_groups: Dict[Subscription, SubscriptionGroup] = {}
+        self._frame_task: asyncio.Task | None = None
+        self._relay_task: asyncio.Task | None = None
+        self._streams = [ALERT_STREAM] if STATUS_TRANSPORT == "uds" else list(STREAM_LABELS)
 
     async def start(self):
-        self._subscriber_task = asyncio.create_task(self._redis_subscriber())
+        self._subscriber_task = asyncio.create_task(self._stream_consumer())
+        self._frame_task = asyncio.create_task(self._frame_loop())
+        if STATUS_TRANSPORT == "uds":
+            self._relay_task = asyncio.create_task(self._relay_consumer())
 
     async def stop(self):
-        if self._subscriber_task:
-            self._subscriber_task.cancel()
-            try:
-                await self._subscriber_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._subscriber_task, self._frame_task, self._relay_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        for client in self.clients.values():
+            client.stop()
+        try:
+            redis = await get_redis()
+            for stream in self._streams:
+                await redis.xgroup_destroy(stream, self._group)
+        except Exception as e:
+            logger.warning("Consumer group cleanup error: %s", e)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        status_since: Optional[str] = None,
+        alerts_since: Optional[str] = None,
+        binary: bool = False,
+    ):
         await websocket.accept()
-        self.active_connections.add(websocket)
-        logger.info("WebSocket connected, total: %d", len(self.active_connections))
-        await self._send_batch_update(websocket)
+        client = ClientConnection(websocket, self._snapshot_message, binary=binary)
+        try:
+            await self._catch_up(client, {STATUS_STREAM: status_since, ALERT_STREAM: alerts_since})
+        except Exception as e:
+            logger.warning("WebSocket catch-up error: %s", e)
+        client.start()
+        self.clients[websocket] = client
+        logger.info("WebSocket client %d connected, total: %d", client.id, len(self.clients))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
-        logger.info("WebSocket disconnected, total: %d", len(self.active_connections))
+        client = self.clients.pop(websocket, None)
+        if client:
+            client.stop()
+            self._leave_group(client)
+            logger.info("WebSocket client %d disconnected, total: %d", client.id, len(self.clients))
+
+    def broadcast(self, kind: str, message: Frame, clients: Optional[Set[ClientConnection]] = None):
+        """只入队不等待发送，单条消息的扇出开销与客户端网络状况无关；
+        JSON 文本与二进制编码在 Frame 上各自只生成一次。
+
+        clients 为空时发给全部客户端；原始状态流不发给已订阅的客户端。
+        """
+        targets = list(clients) if clients is not None else list(self.clients.values())
+        for client in targets:
+            if client.closed:
+                self.disconnect(client.websocket)
+                continue
+            if clients is None and kind == STATUS and client.subscription:
+                continue
+            client.enqueue(kind, message)
+            if client.is_slow():
+                # 1013 Try Again Later：前端重连后按流条目 ID 补发
+                self.clients.pop(client.websocket, None)
+                self._leave_group(client)
+                logger.warning("Evicting slow WebSocket client %d: %s", client.id, client.stats())
+                asyncio.create_task(client.close(code=1013, reason="slow consumer"))
+
+    async def handle_client_message(self, websocket: WebSocket, text: str):
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(msg, dict) or msg.get("type") != "subscribe":
+            return
+        try:
+            sub = Subscription.parse(msg)
+        except ValueError as e:
+            # 按告警类入队：不会被状态合并策略丢弃
+            client.enqueue(ALERT, Frame(json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False)))
+            return
+        if sub.groups:
+            await channel_config_cache.enabled()  # 确保分组信息已加载
+        self._leave_group(client)
+        client.subscription = sub
+        group = self._sub_groups.get(sub)
+        if group is None:
+            group = self._sub_groups[sub] = SubscriptionGroup(sub)
+        group.clients.add(client)
+        # 订阅生效后先发一帧该订阅范围内的全量状态
+        client.enqueue(STATUS, self._frame(sub, {cid: None for cid in self._matching(sub)}, full=True))
+
+    def _leave_group(self, client: ClientConnection):
+        if client.subscription is None:
+            return
+        group = self._sub_groups.get(client.subscription)
+        if group:
+            group.clients.discard(client)
+            if not group.clients:
+                del self._sub_groups[client.subscription]
+        client.subscription = None
+
+    def _matching(self, sub: Subscription) -> List[str]:
+        return [
+            cid for cid in status_cache.live()
+            if sub.matches(cid, channel_config_cache.group_of(cid))
+        ]
+
+    def _frame(self, sub: Subscription, channels: Dict[str, Optional[Set[str]]], full: bool = False) -> Frame:
+        entries = []
+        for channel_id, fields in channels.items():
+            data = status_cache.get(channel_id)
+            if data:
+                entries.append({"channel_id": channel_id, **sub.project(data, fields)})
+        msg = {"type": "channel_update", "full": full, "ts": time.time(), "channels": entries}
+        return Frame(json.dumps(msg, ensure_ascii=False, separators=(",", ":")), msg)
+
+    async def _frame_loop(self):
+        while True:
+            await asyncio.sleep(FRAME_TICK_SEC)
+            now = time.time()
+            for group in list(self._sub_groups.values()):
+                if not group.dirty or now < group.next_due:
+                    continue
+                dirty, group.dirty = group.dirty, {}
+                group.next_due = now + group.subscription.interval
+                self.broadcast(STATUS, self._frame(group.subscription, dirty), group.clients)
+
+    def stats(self) -> List[Dict]:
+        return [client.stats() for client in self.clients.values()]
+
+    async def _catch_up(self, client: ClientConnection, since: Dict[str, Optional[str]]):
+        redis = await get_redis()
+        cursor: Dict[str, Optional[str]] = {}
+        for stream, sid in since.items():
+            if stream not in self._streams:
+                # 状态走本机直连，没有可补发的流
+                await client.send(Frame(await self._snapshot_message()))
+                continue
+            if sid and await self._replayable(redis, stream, sid):
+                cursor[stream] = sid
+            else:
+                # 新客户端或已被裁剪：从当前广播位置开始，状态先发快照，告警通知前端重新拉取
+                cursor[stream] = self._last_ids.get(stream)
+                if stream == STATUS_STREAM:
+                    await client.send(Frame(await self._snapshot_message()))
+                elif sid:
+                    await client.send(Frame(json.dumps({"type": "resync", "stream": "alerts"})))
+
+        # 补发直到追上广播位置；最后一次检查与加入活跃连接之间没有 await，不会漏发或重复
+        while True:
+            behind = {
+                stream: self._last_ids[stream]
+                for stream, sid in cursor.items()
+                if sid and stream in self._last_ids and _id_lt(sid, self._last_ids[stream])
+            }
+            if not behind:
+                return
+            for stream, upto in behind.items():
+                entries = await redis.xrange(stream, min="(" + cursor[stream], max=upto, count=REPLAY_PAGE_SIZE)
+                for sid, fields in entries:
+                    await client.send(Frame(_with_sid(stream, sid, fields["data"])))
+                cursor[stream] = entries[-1][0] if entries else upto
 
-    async def broadcast(self, message: str):
-        dead = set()
-        for ws in list(self.active_connections):
+    async def _replayable(self, redis: aioredis.Redis, stream: str, sid: str) -> bool:
+        first = await redis.xrange(stream, count=1)
+        return bool(first) and not _id_lt(sid, first[0][0])
+
+    async def _snapshot_message(self, client: Optional[ClientConnection] = None) -> str:
+        """状态缓存的全量快照；带上当前状态流位置，前端据此重置增量序号。
+        已订阅的客户端返回其订阅范围内的全量帧"""
+        if not status_cache.ready:
+            await status_cache.seed()
+        if client is not None and client.subscription:
+            sub = client.subscription
+            return self._frame(sub, {cid: None for cid in self._matching(sub)}, full=True).text
+        channels = [
+            {
+                "channel_id": channel_id,
+                "channel_name": data.get("channel_name", channel_id),
+                "status": data.get("status", "OFFLINE"),
+                "bitrate_kbps": data.get("bitrate_kbps", 0.0),
+                "is_black": data.get("is_black", False),
+                "is_frozen": data.get("is_frozen", False),
+                "is_silent": data.get("is_silent", False),
+                "is_clipping": data.get("is_clipping", False),
+                "cc_errors_per_sec": data.get("cc_errors_per_sec", 0.0),
+                "rx_dropped_per_sec": data.get("rx_dropped_per_sec", 0.0),
+                "pcr_jitter_ms": data.get("pcr_jitter_ms", 0.0),
+                "audio_rms": data.get("audio_rms", 0.0),
+                "video_brightness": data.get("video_brightness", 0.0),
+                "thumbnail_path": data.get("thumbnail_path", ""),
+                "updated_at": data.get("updated_at", 0.0),
+            }
+            for channel_id, data in status_cache.live().items()
+        ]
+        msg = {"type": "batch_update", "channels": channels, "ts": time.time()}
+        if STATUS_STREAM in self._last_ids:
+            msg.update(stream=STREAM_LABELS[STATUS_STREAM], sid=self._last_ids[STATUS_STREAM])
+        return json.dumps(msg)
+
+    async def _ensure_groups(self, r: aioredis.Redis):
+        for stream in self._streams:
+            if stream not in self._last_ids:
+                last = await r.xrevrange(stream, count=1)
+                self._last_ids[stream] = last[0][0] if last else "0-0"
             try:
-                await ws.send_text(message)
-            except Exception:
-                dead.add(ws)
-        self.active_connections -= dead
+                # 从已广播位置建组：重建（如 Redis 重启）时不会跳过消息
+                await r.xgroup_create(stream, self._group, id=self._last_ids[stream], mkstream=True)
+            except aioredis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+            await self._reap_stale_groups(r, stream)
+
+    async def _reap_stale_groups(self, r: aioredis.Redis, stream: str):
+        for group in await r.xinfo_groups(stream):
+            name = group["name"]
+            if not name.startswith("api:") or name == self._group:
+                continue
+            consumers = await r.xinfo_consumers(stream, name)
+            if all(c["idle"] > STALE_GROUP_IDLE_MS for c in consumers):
+                await r.xgroup_destroy(stream, name)
+                logger.info("Removed stale consumer group %s on %s", name, stream)
 
-    async def _send_batch_update(self, websocket: WebSocket):
+    def _apply_status(self, data: Any):
+        """合并一条状态批次（流中的 JSON 文本，或直连通道解出的字典）"""
         try:
-            redis = await get_redis()
-            keys = await redis.keys("channel:*:status")
-            channels = []
-            for key in keys:
-                channel_id = key.split(":")[1]
-                data = await redis.hgetall(key)
-                if data:
-                    channels.append({
-                        "channel_id": channel_id,
-                        "channel_name": data.get("channel_name", channel_id),
-                        "status": data.get("status", "OFFLINE"),
-                        "bitrate_kbps": float(data.get("bitrate_kbps", 0)),
-                        "is_black": bool(int(data.get("is_black", 0))),
-                        "is_frozen": bool(int(data.get("is_frozen", 0))),
-                        "is_silent": bool(int(data.get("is_silent", 0))),
-                        "is_clipping": bool(int(data.get("is_clipping", 0))),
-                        "cc_errors_per_sec": float(data.get("cc_errors_per_sec", 0)),
-                        "pcr_jitter_ms": float(data.get("pcr_jitter_ms", 0)),
-                        "audio_rms": float(data.get("audio_rms", 0)),
-                        "video_brightness": float(data.get("video_brightness", 0)),
-                        "thumbnail_path": data.get("thumbnail_path", ""),
-                        "updated_at": float(data.get("updated_at", 0)),
-                    })
-            msg = json.dumps({"type": "batch_update", "channels": channels, "ts": time.time()})
-            await websocket.send_text(msg)
+            in_order, changes = status_cache.apply_batch(json.loads(data) if isinstance(data, str) else data)
         except Exception as e:
-            logger.warning("Batch update error: %s", e)
+            logger.warning("Status cache update error: %s", e)
+            in_order, changes = False, {}
+        if not in_order and not (self._reseed_task and not self._reseed_task.done()):
+            self._reseed_task = asyncio.create_task(status_cache.seed())
+        for channel_id, fields in changes.items():
+            group_name = channel_config_cache.group_of(channel_id)
+            for group in self._sub_groups.values():
+                group.mark(channel_id, group_name, fields)
 
-    async def _redis_subscriber(self):
+    async def _stream_consumer(self):
         while True:
+            r = aioredis.from_url(REDIS_URL, decode_responses=True)
             try:
-                r = aioredis.from_url(REDIS_URL, decode_responses=True)
-                async with r.pubsub() as pubsub:
-                    await pubsub.subscribe("metrics_update", "alert_update")
-                    logger.info("Redis pub/sub subscribed")
-                    async for message in pubsub.listen():
-                        if message["type"] == "message":
-                            await self.broadcast(message["data"])
+                await self._ensure_groups(r)
+                # 建组之后再播种：播种期间到达的消息会在其上重放，合并是幂等的
+                await status_cache.seed()
+                logger.info("Redis stream consumer group %s ready", self._group)
+                while True:
+                    resp = await r.xreadgroup(
+                        self._group,
+                        "ws",
+                        {stream: ">" for stream in self._streams},
+                        count=100,
+                        block=5000,
+                    )
+                    for stream, entries in resp or []:
+                        for sid, fields in entries:
+                            self._last_ids[stream] = sid
+                            if stream == STATUS_STREAM:
+                                self._apply_status(fields["data"])
+                            # 状态为探针发布进程每 tick 一条的 channel_status_batch
+                            # (增量 + 周期关键帧，带 epoch/seq)，已是前端可直接消费的格式
+                            self.broadcast(
+                                STATUS if stream == STATUS_STREAM else ALERT,
+                                Frame(_with_sid(stream, sid, fields["data"])),
+                            )
+                        await r.xack(stream, self._group, *(sid for sid, _ in entries))
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                logger.warning("Redis subscriber error: %s, retrying in 3s", e)
+                logger.warning("Redis stream consumer error: %s, retrying in 3s", e)
                 await asyncio.sleep(3)
+            finally:
+                await r.aclose()
+
+    async def _relay_consumer(self):
+        """读取探针发布进程的直连状态通道：帧为 <长度 u32 大端> + msgpack 批次"""
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_unix_connection(STATUS_SOCKET)
+                # 断开期间的批次已经丢失，从 Redis 状态 hash 重新播种
+                await status_cache.seed()
+                logger.info("Status relay connected: %s", STATUS_SOCKET)
+                while True:
+                    header = await reader.readexactly(4)
+                    msg = msgpack.unpackb(await reader.readexactly(int.from_bytes(header, "big")))
+                    self._apply_status(msg)
+                    text = json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+                    self.broadcast(STATUS, Frame(text, msg))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning("Status relay error: %s, retrying in 1s", e)
+                await asyncio.sleep(1)
+            finally:
+                if writer is not None:
+                    writer.close()
 
 
 ws_manager = WebSocketManager()
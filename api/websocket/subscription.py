@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set
+
+# 可订阅的状态字段（与探针 channel_status_batch 中的字段一致）
+STATUS_FIELDS = frozenset({
+    "status", "channel_name", "bitrate_kbps", "is_black", "is_frozen", "is_silent",
+    "is_clipping", "is_mosaic", "mosaic_ratio", "is_stuttering", "stutter_count",
+    "cc_errors_per_sec", "rx_dropped_per_sec", "pcr_jitter_ms", "audio_rms", "video_brightness", "thumbnail_path",
+})
+
+MIN_RATE = 0.2
+MAX_RATE = 10.0
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """客户端订阅：分组与频道取并集，均为空表示全部频道；fields 为 None 表示全部字段"""
+    groups: FrozenSet[str] = frozenset()
+    channel_ids: FrozenSet[str] = frozenset()
+    fields: Optional[FrozenSet[str]] = None
+    interval: float = 1.0
+
+    @classmethod
+    def parse(cls, msg: Dict[str, Any]) -> "Subscription":
+        def names(key: str) -> FrozenSet[str]:
+            value = msg.get(key) or []
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f"{key} must be a list of strings")
+            return frozenset(value)
+
+        fields = names("fields")
+        unknown = fields - STATUS_FIELDS
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        try:
+            rate = float(msg.get("max_rate", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError("max_rate must be a number")
+        rate = min(max(rate, MIN_RATE), MAX_RATE)
+        return cls(
+            groups=names("groups"),
+            channel_ids=names("channel_ids"),
+            fields=fields or None,
+            interval=round(1.0 / rate, 3),
+        )
+
+    def matches(self, channel_id: str, group_name: Optional[str]) -> bool:
+        if not self.groups and not self.channel_ids:
+            return True
+        return channel_id in self.channel_ids or (group_name is not None and group_name in self.groups)
+
+    def project(self, data: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """从状态缓存条目中取出订阅的字段；fields 给定时只取其中变化的部分"""
+        wanted = self.fields if fields is None else fields
+        if wanted is None:
+            return {f: v for f, v in data.items() if f in STATUS_FIELDS}
+        return {f: data[f] for f in wanted if f in data}
+
+
+class SubscriptionGroup:
+    """订阅内容完全相同的客户端共用一组脏集合，每个周期只生成一帧"""
+
+    def __init__(self, subscription: Subscription):
+        self.subscription = subscription
+        self.clients: Set = set()
+        self.dirty: Dict[str, Set[str]] = {}  # channel_id -> 变化的字段
+        self.next_due = 0.0
+
+    def mark(self, channel_id: str, group_name: Optional[str], fields: Set[str]):
+        sub = self.subscription
+        if not sub.matches(channel_id, group_name):
+            return
+        if sub.fields is not None:
+            fields = fields & sub.fields
+        if fields:
+            self.dirty.setdefault(channel_id, set()).update(fields)
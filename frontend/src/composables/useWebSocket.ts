@@ -1,30 +1,49 @@
 import { ref, onUnmounted } from 'vue'
-import type { WSMessage } from '@/types'
+import type { WSMessage, WSSubscription } from '@/types'
 
 type MessageHandler = (msg: WSMessage) => void
 
 const WS_URL = `${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/ws/realtime`
 
+// 每个流最后收到的条目 ID，重连时带上以便服务端补发断线期间的消息
+function buildUrl(lastIds: Record<string, string>): string {
+  const params = new URLSearchParams()
+  if (lastIds.status) params.set('status_since', lastIds.status)
+  if (lastIds.alerts) params.set('alerts_since', lastIds.alerts)
+  const qs = params.toString()
+  return qs ? `${WS_URL}?${qs}` : WS_URL
+}
+
 export function useWebSocket(onMessage: MessageHandler) {
   const connected = ref(false)
   let ws: WebSocket | null = null
   let retryTimer: ReturnType<typeof setTimeout> | null = null
   let retryDelay = 1000
   let destroyed = false
+  const lastIds: Record<string, string> = {}
+  let subscription: WSSubscription | null = null
+
+  function sendSubscription() {
+    if (subscription && ws?.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify({ type: 'subscribe', ...subscription }))
+    }
+  }
 
   function connect() {
     if (destroyed) return
     try {
-      ws = new WebSocket(WS_URL)
+      ws = new WebSocket(buildUrl(lastIds))
 
       ws.onopen = () => {
         connected.value = true
         retryDelay = 1000
+        sendSubscription()
       }
 
       ws.onmessage = (event) => {
         try {
           const msg = JSON.parse(event.data) as WSMessage
+          if (msg.stream && msg.sid) lastIds[msg.stream] = msg.sid
           onMessage(msg)
         } catch {
           // ignore parse errors
@@ -60,8 +79,14 @@ export function useWebSocket(onMessage: MessageHandler) {
     ws = null
   }
 
+  /** 只接收指定分组/频道/字段的合并帧（channel_update），重连后自动重新订阅 */
+  function subscribe(sub: WSSubscription) {
+    subscription = sub
+    sendSubscription()
+  }
+
   connect()
   onUnmounted(disconnect)
 
-  return { connected }
+  return { connected, subscribe }
 }
@@ -7,6 +7,9 @@ export const useChannelsStore = defineStore('channels', () => {
   const channels = ref<Map<string, ChannelStatus>>(new Map())
   const loading = ref(false)
   const lastUpdate = ref(0)
+  // 每个探针 worker 的增量流位置，用于发现丢包 / 探针重启
+  const streamPos = new Map<number, { epoch: number; seq: number }>()
+  let resyncTimer: ReturnType<typeof setTimeout> | null = null
 
   const channelList = computed(() =>
     Array.from(channels.value.values()).sort((a, b) => a.sort_order - b.sort_order)
@@ -59,6 +62,33 @@ export const useChannelsStore = defineStore('channels', () => {
     lastUpdate.value = Date.now()
   }
 
+  /** 记录 worker 的 (epoch, seq)；返回 false 表示中间有缺口需要重新同步 */
+  function trackStatusSeq(workerId: number, epoch: number, seq: number, keyframe: boolean): boolean {
+    const pos = streamPos.get(workerId)
+    streamPos.set(workerId, { epoch, seq })
+    // 首次见到该 worker 或收到关键帧：状态已完整，直接采纳
+    if (!pos || keyframe) return true
+    return pos.epoch === epoch && seq === pos.seq + 1
+  }
+
+  /** 收到全量快照后各 worker 的下一条增量直接采纳 */
+  function resetStatusSeq() {
+    streamPos.clear()
+  }
+
+  function scheduleResync() {
+    if (resyncTimer) return
+    // 多个 worker 同时出现缺口时只拉取一次全量
+    resyncTimer = setTimeout(async () => {
+      resyncTimer = null
+      try {
+        await fetchChannels()
+      } catch {
+        // 下一个缺口或关键帧会再次触发
+      }
+    }, 500)
+  }
+
   return {
     channels,
     channelList,
@@ -68,5 +98,8 @@ export const useChannelsStore = defineStore('channels', () => {
     fetchChannels,
     updateChannel,
     batchUpdate,
+    trackStatusSeq,
+    resetStatusSeq,
+    scheduleResync,
   }
 })
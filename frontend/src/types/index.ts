@@ -14,6 +14,7 @@ export interface ChannelStatus {
   is_stuttering: boolean
   stutter_count: number
   cc_errors_per_sec: number
+  rx_dropped_per_sec?: number
   pcr_jitter_ms: number
   audio_rms: number
   video_brightness: number
@@ -21,6 +22,14 @@ export interface ChannelStatus {
   updated_at: number
   group_name: string
   sort_order: number
+  service_name?: string
+  provider_name?: string
+  event_name?: string
+  video_pid?: number
+  audio_pid?: number
+  pcr_pid?: number
+  video_codec?: string
+  audio_codec?: string
 }
 
 export interface Alert {
@@ -37,17 +46,26 @@ export interface Alert {
   thumbnail_path: string | null
 }
 
-export interface MetricPoint {
-  time: string
-  bitrate_kbps: number
-  cc_errors_per_sec: number
-  pcr_jitter_ms: number
-  video_brightness: number
-  audio_rms: number
-  is_black: number
-  is_frozen: number
-  is_silent: number
-  status: string
+// GET /channels/{id}/metrics：每个字段独立降采样，time 为 epoch 秒
+export interface MetricSeries {
+  time: number[]
+  value: number[]
+}
+
+export interface ChannelMetricSeries {
+  channel_id: string
+  range: string
+  window_sec: number
+  series: Record<string, MetricSeries>
+}
+
+// GET /channels/sparklines：series[channel_id][i] 对应 times[i]（epoch 秒）
+export interface ChannelSparklines {
+  field: string
+  start: number
+  step: number
+  times: number[]
+  series: Record<string, (number | null)[]>
 }
 
 export interface OverviewStats {
@@ -58,11 +76,59 @@ export interface OverviewStats {
   total: number
 }
 
-export type WSMessage =
-  | { type: 'channel_status'; channel_id: string; status: ChannelStatusValue; channel_name: string; bitrate_kbps: number; is_black: boolean; is_frozen: boolean; is_silent: boolean; is_clipping: boolean; is_mosaic: boolean; mosaic_ratio: number; is_stuttering: boolean; stutter_count: number; cc_errors_per_sec: number; pcr_jitter_ms: number; audio_rms: number; video_brightness: number; thumbnail_path: string; ts: number }
+// 探针批量消息中的单路状态，布尔量以 0/1 传输
+export interface ChannelStatusEntry {
+  channel_id: string
+  status: ChannelStatusValue
+  channel_name: string
+  bitrate_kbps: number
+  is_black: boolean | number
+  is_frozen: boolean | number
+  is_silent: boolean | number
+  is_clipping: boolean | number
+  is_mosaic: boolean | number
+  mosaic_ratio: number
+  is_stuttering: boolean | number
+  stutter_count: number
+  cc_errors_per_sec: number
+  rx_dropped_per_sec?: number
+  pcr_jitter_ms: number
+  audio_rms: number
+  video_brightness: number
+  thumbnail_path: string
+}
+
+export interface WSSubscription {
+  groups?: string[]
+  channel_ids?: string[]
+  fields?: (keyof Omit<ChannelStatusEntry, 'channel_id'>)[]
+  max_rate?: number // 每秒最多帧数
+}
+
+export type WSMessage = (
+  | ({ type: 'channel_status'; ts: number } & ChannelStatusEntry)
+  | {
+      type: 'channel_status_batch'
+      worker_id: number
+      epoch: number
+      seq: number
+      keyframe: boolean
+      ts: number
+      // 非关键帧只含变化字段
+      channels: (Partial<ChannelStatusEntry> & { channel_id: string })[]
+    }
   | { type: 'alert_new'; alert_id: number; channel_id: string; channel_name: string; alert_type: string; severity: string; status: string; ts: number }
   | { type: 'alert_resolved'; alert_id: number; channel_id: string }
   | { type: 'batch_update'; channels: ChannelStatus[]; ts: number }
+  | { type: 'resync'; stream: 'alerts' }
+  // 订阅后按频率合并的帧，只含订阅的频道与变化字段；full 为订阅范围内的全量
+  | { type: 'channel_update'; full: boolean; ts: number; channels: (Partial<ChannelStatusEntry> & { channel_id: string })[] }
+  | { type: 'error'; detail: string }
+) & {
+  // 来自 Redis Stream 的消息带有流名与条目 ID
+  stream?: 'status' | 'alerts'
+  sid?: string
+}
 
 export const ALERT_TYPE_LABELS: Record<string, string> = {
   BLACK_SCREEN: '黑屏',
@@ -0,0 +1,127 @@
+"""探针侧指标聚合：健康频道按 INFLUX_EXPORT_INTERVAL_SEC 窗口聚合后写入 Influx，
+WARNING/ALARM 期间逐秒写入原始采样。
+
+窗口对齐到墙钟整数倍，所有频道的聚合点时间一致。已完成的窗口在内存中保留
+INFLUX_INCIDENT_PREROLL_SEC 后才导出：期间频道进入告警，则这些窗口改为导出其中的
+原始采样，事故发生前的细节不丢失。恢复正常后再保持逐秒导出同样时长。
+"""
+import collections
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Tuple
+
+from config import (
+    INFLUX_EXPORT_INTERVAL_ALERT_SEC,
+    INFLUX_EXPORT_INTERVAL_SEC,
+    INFLUX_INCIDENT_PREROLL_SEC,
+)
+from status_machine import ChannelMetrics, ChannelStatus
+
+# 聚合为 mean/min/max 的连续量
+CONTINUOUS_FIELDS = (
+    "bitrate_kbps", "cc_errors_per_sec", "pcr_jitter_ms", "video_brightness", "audio_rms", "mosaic_ratio",
+    "rx_dropped_per_sec",
+)
+# 窗口内取“是否出现过”，另计出现的采样数
+FLAG_FIELDS = ("is_black", "is_frozen", "is_silent", "is_clipping", "is_mosaic", "is_stuttering")
+
+STATUS_CODES = {
+    ChannelStatus.NORMAL: 0,
+    ChannelStatus.WARNING: 1,
+    ChannelStatus.ALARM: 2,
+    ChannelStatus.OFFLINE: 3,
+}
+_INCIDENT = {ChannelStatus.WARNING, ChannelStatus.ALARM}
+
+Sample = Tuple[ChannelMetrics, ChannelStatus]
+
+
+@dataclass
+class WindowStats:
+    """一个导出点；samples == 1 时即为原始采样"""
+    timestamp: float
+    samples: int = 0
+    sums: List[float] = field(default_factory=lambda: [0.0] * len(CONTINUOUS_FIELDS))
+    mins: List[float] = field(default_factory=lambda: [float("inf")] * len(CONTINUOUS_FIELDS))
+    maxs: List[float] = field(default_factory=lambda: [float("-inf")] * len(CONTINUOUS_FIELDS))
+    lasts: List[float] = field(default_factory=lambda: [0.0] * len(CONTINUOUS_FIELDS))
+    flag_counts: List[int] = field(default_factory=lambda: [0] * len(FLAG_FIELDS))
+    status_code: int = 0       # 窗口内最后一个采样的状态
+    status_code_max: int = 0   # 窗口内最差状态
+    stutter_count: int = 0     # 最后值
+
+    def add(self, metrics: ChannelMetrics, status: ChannelStatus):
+        self.samples += 1
+        for i, name in enumerate(CONTINUOUS_FIELDS):
+            v = float(getattr(metrics, name))
+            self.sums[i] += v
+            if v < self.mins[i]:
+                self.mins[i] = v
+            if v > self.maxs[i]:
+                self.maxs[i] = v
+            self.lasts[i] = v
+        for i, name in enumerate(FLAG_FIELDS):
+            if getattr(metrics, name):
+                self.flag_counts[i] += 1
+        code = STATUS_CODES[status]
+        self.status_code = code
+        self.status_code_max = max(self.status_code_max, code)
+        self.stutter_count = int(metrics.stutter_count)
+
+    @classmethod
+    def of(cls, metrics: ChannelMetrics, status: ChannelStatus) -> "WindowStats":
+        w = cls(timestamp=metrics.timestamp)
+        w.add(metrics, status)
+        return w
+
+
+class ChannelAggregator:
+    def __init__(self):
+        self._window: Optional[WindowStats] = None
+        self._window_key = -1
+        self._raw: List[Sample] = []  # 当前窗口的原始采样
+        self._pending: Deque[Tuple[WindowStats, List[Sample]]] = collections.deque()
+        self._detail_until = 0.0  # 此时刻之前逐秒导出
+
+    def add(self, metrics: ChannelMetrics, status: ChannelStatus) -> List[WindowStats]:
+        """加入一个采样，返回此刻需要导出的点"""
+        ts = metrics.timestamp
+        out: List[WindowStats] = []
+        if status in _INCIDENT:
+            if self._detail_until <= ts:
+                # 进入事故：预留的窗口与当前窗口改为导出原始采样
+                for _, raw in self._pending:
+                    out.extend(WindowStats.of(m, s) for m, s in raw)
+                self._pending.clear()
+                out.extend(WindowStats.of(m, s) for m, s in self._raw)
+                self._window, self._window_key, self._raw = None, -1, []
+            self._detail_until = ts + max(INFLUX_INCIDENT_PREROLL_SEC, INFLUX_EXPORT_INTERVAL_ALERT_SEC)
+
+        if ts < self._detail_until:
+            out.append(WindowStats.of(metrics, status))
+            return out
+
+        key = int(ts // INFLUX_EXPORT_INTERVAL_SEC)
+        if key != self._window_key:
+            self._close_window()
+            # 刚退出逐秒导出时窗口起点可能早于最后一个原始点，取首个采样时刻避免时间戳重叠
+            self._window = WindowStats(timestamp=max(key * INFLUX_EXPORT_INTERVAL_SEC, int(ts)))
+            self._window_key = key
+        self._window.add(metrics, status)
+        self._raw.append((metrics, status))
+
+        while self._pending and self._pending[0][0].timestamp < ts - INFLUX_INCIDENT_PREROLL_SEC - INFLUX_EXPORT_INTERVAL_SEC:
+            out.append(self._pending.popleft()[0])
+        return out
+
+    def _close_window(self):
+        if self._window is not None and self._window.samples:
+            self._pending.append((self._window, self._raw))
+        self._window, self._raw = None, []
+
+    def drain(self) -> List[WindowStats]:
+        """停止时导出全部未导出的点"""
+        self._close_window()
+        self._window_key = -1
+        out = [w for w, _ in self._pending]
+        self._pending.clear()
+        return out
@@ -18,6 +18,11 @@ CHANNELS_PER_WORKER = int(os.getenv("CHANNELS_PER_WORKER", "30"))
 
 UDP_RECV_BUFFER = 4 * 1024 * 1024
 UDP_TIMEOUT_SEC = 5.0
+# 一次可读回调最多读取的数据报数，避免单个高码率频道长时间占用事件循环
+INGEST_BATCH_DATAGRAMS = 64
+# 每个频道收流到分析之间的队列长度，满时丢弃最旧的样本；单个样本的 TS 字节上限
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "2"))
+ANALYSIS_CHUNK_BYTES = 65536
 
 BLACK_LUMA_THRESHOLD = 16
 FREEZE_MSE_THRESHOLD = 0.5
@@ -33,8 +38,61 @@ CC_ERROR_THRESHOLD = 5
 PCR_JITTER_THRESHOLD_MS = 40.0
 BITRATE_DEVIATION_THRESHOLD = 0.3
 
+ALERT_RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS", "90"))
+ALERT_ARCHIVE_INTERVAL_SEC = int(os.getenv("ALERT_ARCHIVE_INTERVAL_SEC", "3600"))
+ALERT_ARCHIVE_BATCH_SIZE = 5000
+
+METADATA_FLUSH_INTERVAL_SEC = 10
+
+# 发布进程扫描共享内存状态表的间隔（worker 每秒写一次，需明显小于 1 秒）
+PUBLISH_SCAN_INTERVAL_MS = 200
+
+STATUS_FLUSH_INTERVAL_MS = 1000
+STATUS_KEYFRAME_INTERVAL_SEC = int(os.getenv("STATUS_KEYFRAME_INTERVAL_SEC", "10"))
+# 状态流死区：变化未超过阈值的字段不下发（绝对值 / 相对比例），未列出的字段任何变化都下发
+STATUS_DEADBAND_ABS = {
+    "cc_errors_per_sec": 0.5,
+    "rx_dropped_per_sec": 0.5,
+    "pcr_jitter_ms": 2.0,
+    "audio_rms": 0.005,
+    "video_brightness": 2.0,
+    "mosaic_ratio": 0.01,
+}
+STATUS_DEADBAND_REL = {
+    "bitrate_kbps": 0.02,
+}
+
+# 实时状态到 API 的通道：redis（状态流，可跨主机）或 uds（同机 Unix 域套接字直连，
+# 批量消息为 msgpack 二进制，Redis 只保存状态 hash）
+STATUS_TRANSPORT = os.getenv("STATUS_TRANSPORT", "redis")
+STATUS_SOCKET = os.getenv("STATUS_SOCKET", "/run/iptv/status.sock")
+STATUS_RELAY_MAX_BUFFER = 4 * 1024 * 1024  # 单个 API 连接积压超过此字节数即断开
+
+# 状态/告警事件写入定长 Redis Stream，供 API 重连补发（近似裁剪）
+STATUS_STREAM_MAXLEN = int(os.getenv("STATUS_STREAM_MAXLEN", "2000"))
+ALERT_STREAM_MAXLEN = int(os.getenv("ALERT_STREAM_MAXLEN", "10000"))
+
 INFLUX_BATCH_SIZE = 300
 INFLUX_FLUSH_INTERVAL_MS = 1000
+INFLUX_MAX_POINTS_PER_WRITE = 5000
+# 写缓冲上限（约为单 worker 10 分钟的数据量），超出时丢弃最旧的点并计数
+INFLUX_BUFFER_MAX_POINTS = int(os.getenv("INFLUX_BUFFER_MAX_POINTS", "20000"))
+# Influx 不可用期间的磁盘缓冲（每 worker 一个子目录）；留空则只用内存缓冲
+INFLUX_SPOOL_DIR = os.getenv("INFLUX_SPOOL_DIR", "/data/spool")
+INFLUX_SPOOL_MAX_MB = int(os.getenv("INFLUX_SPOOL_MAX_MB", "512"))
+INFLUX_SPOOL_SEGMENT_MB = 16
+INFLUX_SPOOL_REPLAY_POINTS_PER_SEC = int(os.getenv("INFLUX_SPOOL_REPLAY_POINTS_PER_SEC", "20000"))
+INFLUX_STATS_INTERVAL_SEC = 5
+# Influx 导出分辨率：健康频道按窗口聚合（mean/min/max 与标志计数），WARNING/ALARM 期间逐秒；
+# 完成的窗口保留 INFLUX_INCIDENT_PREROLL_SEC，期间发生告警则改写为逐秒原始采样
+INFLUX_EXPORT_INTERVAL_SEC = int(os.getenv("INFLUX_EXPORT_INTERVAL_SEC", "10"))
+INFLUX_EXPORT_INTERVAL_ALERT_SEC = 1
+INFLUX_INCIDENT_PREROLL_SEC = int(os.getenv("INFLUX_INCIDENT_PREROLL_SEC", "30"))
+
+# 本地环形存储：每频道最近 RING_HOURS 小时的逐秒指标（内存映射 .npy，每频道约 3 MB/24h），
+# 供 API 直接读取短范围历史；留空则不写
+RING_DIR = os.getenv("RING_DIR", "/data/ring")
+RING_HOURS = int(os.getenv("RING_HOURS", "24"))
 
 THUMBNAIL_WIDTH = 320
 THUMBNAIL_HEIGHT = 180
@@ -2,10 +2,16 @@ import asyncio
 import logging
 import multiprocessing
 import os
+import signal
 import sys
 import time
 
-from config import CHANNELS_PER_WORKER, WORKER_COUNT
+from config import (
+    CHANNELS_PER_WORKER,
+    WORKER_COUNT,
+)
+from publisher import Publisher
+from status_table import StatusTable
 from storage.sqlite_db import SQLiteDB
 from worker import ChannelWorker
 
@@ -17,11 +23,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def run_worker(worker_id: int, channels):
-    w = ChannelWorker(worker_id=worker_id, channels=channels)
+def run_worker(worker_id: int, channels, table_name: str, table_rows: int, first_row: int):
+    w = ChannelWorker(
+        worker_id=worker_id, channels=channels, table_name=table_name, table_rows=table_rows, first_row=first_row
+    )
     w.run()
 
 
+def run_publisher(table_name: str, channels):
+    Publisher(table_name, channels).run()
+
+
 async def init_db_and_load_channels():
     db = SQLiteDB()
     await db.start()
@@ -46,40 +58,66 @@ async def main():
 
     logger.info("Loaded %d channels from database", len(channels))
 
+    # 共享内存状态表：每个频道一行，worker 按分块顺序占用连续的行
+    table = StatusTable.create(len(channels))
     chunks = [channels[i:i + CHANNELS_PER_WORKER] for i in range(0, len(channels), CHANNELS_PER_WORKER)]
 
-    processes = []
-    for i, chunk in enumerate(chunks):
+    def start_worker(i: int) -> multiprocessing.Process:
         p = multiprocessing.Process(
             target=run_worker,
-            args=(i, chunk),
+            args=(i, chunks[i], table.name, len(channels), i * CHANNELS_PER_WORKER),
             daemon=True,
             name=f"probe-worker-{i}",
         )
         p.start()
-        processes.append(p)
+        return p
+
+    def start_publisher() -> multiprocessing.Process:
+        p = multiprocessing.Process(
+            target=run_publisher, args=(table.name, channels), daemon=True, name="probe-publisher"
+        )
+        p.start()
+        return p
+
+    publisher = start_publisher()
+    logger.info("Started publisher for %d channels", len(channels))
+    processes = []
+    for i, chunk in enumerate(chunks):
+        processes.append(start_worker(i))
         logger.info("Started worker %d with %d channels", i, len(chunk))
 
+    # docker stop 发 SIGTERM，Ctrl-C 为 SIGINT：都只结束监管循环，按下面的顺序停止子进程
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
     try:
-        while True:
-            await asyncio.sleep(30)
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=30)
+                break
+            except asyncio.TimeoutError:
+                pass
+            if not publisher.is_alive():
+                logger.warning("Publisher died, restarting...")
+                publisher = start_publisher()
             for i, p in enumerate(processes):
                 if not p.is_alive():
                     logger.warning("Worker %d died, restarting...", i)
-                    new_p = multiprocessing.Process(
-                        target=run_worker,
-                        args=(i, chunks[i]),
-                        daemon=True,
-                        name=f"probe-worker-{i}",
-                    )
-                    new_p.start()
-                    processes[i] = new_p
-    except KeyboardInterrupt:
+                    processes[i] = start_worker(i)
+
         logger.info("Shutting down...")
         for p in processes:
             p.terminate()
         for p in processes:
             p.join(timeout=5)
+        # worker 停止后再停发布进程，最后一轮状态也能写出
+        publisher.terminate()
+        publisher.join(timeout=20)
+    finally:
+        # 子进程都已退出后再释放共享内存
+        table.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,219 @@
+"""发布进程：扫描共享内存状态表，集中完成全部 Redis / InfluxDB / SQLite 写入。
+
+worker 只负责收流与分析，把每秒的指标写入状态表（status_table.py）；本进程每
+PUBLISH_SCAN_INTERVAL_MS 整表拷贝一次，把 seq 有变化的行交给同一组写入器，
+连接数与写入批次与 worker 数无关。
+"""
+import asyncio
+import logging
+import signal
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from config import (
+    ALERT_ARCHIVE_BATCH_SIZE,
+    ALERT_ARCHIVE_INTERVAL_SEC,
+    ALERT_RETENTION_DAYS,
+    PUBLISH_SCAN_INTERVAL_MS,
+    STATUS_TRANSPORT,
+)
+from status_machine import AlertType, ChannelMetrics, ChannelStatus, get_active_alerts
+from status_table import StatusTable, decode
+from storage.influx_writer import InfluxBatchWriter
+from storage.metadata_sync import ChannelMetadataSync
+from storage.redis_writer import RedisStateWriter
+from storage.ring_store import RingStore
+from storage.status_relay import StatusRelay
+from storage.sqlite_db import ChannelConfig, SQLiteDB
+
+logger = logging.getLogger(__name__)
+
+SEVERITY = {
+    AlertType.BLACK_SCREEN: "CRITICAL",
+    AlertType.FROZEN: "CRITICAL",
+    AlertType.SILENT: "CRITICAL",
+    AlertType.OFFLINE: "CRITICAL",
+    AlertType.CLIPPING: "WARNING",
+    AlertType.CC_ERROR: "WARNING",
+    AlertType.PCR_JITTER: "WARNING",
+    AlertType.BITRATE_ABNORMAL: "WARNING",
+    AlertType.MOSAIC: "WARNING",
+    AlertType.AUDIO_STUTTER: "WARNING",
+}
+
+# 条件消失时自动解除的告警及对应的指标标志
+AUTO_RESOLVE = {
+    AlertType.OFFLINE: "is_offline",
+    AlertType.BLACK_SCREEN: "is_black",
+    AlertType.FROZEN: "is_frozen",
+    AlertType.SILENT: "is_silent",
+    AlertType.MOSAIC: "is_mosaic",
+    AlertType.AUDIO_STUTTER: "is_stuttering",
+    AlertType.CLIPPING: "is_clipping",
+}
+
+
+class Publisher:
+    def __init__(self, table_name: str, channels: List[ChannelConfig]):
+        self.table_name = table_name
+        self.channel_ids = [ch.id for ch in channels]
+        self._last_seq = np.zeros(len(channels), dtype=np.uint32)
+        self._published_alerts: Dict[str, int] = {}  # "channel_id:alert_type" -> alert_id
+        # 每个频道上次仍处于告警条件的类型；首个采样前未知，此时全部解除一次（覆盖重启前遗留的告警）
+        self._raised: Dict[str, Set[AlertType]] = {}
+        self.samples = 0
+        self.skipped = 0
+        self._reported_skips = 0
+
+    def run(self):
+        asyncio.run(self._async_run())
+
+    async def _async_run(self):
+        logging.basicConfig(
+            level=logging.INFO,
+            format="[Publisher] %(asctime)s %(levelname)s %(message)s",
+        )
+        table = StatusTable.attach(self.table_name, len(self.channel_ids))
+        logger.info("Publisher starting for %d channels", len(self.channel_ids))
+
+        self.sqlite_db = SQLiteDB()
+        await self.sqlite_db.start()
+
+        relay = None
+        if STATUS_TRANSPORT == "uds":
+            relay = StatusRelay()
+            await relay.start()
+        self.redis_writer = RedisStateWriter(relay=relay)
+        await self.redis_writer.start()
+        await self.redis_writer.reset_influx_stats()
+
+        self.metadata_sync = ChannelMetadataSync(self.sqlite_db)
+        await self.metadata_sync.start()
+
+        self.influx_writer = InfluxBatchWriter(stats_callback=self.redis_writer.report_influx_stats)
+        try:
+            await self.influx_writer.start()
+        except Exception as e:
+            logger.warning("InfluxDB not available: %s", e)
+
+        self.ring_store = RingStore()
+
+        # main.py 在 worker 退出后用 SIGTERM 停止本进程：取消扫描循环，让下面的清理照常执行；
+        # 终端 Ctrl-C 的 SIGINT 会发给整个进程组，这里忽略，等 main.py 按顺序停止
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        loop.add_signal_handler(signal.SIGINT, lambda: None)
+
+        retention_task = asyncio.create_task(self._alert_retention_loop())
+        try:
+            interval = PUBLISH_SCAN_INTERVAL_MS / 1000.0
+            while True:
+                await self.scan(table)
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            logger.info("Publisher stopping")
+            # worker 已先停止，最后扫描一次
+            try:
+                await self.scan(table)
+            except Exception as e:
+                logger.warning("Final scan error: %s", e)
+        finally:
+            retention_task.cancel()
+            await self.metadata_sync.stop()
+            await self.redis_writer.stop()
+            await self.influx_writer.stop()
+            await self.sqlite_db.stop()
+            if relay is not None:
+                await relay.stop()
+            table.close()
+
+    async def scan(self, table: StatusTable):
+        snap, ok = table.snapshot()
+        seq = snap["seq"]
+        fresh = np.flatnonzero(ok & (seq != self._last_seq) & (seq > 0))
+        if not len(fresh):
+            return
+        # 两次扫描之间 worker 写了不止一次时，中间的采样被覆盖
+        previous = self._last_seq[fresh]
+        self.skipped += int(np.maximum((seq[fresh] - previous) // 2 - 1, 0)[previous > 0].sum())
+        self._last_seq[fresh] = seq[fresh]
+
+        raised: List[Tuple[ChannelMetrics, ChannelStatus, AlertType]] = []
+        resolved: List[Tuple[str, str]] = []
+        for i in fresh:
+            channel_id = self.channel_ids[i]
+            metrics, status, metadata = decode(snap[i], channel_id)
+            self.samples += 1
+            self.redis_writer.update_channel_status(metrics, status)
+            self.influx_writer.write_metrics(metrics, status)
+            self.ring_store.write(metrics, status)
+            self.metadata_sync.update(channel_id, metadata)
+
+            active = set(get_active_alerts(metrics))
+            raised += ((metrics, status, alert_type) for alert_type in active)
+            previous_raised = self._raised.get(channel_id)
+            for alert_type, flag in AUTO_RESOLVE.items():
+                if getattr(metrics, flag):
+                    continue
+                if previous_raised is None or alert_type in previous_raised:
+                    self._published_alerts.pop(f"{channel_id}:{alert_type.value}", None)
+                    resolved.append((channel_id, alert_type.value))
+            self._raised[channel_id] = active
+
+        for metrics, status, alert_type in raised:
+            await self._raise_alert(metrics, status, alert_type)
+        if resolved:
+            try:
+                await self.sqlite_db.resolve_alerts(resolved)
+            except Exception as e:
+                logger.warning("Alert resolve error: %s", e)
+                # 下次扫描重新解除
+                for channel_id, _ in resolved:
+                    self._raised.pop(channel_id, None)
+
+        if self.skipped != self._reported_skips:
+            logger.warning(
+                "Publisher fell behind, %d samples overwritten before scan (total %d)",
+                self.skipped - self._reported_skips, self.skipped,
+            )
+            self._reported_skips = self.skipped
+
+    async def _raise_alert(self, metrics: ChannelMetrics, status: ChannelStatus, alert_type: AlertType):
+        key = f"{metrics.channel_id}:{alert_type.value}"
+        severity = SEVERITY.get(alert_type, "WARNING")
+        try:
+            alert_id = await self.sqlite_db.upsert_alert(
+                channel_id=metrics.channel_id,
+                channel_name=metrics.channel_name,
+                alert_type=alert_type.value,
+                severity=severity,
+                message=f"{metrics.channel_name}: {alert_type.value}",
+                thumbnail_path=metrics.thumbnail_path,
+            )
+            if self._published_alerts.get(key) != alert_id:
+                self._published_alerts[key] = alert_id
+                await self.redis_writer.publish_alert(
+                    {
+                        "type": "alert_new",
+                        "alert_id": alert_id,
+                        "channel_id": metrics.channel_id,
+                        "channel_name": metrics.channel_name,
+                        "alert_type": alert_type.value,
+                        "severity": severity,
+                        "status": status.value,
+                        "ts": metrics.timestamp,
+                    }
+                )
+        except Exception as e:
+            logger.debug("Alert upsert error: %s", e)
+
+    async def _alert_retention_loop(self):
+        while True:
+            try:
+                archived = await self.sqlite_db.archive_resolved_alerts(ALERT_RETENTION_DAYS, ALERT_ARCHIVE_BATCH_SIZE)
+                if archived:
+                    logger.info("Archived %d alerts older than %d days", archived, ALERT_RETENTION_DAYS)
+            except Exception as e:
+                logger.warning("Alert archive error: %s", e)
+            await asyncio.sleep(ALERT_ARCHIVE_INTERVAL_SEC)
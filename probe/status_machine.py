@@ -37,6 +37,7 @@ class ChannelMetrics:
     is_stuttering: bool = False
     stutter_count: int = 0
     cc_errors_per_sec: float = 0.0
+    rx_dropped_per_sec: float = 0.0  # 接收缓冲区溢出被内核丢弃的数据报（探针过载，而非网络丢包）
     pcr_jitter_ms: float = 0.0
     bitrate_kbps: float = 0.0
     expected_bitrate_kbps: float = 0.0
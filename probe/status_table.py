@@ -0,0 +1,132 @@
+"""worker 进程与发布进程之间的共享内存状态表。
+
+multiprocessing.shared_memory 上的一个 NumPy 结构化数组，每个频道一行，行号由 main.py 分配。
+每行只有所属 worker 一个写者，用 seqlock 保护：写前 seq 置为奇数，写完再加一为偶数；
+读者先单独读出 seq 列，再拷贝整表，最后再读一次 seq 列，两次不同或为奇数的行视为写到一半，
+重读该行。三步是各自独立的 NumPy 操作，不依赖结构化数组拷贝内部的字段顺序；
+写者与读者的各步在 x86（TSO）上按程序顺序可见，CPython 下无需额外的内存屏障。
+"""
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from aggregator import STATUS_CODES
+from status_machine import ChannelMetrics, ChannelStatus
+from storage.metadata_sync import ChannelMetadata
+
+_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+
+_FLAGS = ("is_offline", "is_black", "is_frozen", "is_silent", "is_clipping", "is_mosaic", "is_stuttering")
+_FLOATS = (
+    "mosaic_ratio", "cc_errors_per_sec", "rx_dropped_per_sec", "pcr_jitter_ms", "bitrate_kbps",
+    "expected_bitrate_kbps", "audio_rms", "video_brightness",
+)
+_PIDS = ("video_pid", "audio_pid", "pcr_pid")
+# 字符串按 UTF-8 截断到定长
+_STRINGS = {
+    "channel_name": 128, "thumbnail_path": 256,
+    "service_name": 128, "provider_name": 128, "event_name": 256, "video_codec": 16, "audio_codec": 16,
+}
+
+ROW_DTYPE = np.dtype(
+    [("seq", np.uint32), ("timestamp", np.float64), ("status", np.uint8), ("stutter_count", np.int32)]
+    + [(name, np.bool_) for name in _FLAGS]
+    + [(name, np.float64) for name in _FLOATS]
+    + [(name, np.int32) for name in _PIDS]
+    + [(name, f"S{size}") for name, size in _STRINGS.items()]
+)
+
+SNAPSHOT_RETRIES = 3
+
+
+class StatusTable:
+    def __init__(self, shm: shared_memory.SharedMemory, rows: int, owner: bool = False):
+        self._shm = shm
+        self._owner = owner
+        self.rows = np.ndarray((rows,), dtype=ROW_DTYPE, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, rows: int) -> "StatusTable":
+        shm = shared_memory.SharedMemory(create=True, size=max(rows, 1) * ROW_DTYPE.itemsize)
+        table = cls(shm, rows, owner=True)
+        table.rows[:] = np.zeros(rows, dtype=ROW_DTYPE)
+        return table
+
+    @classmethod
+    def attach(cls, name: str, rows: int) -> "StatusTable":
+        return cls(shared_memory.SharedMemory(name=name), rows)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def close(self):
+        self.rows = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    # ── 写入（worker） ────────────────────────────────────────────
+    def write(self, row: int, metrics: ChannelMetrics, status: ChannelStatus, metadata: Optional[ChannelMetadata]):
+        metadata = metadata or ChannelMetadata()
+        # 写入总从奇数开始：上一个写者中途退出时 seq 停在奇数，不能再加一成偶数
+        cur = int(self.rows["seq"][row])
+        seq = cur + 1 if cur % 2 == 0 else cur + 2
+        self.rows["seq"][row] = seq
+        self.rows[row] = (
+            seq,
+            metrics.timestamp or time.time(),
+            STATUS_CODES[status],
+            metrics.stutter_count,
+            *(getattr(metrics, name) for name in _FLAGS),
+            *(getattr(metrics, name) for name in _FLOATS),
+            *(getattr(metadata, name) for name in _PIDS),
+            metrics.channel_name.encode(),
+            metrics.thumbnail_path.encode(),
+            *(getattr(metadata, name).encode() for name in ("service_name", "provider_name", "event_name")),
+            metadata.video_codec.encode(),
+            metadata.audio_codec.encode(),
+        )
+        self.rows["seq"][row] = seq + 1
+
+    # ── 读取（发布进程） ──────────────────────────────────────────
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """整表的一致拷贝与逐行是否一致的掩码；重试后仍在写入中的行留到下次扫描"""
+        seq = self.rows["seq"]
+        before = seq.copy()
+        snap = self.rows.copy()
+        after = seq.copy()
+        ok = (before == after) & (before % 2 == 0)
+        for _ in range(SNAPSHOT_RETRIES):
+            torn = np.flatnonzero(~ok)
+            if not len(torn):
+                break
+            before[torn] = seq[torn]
+            snap[torn] = self.rows[torn]
+            after[torn] = seq[torn]
+            ok[torn] = (before[torn] == after[torn]) & (before[torn] % 2 == 0)
+        # 行内拷贝到的 seq 可能与其余字段不同步，以前后一致的读数为准
+        snap["seq"] = before
+        return snap, ok
+
+
+def decode(row: np.void, channel_id: str) -> Tuple[ChannelMetrics, ChannelStatus, ChannelMetadata]:
+    def text(name: str) -> str:
+        return row[name].decode("utf-8", "ignore")
+
+    metrics = ChannelMetrics(
+        channel_id=channel_id,
+        channel_name=text("channel_name"),
+        stutter_count=int(row["stutter_count"]),
+        thumbnail_path=text("thumbnail_path"),
+        timestamp=float(row["timestamp"]),
+        **{name: bool(row[name]) for name in _FLAGS},
+        **{name: float(row[name]) for name in _FLOATS},
+    )
+    metadata = ChannelMetadata(
+        **{name: int(row[name]) for name in _PIDS},
+        **{name: text(name) for name in ("service_name", "provider_name", "event_name", "video_codec", "audio_codec")},
+    )
+    return metrics, _STATUSES[int(row["status"])], metadata
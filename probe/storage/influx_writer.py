@@ -1,10 +1,11 @@
 import asyncio
+import collections
+import gzip
 import logging
-from datetime import datetime, timezone
-from typing import List
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
 
-from influxdb_client import Point, WritePrecision
-from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+import aiohttp
 
 from config import (
     INFLUXDB_BUCKET,
@@ -12,83 +13,272 @@ from config import (
     INFLUXDB_TOKEN,
     INFLUXDB_URL,
     INFLUX_BATCH_SIZE,
+    INFLUX_BUFFER_MAX_POINTS,
     INFLUX_FLUSH_INTERVAL_MS,
+    INFLUX_MAX_POINTS_PER_WRITE,
+    INFLUX_SPOOL_DIR,
+    INFLUX_SPOOL_MAX_MB,
+    INFLUX_SPOOL_REPLAY_POINTS_PER_SEC,
+    INFLUX_SPOOL_SEGMENT_MB,
+    INFLUX_STATS_INTERVAL_SEC,
 )
+from aggregator import CONTINUOUS_FIELDS, FLAG_FIELDS, ChannelAggregator, WindowStats
 from status_machine import ChannelMetrics, ChannelStatus
+from storage.spool import DiskSpool
 
 logger = logging.getLogger(__name__)
 
+MEASUREMENT = "channel_metrics"
+
+# 唯一的标签是 channel_id：频道名只存 SQLite，状态写为整数字段，
+# 改名或状态切换都不会产生新序列
+_TAG_ESCAPE = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\\": "\\\\"})
+
+# 连续量字段的小数位
+_DIGITS = {
+    "bitrate_kbps": 1, "cc_errors_per_sec": 2, "pcr_jitter_ms": 2,
+    "video_brightness": 1, "audio_rms": 5, "mosaic_ratio": 4, "rx_dropped_per_sec": 1,
+}
+_ROUND = [_DIGITS[name] for name in CONTINUOUS_FIELDS]
+
+
+def _tag_prefix(channel_id: str) -> str:
+    return f"{MEASUREMENT},channel_id={channel_id.translate(_TAG_ESCAPE)} "
+
+
+def _f(value: float, ndigits: int) -> float:
+    # 行协议不接受 NaN/Inf，整批会被拒绝（NaN 不等于自身）
+    value = round(float(value), ndigits)
+    return value if value == value and abs(value) != float("inf") else 0.0
+
+
+def format_window(prefix: str, w: WindowStats) -> str:
+    """一个导出点的行协议（秒精度）。
+
+    字段名与逐秒采样一致（连续量为窗口均值、标志为窗口内是否出现过），便于查询侧统一处理；
+    多个采样聚合的点另带 samples、*_min/*_max/*_last、*_samples 与 status_code_max；
+    查询与降采样任务取 min/max 时把 *_min/*_max 并入同名字段，窗口内的尖峰不会被均值抹平。
+    """
+    n = w.samples
+    fields = [f"status_code={w.status_code}i"]
+    for i, name in enumerate(CONTINUOUS_FIELDS):
+        fields.append(f"{name}={_f(w.sums[i] / n, _ROUND[i])}")
+    for i, name in enumerate(FLAG_FIELDS):
+        fields.append(f"{name}={int(w.flag_counts[i] > 0)}i")
+    fields.append(f"stutter_count={w.stutter_count}i")
+    if n > 1:
+        fields.append(f"samples={n}i")
+        fields.append(f"status_code_max={w.status_code_max}i")
+        for i, name in enumerate(CONTINUOUS_FIELDS):
+            fields.append(f"{name}_min={_f(w.mins[i], _ROUND[i])}")
+            fields.append(f"{name}_max={_f(w.maxs[i], _ROUND[i])}")
+            fields.append(f"{name}_last={_f(w.lasts[i], _ROUND[i])}")
+        for i, name in enumerate(FLAG_FIELDS):
+            fields.append(f"{name}_samples={w.flag_counts[i]}i")
+    return f"{prefix}{','.join(fields)} {int(w.timestamp or time.time())}"
+
 
 class InfluxBatchWriter:
-    def __init__(self):
-        self._client: InfluxDBClientAsync | None = None
-        self._write_api = None
-        self._buffer: List[Point] = []
-        self._lock = asyncio.Lock()
+    """行协议批量写入：write_metrics 只格式化并追加到有界缓冲区，由后台任务在线程中
+    gzip 压缩后直接 POST /api/v2/write。
+
+    写入失败（连接错误 / 5xx）的批次落入磁盘缓冲（INFLUX_SPOOL_DIR），此后新批次也先落盘，
+    由同一后台任务按序限速回放，保证写入顺序；未配置磁盘缓冲时放回内存缓冲区队首重试。
+    内存缓冲区满时丢弃最旧的点并计数；4xx 表示数据本身被拒绝，直接丢弃。
+    """
+
+    def __init__(
+        self,
+        worker_id: int = 0,
+        stats_callback: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ):
+        self.worker_id = worker_id
+        self._stats_callback = stats_callback
+        self._spool: DiskSpool | None = None
+        self._session: aiohttp.ClientSession | None = None
+        self._buffer: Deque[str] = collections.deque()
+        self._prefixes: Dict[str, str] = {}
+        self._aggregators: Dict[str, ChannelAggregator] = {}
+        self._wakeup = asyncio.Event()
         self._flush_task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed_writes = 0
+        self.replayed = 0
+        self._replay_tokens = 0.0
+        self._replay_at = time.monotonic()
+        self._reported_drops = 0
+        self._stats_at = 0.0
 
     async def start(self):
-        self._client = InfluxDBClientAsync(
-            url=INFLUXDB_URL,
-            token=INFLUXDB_TOKEN,
-            org=INFLUXDB_ORG,
+        if INFLUX_SPOOL_DIR:
+            self._spool = DiskSpool(
+                f"{INFLUX_SPOOL_DIR}/worker-{self.worker_id}",
+                max_bytes=INFLUX_SPOOL_MAX_MB * 1024 * 1024,
+                segment_bytes=INFLUX_SPOOL_SEGMENT_MB * 1024 * 1024,
+            )
+            await asyncio.to_thread(self._spool.open)
+        self._session = aiohttp.ClientSession(
+            headers={
+                "Authorization": f"Token {INFLUXDB_TOKEN}",
+                "Content-Type": "text/plain; charset=utf-8",
+                "Content-Encoding": "gzip",
+            },
+            timeout=aiohttp.ClientTimeout(total=10),
         )
-        self._write_api = self._client.write_api()
         self._flush_task = asyncio.create_task(self._flush_loop())
 
     async def stop(self):
         if self._flush_task:
             self._flush_task.cancel()
-        await self._flush_now()
-        if self._client:
-            await self._client.close()
-
-    async def write_metrics(self, metrics: ChannelMetrics, status: ChannelStatus):
-        point = (
-            Point("channel_metrics")
-            .tag("channel_id", metrics.channel_id)
-            .tag("channel_name", metrics.channel_name)
-            .tag("status", status.value)
-            .field("bitrate_kbps", float(metrics.bitrate_kbps))
-            .field("cc_errors_per_sec", float(metrics.cc_errors_per_sec))
-            .field("pcr_jitter_ms", float(metrics.pcr_jitter_ms))
-            .field("video_brightness", float(metrics.video_brightness))
-            .field("audio_rms", float(metrics.audio_rms))
-            .field("is_black", int(metrics.is_black))
-            .field("is_frozen", int(metrics.is_frozen))
-            .field("is_silent", int(metrics.is_silent))
-            .field("is_clipping", int(metrics.is_clipping))
-            .field("is_mosaic", int(metrics.is_mosaic))
-            .field("mosaic_ratio", float(metrics.mosaic_ratio))
-            .field("is_stuttering", int(metrics.is_stuttering))
-            .field("stutter_count", int(metrics.stutter_count))
-            .time(datetime.now(timezone.utc), WritePrecision.SECONDS)
-        )
-        async with self._lock:
-            self._buffer.append(point)
-            if len(self._buffer) >= INFLUX_BATCH_SIZE:
-                await self._flush_now_locked()
+        for channel_id, aggregator in self._aggregators.items():
+            self._append(self._prefixes[channel_id], aggregator.drain())
+        if self._session is not None:
+            while self._buffer and await self._flush_once():
+                pass
+            await self._session.close()
+        if self._spool is not None:
+            self._spool.close()
+
+    def write_metrics(self, metrics: ChannelMetrics, status: ChannelStatus):
+        channel_id = metrics.channel_id
+        aggregator = self._aggregators.get(channel_id)
+        if aggregator is None:
+            aggregator = self._aggregators[channel_id] = ChannelAggregator()
+            self._prefixes[channel_id] = _tag_prefix(channel_id)
+        windows = aggregator.add(metrics, status)
+        if windows:
+            self._append(self._prefixes[channel_id], windows)
+
+    def _append(self, prefix: str, windows: List[WindowStats]):
+        for w in windows:
+            if len(self._buffer) >= INFLUX_BUFFER_MAX_POINTS:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(format_window(prefix, w))
+        if len(self._buffer) >= INFLUX_BATCH_SIZE:
+            self._wakeup.set()
 
     async def _flush_loop(self):
         interval = INFLUX_FLUSH_INTERVAL_MS / 1000.0
         while True:
-            await asyncio.sleep(interval)
-            await self._flush_now()
-
-    async def _flush_now(self):
-        async with self._lock:
-            await self._flush_now_locked()
-
-    async def _flush_now_locked(self):
-        if not self._buffer or self._write_api is None:
-            return
-        points = self._buffer[:]
-        self._buffer.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self._flush_once():
+                    await asyncio.sleep(interval)
+                    break
+            if self._spool is not None and self._spool.points:
+                await self._replay()
+            if self._stats_callback and time.monotonic() - self._stats_at >= INFLUX_STATS_INTERVAL_SEC:
+                self._stats_at = time.monotonic()
+                await self._stats_callback(self.stats())
+            if self.dropped != self._reported_drops:
+                logger.warning(
+                    "InfluxDB buffer full, dropped %d points (total %d)",
+                    self.dropped - self._reported_drops, self.dropped,
+                )
+                self._reported_drops = self.dropped
+
+    async def _flush_once(self) -> bool:
+        """写出一批；返回 False 表示 Influx 暂不可用且批次已放回内存缓冲区"""
+        n = min(len(self._buffer), INFLUX_MAX_POINTS_PER_WRITE)
+        lines: List[str] = [self._buffer.popleft() for _ in range(n)]
         try:
-            await self._write_api.write(
-                bucket=INFLUXDB_BUCKET,
-                org=INFLUXDB_ORG,
-                record=points,
-            )
+            # 压缩几千行需要数十毫秒，放到线程中避免阻塞采集循环
+            body = await asyncio.to_thread(gzip.compress, "\n".join(lines).encode(), 1)
+        except Exception as e:
+            self._requeue(lines, e)
+            return False
+        if self._spool is not None and self._spool.points:
+            # 磁盘上还有未回放的数据：新批次排在其后，保证按序写入
+            return await self._spool_batch(body, lines)
+        if await self._post(body, n):
+            return True
+        if self._spool is not None:
+            return await self._spool_batch(body, lines)
+        self._requeue(lines, "Influx unavailable")
+        return False
+
+    async def _post(self, body: bytes, n: int) -> bool:
+        """POST 一个 gzip 批次；True 表示已写入或被 Influx 拒绝（不再重试），False 表示暂时失败"""
+        try:
+            async with self._session.post(
+                f"{INFLUXDB_URL}/api/v2/write",
+                params={"org": INFLUXDB_ORG, "bucket": INFLUXDB_BUCKET, "precision": "s"},
+                data=body,
+            ) as resp:
+                if resp.status < 300:
+                    self.written += n
+                    return True
+                detail = await resp.text()
         except Exception as e:
-            logger.warning("InfluxDB write error: %s", e)
+            self.failed_writes += 1
+            logger.warning("InfluxDB write error (%d points): %s", n, e)
+            return False
+        if 400 <= resp.status < 500 and resp.status != 429:
+            logger.warning("InfluxDB rejected %d points (%d): %s", n, resp.status, detail[:200])
+            self.rejected += n
+            return True
+        self.failed_writes += 1
+        logger.warning("InfluxDB write error (%d points): HTTP %d", n, resp.status)
+        return False
+
+    async def _spool_batch(self, body: bytes, lines: List[str]) -> bool:
+        try:
+            await asyncio.to_thread(self._spool.append, body, len(lines))
+            return True
+        except Exception as e:
+            logger.error("Influx spool write failed: %s", e)
+            self._requeue(lines, e)
+            return False
+
+    async def _replay(self):
+        """按写入顺序回放磁盘缓冲，令牌桶限速为 INFLUX_SPOOL_REPLAY_POINTS_PER_SEC；写入失败则等下个周期"""
+        now = time.monotonic()
+        rate = INFLUX_SPOOL_REPLAY_POINTS_PER_SEC
+        self._replay_tokens = min(
+            self._replay_tokens + (now - self._replay_at) * rate, rate * INFLUX_FLUSH_INTERVAL_MS / 1000.0
+        )
+        self._replay_at = now
+        while self._replay_tokens > 0:
+            record = await asyncio.to_thread(self._spool.peek)
+            if record is None:
+                logger.info("Influx spool drained, %d points replayed so far", self.replayed)
+                return
+            payload, points = record
+            if not await self._post(payload, points):
+                return
+            await asyncio.to_thread(self._spool.commit, points)
+            self.replayed += points
+            self._replay_tokens -= points
+
+    def _requeue(self, lines: List[str], error):
+        logger.warning("%d points kept in memory for retry: %s", len(lines), error)
+        room = INFLUX_BUFFER_MAX_POINTS - len(self._buffer)
+        if room < len(lines):
+            self.dropped += len(lines) - max(room, 0)
+            lines = lines[len(lines) - max(room, 0):]
+        self._buffer.extendleft(reversed(lines))
+
+    def stats(self) -> Dict[str, Any]:
+        spool = self._spool
+        return {
+            "worker_id": self.worker_id,
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed_writes": self.failed_writes,
+            "spool_enabled": spool is not None,
+            "spool_points": spool.points if spool else 0,
+            "spool_bytes": spool.bytes if spool else 0,
+            "spool_segments": len(spool) if spool else 0,
+            "spool_dropped": spool.dropped_points if spool else 0,
+            "replayed": self.replayed,
+            "updated_at": time.time(),
+        }
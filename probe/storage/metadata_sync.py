@@ -0,0 +1,76 @@
+import asyncio
+import dataclasses
+import logging
+from dataclasses import dataclass
+from typing import Dict
+
+from config import METADATA_FLUSH_INTERVAL_SEC
+from storage.sqlite_db import SQLiteDB
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChannelMetadata:
+    """SDT/EIT/PMT 解析出的频道元数据；空串与 -1 表示尚未解析到"""
+    service_name: str = ""
+    provider_name: str = ""
+    event_name: str = ""
+    video_pid: int = -1
+    audio_pid: int = -1
+    pcr_pid: int = -1
+    video_codec: str = ""
+    audio_codec: str = ""
+
+    def merged_onto(self, base: "ChannelMetadata") -> "ChannelMetadata":
+        known = {
+            f.name: getattr(self, f.name)
+            for f in dataclasses.fields(self)
+            if getattr(self, f.name) not in ("", -1)
+        }
+        return dataclasses.replace(base, **known)
+
+
+class ChannelMetadataSync:
+    """Write-behind 元数据同步：每秒比对，只把真正变化的频道按批写入 SQLite"""
+
+    def __init__(self, sqlite_db: SQLiteDB, flush_interval: float = METADATA_FLUSH_INTERVAL_SEC):
+        self.sqlite_db = sqlite_db
+        self.flush_interval = flush_interval
+        self._written: Dict[str, ChannelMetadata] = {}
+        self._pending: Dict[str, ChannelMetadata] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def start(self):
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
+
+    def update(self, channel_id: str, metadata: ChannelMetadata):
+        base = self._pending.get(channel_id) or self._written.get(channel_id) or ChannelMetadata()
+        merged = metadata.merged_onto(base)
+        if merged == self._written.get(channel_id):
+            self._pending.pop(channel_id, None)
+        elif merged != ChannelMetadata():
+            self._pending[channel_id] = merged
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await self.sqlite_db.update_channel_metadata(batch)
+            self._written.update(batch)
+        except Exception as e:
+            logger.warning("Channel metadata sync error: %s", e)
+            # 写失败则放回，期间更新过的频道以较新的值为准
+            for channel_id, metadata in batch.items():
+                self._pending.setdefault(channel_id, metadata)
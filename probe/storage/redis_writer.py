@@ -1,109 +1,249 @@
+import asyncio
 import json
 import logging
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import redis.asyncio as aioredis
 
-from config import REDIS_URL
+from config import (
+    ALERT_STREAM_MAXLEN,
+    REDIS_URL,
+    STATUS_DEADBAND_ABS,
+    STATUS_DEADBAND_REL,
+    STATUS_FLUSH_INTERVAL_MS,
+    STATUS_KEYFRAME_INTERVAL_SEC,
+    STATUS_STREAM_MAXLEN,
+)
 from status_machine import ChannelMetrics, ChannelStatus
+from storage.status_relay import StatusRelay
 
 logger = logging.getLogger(__name__)
 
 STATUS_TTL = 30
 
+# 频道状态索引（API 侧 db/redis_client.py 使用同样的键名）
+INDEX_KEY = "channels:index"                  # zset: channel_id -> updated_at
+LAST_STATUS_KEY = "channels:last_status"      # hash: channel_id -> status
+STATUS_COUNTS_KEY = "channels:status_counts"  # hash: status -> 频道数
+
+# 事件流，条目为 {"data": <JSON 消息>}
+STATUS_STREAM = "stream:status"
+ALERT_STREAM = "stream:alerts"
+
+INFLUX_WRITER_STATS_KEY = "probe:influx_writer"  # hash: worker_id -> JSON 统计
+
+# KEYS: 状态 hash, 索引, last_status, status_counts
+# ARGV: channel_id, now, ttl, status, field1, value1, ...
+_WRITE_STATUS_LUA = """
+local cid, now, status = ARGV[1], ARGV[2], ARGV[4]
+if #ARGV > 4 then
+  redis.call('HSET', KEYS[1], 'updated_at', now, unpack(ARGV, 5))
+else
+  redis.call('HSET', KEYS[1], 'updated_at', now)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], now, cid)
+local prev = redis.call('HGET', KEYS[3], cid)
+if prev ~= status then
+  if prev then redis.call('HINCRBY', KEYS[4], prev, -1) end
+  redis.call('HINCRBY', KEYS[4], status, 1)
+  redis.call('HSET', KEYS[3], cid, status)
+end
+"""
+
+
+def _status_mapping(metrics: ChannelMetrics, status: ChannelStatus) -> Dict[str, Any]:
+    return {
+        "status": status.value,
+        "channel_name": metrics.channel_name,
+        "bitrate_kbps": round(metrics.bitrate_kbps, 1),
+        "is_black": int(metrics.is_black),
+        "is_frozen": int(metrics.is_frozen),
+        "is_silent": int(metrics.is_silent),
+        "is_clipping": int(metrics.is_clipping),
+        "is_mosaic": int(metrics.is_mosaic),
+        "mosaic_ratio": round(metrics.mosaic_ratio, 4),
+        "is_stuttering": int(metrics.is_stuttering),
+        "stutter_count": metrics.stutter_count,
+        "cc_errors_per_sec": round(metrics.cc_errors_per_sec, 2),
+        "rx_dropped_per_sec": round(metrics.rx_dropped_per_sec, 1),
+        "pcr_jitter_ms": round(metrics.pcr_jitter_ms, 2),
+        "audio_rms": round(metrics.audio_rms, 5),
+        "video_brightness": round(metrics.video_brightness, 1),
+        "thumbnail_path": metrics.thumbnail_path,
+    }
+
+
+def _changed_fields(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, Any]:
+    changed = {}
+    for field, value in cur.items():
+        old = prev.get(field)
+        if field in STATUS_DEADBAND_ABS:
+            if abs(value - old) < STATUS_DEADBAND_ABS[field]:
+                continue
+        elif field in STATUS_DEADBAND_REL:
+            if abs(value - old) <= STATUS_DEADBAND_REL[field] * max(abs(old), 1e-9):
+                continue
+        elif value == old:
+            continue
+        changed[field] = value
+    return changed
+
 
 class RedisStateWriter:
-    def __init__(self):
+    """按 tick 攒批：本 worker 全部频道的状态在一个 pipeline 内写入，并只发布一条批量消息。
+
+    消息只携带超出死区的变化字段；每 STATUS_KEYFRAME_INTERVAL_SEC 发一次全量关键帧。
+    (epoch, seq) 严格递增，消费方据此发现丢包或探针重启并重新同步。
+    配置了 relay（STATUS_TRANSPORT=uds）时批量消息经 Unix 域套接字直接发给 API，
+    Redis 只保存状态 hash 供播种与重连，不再写入状态流。
+    """
+
+    def __init__(self, worker_id: int = 0, relay: Optional[StatusRelay] = None):
+        self.worker_id = worker_id
+        self._relay = relay
         self._redis: aioredis.Redis | None = None
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._published: Dict[str, Dict[str, Any]] = {}
+        self._reported: set = set()
+        self._flush_task: asyncio.Task | None = None
+        self._epoch = int(time.time() * 1000)
+        self._seq = 0
+        self._last_keyframe = 0.0
 
     async def start(self):
         self._redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        self._write_status = self._redis.register_script(_WRITE_STATUS_LUA)
+        self._flush_task = asyncio.create_task(self._flush_loop())
 
     async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
         if self._redis:
             await self._redis.aclose()
 
-    async def update_channel_status(
+    def update_channel_status(
         self,
         metrics: ChannelMetrics,
         status: ChannelStatus,
     ):
+        # 同一 tick 内同一频道只保留最新一次
+        self._pending[metrics.channel_id] = _status_mapping(metrics, status)
+
+    async def _flush_loop(self):
+        interval = STATUS_FLUSH_INTERVAL_MS / 1000.0
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    async def flush(self):
         if self._redis is None:
             return
-        key = f"channel:{metrics.channel_id}:status"
-        mapping: Dict[str, Any] = {
-            "status": status.value,
-            "channel_name": metrics.channel_name,
-            "bitrate_kbps": metrics.bitrate_kbps,
-            "is_black": int(metrics.is_black),
-            "is_frozen": int(metrics.is_frozen),
-            "is_silent": int(metrics.is_silent),
-            "is_clipping": int(metrics.is_clipping),
-            "is_mosaic": int(metrics.is_mosaic),
-            "mosaic_ratio": metrics.mosaic_ratio,
-            "is_stuttering": int(metrics.is_stuttering),
-            "stutter_count": metrics.stutter_count,
-            "cc_errors_per_sec": metrics.cc_errors_per_sec,
-            "pcr_jitter_ms": metrics.pcr_jitter_ms,
-            "audio_rms": metrics.audio_rms,
-            "video_brightness": metrics.video_brightness,
-            "thumbnail_path": metrics.thumbnail_path,
-            "updated_at": time.time(),
+        now = time.time()
+        keyframe = now - self._last_keyframe >= STATUS_KEYFRAME_INTERVAL_SEC
+        if not self._pending and not keyframe:
+            return
+        batch, self._pending = self._pending, {}
+
+        writes: Dict[str, Dict[str, Any]] = {}
+        self._reported.update(batch)
+        for channel_id, mapping in batch.items():
+            prev = self._published.get(channel_id)
+            changed = mapping if prev is None else _changed_fields(prev, mapping)
+            if changed:
+                self._published.setdefault(channel_id, {}).update(changed)
+                writes[channel_id] = changed
+        if keyframe:
+            # 关键帧：上个周期内有上报的频道全量字段，同时刷新 updated_at 与 TTL；
+            # 已停止监测的频道不再续期，交由 TTL 过期判为离线
+            for channel_id in set(self._published) - self._reported:
+                del self._published[channel_id]
+            self._reported = set()
+            writes = {cid: dict(m) for cid, m in self._published.items()}
+        if not writes:
+            return
+
+        self._seq += 1
+        msg = {
+            "type": "channel_status_batch",
+            "worker_id": self.worker_id,
+            "epoch": self._epoch,
+            "seq": self._seq,
+            "keyframe": keyframe,
+            "ts": now,
+            "channels": [{"channel_id": cid, **f} for cid, f in writes.items()],
         }
+        if self._relay is not None:
+            # 本机直连：先于 Redis 写入送达 API
+            self._relay.publish(msg)
         try:
-            pipe = self._redis.pipeline()
-            pipe.hset(key, mapping=mapping)
-            pipe.expire(key, STATUS_TTL)
-            pipe.publish(
-                "metrics_update",
-                json.dumps(
-                    {
-                        "type": "channel_status",
-                        "channel_id": metrics.channel_id,
-                        "status": status.value,
-                        "channel_name": metrics.channel_name,
-                        "bitrate_kbps": metrics.bitrate_kbps,
-                        "is_black": metrics.is_black,
-                        "is_frozen": metrics.is_frozen,
-                        "is_silent": metrics.is_silent,
-                        "is_clipping": metrics.is_clipping,
-                        "is_mosaic": metrics.is_mosaic,
-                        "mosaic_ratio": metrics.mosaic_ratio,
-                        "is_stuttering": metrics.is_stuttering,
-                        "stutter_count": metrics.stutter_count,
-                        "cc_errors_per_sec": metrics.cc_errors_per_sec,
-                        "pcr_jitter_ms": metrics.pcr_jitter_ms,
-                        "audio_rms": metrics.audio_rms,
-                        "video_brightness": metrics.video_brightness,
-                        "thumbnail_path": metrics.thumbnail_path,
-                        "ts": time.time(),
-                    }
-                ),
-            )
+            pipe = self._redis.pipeline(transaction=False)
+            for channel_id, fields in writes.items():
+                # 状态 hash、索引与状态计数在同一脚本内原子更新
+                args = [channel_id, now, STATUS_TTL, self._published[channel_id]["status"]]
+                for field, value in fields.items():
+                    args += (field, value)
+                await self._write_status(
+                    keys=[f"channel:{channel_id}:status", INDEX_KEY, LAST_STATUS_KEY, STATUS_COUNTS_KEY],
+                    args=args,
+                    client=pipe,
+                )
+            if self._relay is None:
+                payload = json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+                pipe.xadd(STATUS_STREAM, {"data": payload}, maxlen=STATUS_STREAM_MAXLEN, approximate=True)
             await pipe.execute()
+            if keyframe:
+                self._last_keyframe = now
         except Exception as e:
             logger.warning("Redis write error: %s", e)
+            # 写失败后已发布状态不可信，下一 tick 强制关键帧
+            self._last_keyframe = 0.0
 
     async def publish_alert(self, alert_data: Dict):
+        """告警始终写 Redis Stream（uds 模式也一样），客户端重连靠它按 alerts_since 补发"""
         if self._redis is None:
             return
         try:
-            await self._redis.publish("alert_update", json.dumps(alert_data))
+            await self._redis.xadd(
+                ALERT_STREAM,
+                {"data": json.dumps(alert_data)},
+                maxlen=ALERT_STREAM_MAXLEN,
+                approximate=True,
+            )
         except Exception as e:
             logger.warning("Redis publish alert error: %s", e)
 
+    async def reset_influx_stats(self):
+        """清掉旧进程（或旧版本每个 worker）留下的写入统计"""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.delete(INFLUX_WRITER_STATS_KEY)
+        except Exception as e:
+            logger.warning("Redis reset influx stats error: %s", e)
+
+    async def report_influx_stats(self, stats: Dict[str, Any]):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.hset(INFLUX_WRITER_STATS_KEY, str(self.worker_id), json.dumps(stats))
+        except Exception as e:
+            logger.warning("Redis write influx stats error: %s", e)
+
     async def get_all_channel_statuses(self) -> Dict[str, Dict]:
         if self._redis is None:
             return {}
-        pattern = "channel:*:status"
         result = {}
         try:
-            keys = await self._redis.keys(pattern)
-            for key in keys:
-                channel_id = key.split(":")[1]
-                data = await self._redis.hgetall(key)
-                result[channel_id] = data
+            channel_ids = await self._redis.zrangebyscore(INDEX_KEY, time.time() - STATUS_TTL, "+inf")
+            pipe = self._redis.pipeline(transaction=False)
+            for channel_id in channel_ids:
+                pipe.hgetall(f"channel:{channel_id}:status")
+            for channel_id, data in zip(channel_ids, await pipe.execute()):
+                if data:
+                    result[channel_id] = data
         except Exception as e:
             logger.warning("Redis read error: %s", e)
         return result
@@ -0,0 +1,106 @@
+"""本地时序环形存储：每个频道最近 RING_HOURS 小时的逐秒指标。
+
+目录 RING_DIR/<channel_id>/ 下每个指标一个定长 .npy 文件（内存映射），
+槽位 = 采样秒 % 容量，写入为 O(1) 的数组赋值，只落到页缓存，探针重启后数据仍在。
+ts.npy 记录每个槽位实际写入的秒，读取方据此区分有效数据与过期 / 空槽位；
+since 文件记录环开始写入的时刻，此前的范围读取方改查 Influx。
+API 侧 db/ring.py 以只读方式映射同一批文件，字段名与类型取自 .npy 文件头。
+"""
+import logging
+import os
+import time
+from typing import Dict
+from urllib.parse import quote
+
+import numpy as np
+
+from aggregator import CONTINUOUS_FIELDS, FLAG_FIELDS, STATUS_CODES
+from config import RING_DIR, RING_HOURS
+from status_machine import ChannelMetrics, ChannelStatus
+
+logger = logging.getLogger(__name__)
+
+RING_COLUMNS = {
+    **{name: np.float32 for name in CONTINUOUS_FIELDS},
+    **{name: np.uint8 for name in FLAG_FIELDS},
+    "status_code": np.uint8,
+    "stutter_count": np.uint16,
+}
+TS_COLUMN = "ts"  # uint32 采样秒，0 为空槽位
+SINCE_FILE = "since"
+
+
+class ChannelRing:
+    def __init__(self, directory: str, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.capacity = capacity
+        self._created = False
+        self.columns: Dict[str, np.memmap] = {
+            name: self._open(directory, name, dtype) for name, dtype in RING_COLUMNS.items()
+        }
+        self.ts = self._open(directory, TS_COLUMN, np.uint32)
+        since = os.path.join(directory, SINCE_FILE)
+        if self._created or not os.path.exists(since):
+            # 有列被重建时旧数据不再完整，整个环从现在开始
+            self.ts[:] = 0
+            with open(since, "w") as f:
+                f.write(str(int(time.time())))
+
+    def _open(self, directory: str, name: str, dtype) -> np.memmap:
+        path = os.path.join(directory, f"{name}.npy")
+        try:
+            arr = np.load(path, mmap_mode="r+")
+            if arr.shape == (self.capacity,) and arr.dtype == np.dtype(dtype):
+                return arr
+            logger.info("Ring %s: layout changed, recreating", path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Ring %s unreadable, recreating: %s", path, e)
+        # 先写临时文件再改名，读取方不会映射到只写了一半的文件头
+        self._created = True
+        tmp = f"{path}.tmp"
+        np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(self.capacity,)).flush()
+        os.replace(tmp, path)
+        return np.load(path, mmap_mode="r+")
+
+    def write(self, metrics: ChannelMetrics, status: ChannelStatus):
+        second = int(metrics.timestamp)
+        slot = second % self.capacity
+        columns = self.columns
+        for name in CONTINUOUS_FIELDS:
+            columns[name][slot] = getattr(metrics, name)
+        for name in FLAG_FIELDS:
+            columns[name][slot] = getattr(metrics, name)
+        columns["status_code"][slot] = STATUS_CODES[status]
+        columns["stutter_count"][slot] = min(int(metrics.stutter_count), 0xFFFF)
+        # 最后写时间戳：读取方看到新秒数时各列已是新值
+        self.ts[slot] = second
+
+
+class RingStore:
+    """一个 worker 内所有频道的环形存储；RING_DIR 为空时不写入"""
+
+    def __init__(self, directory: str = RING_DIR, hours: int = RING_HOURS):
+        self.directory = directory
+        self.capacity = hours * 3600
+        self._rings: Dict[str, ChannelRing] = {}
+        self._failed = set()
+
+    def write(self, metrics: ChannelMetrics, status: ChannelStatus):
+        if not self.directory or not self.capacity:
+            return
+        channel_id = metrics.channel_id
+        ring = self._rings.get(channel_id)
+        if ring is None:
+            if channel_id in self._failed:
+                return
+            try:
+                ring = self._rings[channel_id] = ChannelRing(
+                    os.path.join(self.directory, quote(channel_id, safe="")), self.capacity
+                )
+            except OSError as e:
+                logger.warning("Ring store disabled for %s: %s", channel_id, e)
+                self._failed.add(channel_id)
+                return
+        ring.write(metrics, status)
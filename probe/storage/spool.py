@@ -0,0 +1,146 @@
+"""InfluxDB 写入的磁盘缓冲（Influx 不可用期间落盘，恢复后按序回放）。
+
+目录下为按序号命名的段文件 NNNNNNNNNNNN.seg，每条记录为
+<长度 u32><CRC32 u32><点数 u32> + 载荷（gzip 压缩的行协议批次）。
+只追加写；段写满后轮转，总大小超限时删除最旧的段并计入丢弃。读位置只保存在内存中，
+重启后从最旧的段开头重放，已写入的点重复写入 Influx 时覆盖为相同值，不影响结果。
+所有方法均为同步阻塞 IO，由调用方放到线程中串行执行。
+"""
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("<III")
+
+
+@dataclass
+class _Segment:
+    seq: int
+    path: str
+    size: int = 0
+    points: int = 0
+
+
+class DiskSpool:
+    def __init__(self, directory: str, max_bytes: int, segment_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._segments: List[_Segment] = []
+        self._writer = None
+        self._read_offset = 0  # 最旧段中的读位置
+        self._peeked_size = 0
+        self.dropped_points = 0
+
+    # ── 状态 ──────────────────────────────────────────────────────
+    @property
+    def bytes(self) -> int:
+        return sum(s.size for s in self._segments) - self._read_offset
+
+    @property
+    def points(self) -> int:
+        return sum(s.points for s in self._segments)
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    # ── 打开 / 关闭 ───────────────────────────────────────────────
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".seg"))
+        for name in names:
+            seg = _Segment(int(name[:-4]), os.path.join(self.directory, name))
+            self._scan(seg)
+            if seg.size:
+                self._segments.append(seg)
+            else:
+                os.remove(seg.path)
+        if self._segments:
+            logger.info("Influx spool: %d points pending in %d segments", self.points, len(self._segments))
+
+    def _scan(self, seg: _Segment):
+        """统计段内记录；末尾不完整或校验失败的记录（写入中途崩溃）截断"""
+        valid = 0
+        with open(seg.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc, points = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                valid += _HEADER.size + length
+                seg.points += points
+        if valid < os.path.getsize(seg.path):
+            logger.warning("Influx spool: truncating damaged tail of %s at %d", seg.path, valid)
+            os.truncate(seg.path, valid)
+        seg.size = valid
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+    # ── 写入 ──────────────────────────────────────────────────────
+    def append(self, payload: bytes, points: int):
+        if self._writer is None or self._segments[-1].size >= self.segment_bytes:
+            self._rotate()
+        self._writer.write(_HEADER.pack(len(payload), zlib.crc32(payload), points) + payload)
+        self._writer.flush()
+        seg = self._segments[-1]
+        seg.size += _HEADER.size + len(payload)
+        seg.points += points
+        while self.bytes > self.max_bytes and len(self._segments) > 1:
+            self._drop_oldest()
+
+    def _rotate(self):
+        if self._writer:
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+        seq = self._segments[-1].seq + 1 if self._segments else 0
+        seg = _Segment(seq, os.path.join(self.directory, f"{seq:012d}.seg"))
+        self._writer = open(seg.path, "ab")
+        self._segments.append(seg)
+
+    def _drop_oldest(self):
+        seg = self._segments.pop(0)
+        self.dropped_points += seg.points
+        self._read_offset = 0
+        os.remove(seg.path)
+        logger.warning("Influx spool full, dropped segment %s (%d points)", seg.path, seg.points)
+
+    # ── 读取 ──────────────────────────────────────────────────────
+    def peek(self) -> Optional[Tuple[bytes, int]]:
+        """最旧的未回放记录 (载荷, 点数)；无数据返回 None"""
+        while self._segments:
+            seg = self._segments[0]
+            if self._read_offset < seg.size:
+                with open(seg.path, "rb") as f:
+                    f.seek(self._read_offset)
+                    length, crc, points = _HEADER.unpack(f.read(_HEADER.size))
+                    payload = f.read(length)
+                if zlib.crc32(payload) == crc:
+                    self._peeked_size = _HEADER.size + length
+                    return payload, points
+                logger.warning("Influx spool: corrupt record in %s, skipping segment", seg.path)
+                self.dropped_points += seg.points
+                seg.points = 0
+                self._read_offset = seg.size
+            if seg is self._segments[-1]:
+                # 当前写入段读完：整段删除，下次写入时新建
+                self.close()
+            self._segments.pop(0)
+            self._read_offset = 0
+            os.remove(seg.path)
+        return None
+
+    def commit(self, points: int):
+        """peek 出的记录已写入 Influx"""
+        self._read_offset += self._peeked_size
+        self._segments[0].points -= points
@@ -1,14 +1,82 @@
+import asyncio
 import logging
 import time
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
 import aiosqlite
 
 from config import SQLITE_PATH
 
+if TYPE_CHECKING:
+    from storage.metadata_sync import ChannelMetadata
+
 logger = logging.getLogger(__name__)
 
+# SDT/EIT/PMT 元数据列，旧库启动时自动补齐
+_CHANNEL_METADATA_COLUMNS = {
+    "service_name": "TEXT",
+    "provider_name": "TEXT",
+    "event_name": "TEXT",
+    "video_pid": "INTEGER",
+    "audio_pid": "INTEGER",
+    "pcr_pid": "INTEGER",
+    "video_codec": "TEXT",
+    "audio_codec": "TEXT",
+    "metadata_updated_at": "DATETIME",
+}
+
+# 告警汇总表的增量维护：开启计入 started_at 当天，恢复（含处理时长）计入 resolved_at 当天，
+# 中断时长按所覆盖的各天切分
+_STATS_OPENED_SQL = """
+    INSERT INTO alert_stats_daily (day, group_name, alert_type, opened)
+    SELECT date(a.started_at), COALESCE(c.group_name, 'default'), a.alert_type, COUNT(*)
+    FROM {source} a LEFT JOIN channels c ON c.id = a.channel_id
+    WHERE {where}
+    GROUP BY 1, 2, 3
+    ON CONFLICT(day, group_name, alert_type) DO UPDATE SET opened = opened + excluded.opened
+"""
+
+_STATS_RESOLVED_SQL = """
+    INSERT INTO alert_stats_daily (day, group_name, alert_type, resolved, resolve_seconds)
+    SELECT date(a.resolved_at), COALESCE(c.group_name, 'default'), a.alert_type, COUNT(*),
+           SUM(MAX(0, (julianday(a.resolved_at) - julianday(a.started_at)) * 86400))
+    FROM {source} a LEFT JOIN channels c ON c.id = a.channel_id
+    WHERE a.resolved_at IS NOT NULL AND {where}
+    GROUP BY 1, 2, 3
+    ON CONFLICT(day, group_name, alert_type) DO UPDATE SET
+        resolved = resolved + excluded.resolved,
+        resolve_seconds = resolve_seconds + excluded.resolve_seconds
+"""
+
+_CHANNEL_OPENED_SQL = """
+    INSERT INTO channel_stats_daily (day, channel_id, alerts)
+    SELECT date(a.started_at), a.channel_id, COUNT(*)
+    FROM {source} a
+    WHERE {where}
+    GROUP BY 1, 2
+    ON CONFLICT(day, channel_id) DO UPDATE SET alerts = alerts + excluded.alerts
+"""
+
+# 可用率只统计 CRITICAL 告警（黑屏/冻屏/静音/离线）的持续时长；跨天的告警按 UTC 日切分，
+# 各天只计入当天内的部分（alert_stats_daily 的 resolve_seconds 则是恢复当天的处理时长，用于 MTTR）
+_CHANNEL_OUTAGE_SQL = """
+    WITH RECURSIVE spans(channel_id, day_start, stop) AS (
+        SELECT a.channel_id, julianday(a.started_at), julianday(a.resolved_at)
+        FROM {source} a
+        WHERE a.resolved_at IS NOT NULL AND a.severity = 'CRITICAL' AND {where}
+        UNION ALL
+        SELECT channel_id, julianday(date(day_start, '+1 day')), stop FROM spans
+        WHERE julianday(date(day_start, '+1 day')) < stop
+    )
+    INSERT INTO channel_stats_daily (day, channel_id, outage_seconds)
+    SELECT date(day_start), channel_id,
+           SUM(MAX(0, (MIN(stop, julianday(date(day_start, '+1 day'))) - day_start) * 86400))
+    FROM spans
+    GROUP BY 1, 2
+    ON CONFLICT(day, channel_id) DO UPDATE SET outage_seconds = outage_seconds + excluded.outage_seconds
+"""
+
 
 @dataclass
 class ChannelConfig:
@@ -31,6 +99,9 @@ class SQLiteDB:
     async def start(self):
         self._db = await aiosqlite.connect(self.db_path)
         self._db.row_factory = aiosqlite.Row
+        # WAL：API 只读连接池与探针写入互不阻塞
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA busy_timeout=5000")
         await self._create_tables()
 
     async def stop(self):
@@ -49,7 +120,16 @@ class SQLiteDB:
                 enabled BOOLEAN DEFAULT 1,
                 sim_video TEXT,
                 expected_bitrate_kbps REAL DEFAULT 0,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                service_name TEXT,
+                provider_name TEXT,
+                event_name TEXT,
+                video_pid INTEGER,
+                audio_pid INTEGER,
+                pcr_pid INTEGER,
+                video_codec TEXT,
+                audio_codec TEXT,
+                metadata_updated_at DATETIME
             );
 
             CREATE TABLE IF NOT EXISTS alerts (
@@ -74,9 +154,39 @@ class SQLiteDB:
                 PRIMARY KEY (channel_id, alert_type)
             );
 
-            CREATE INDEX IF NOT EXISTS idx_alerts_channel ON alerts(channel_id, started_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status, started_at DESC);
+            -- (过滤列, started_at) 升序索引可反向扫描，满足 ORDER BY started_at DESC, id DESC 的游标分页
+            DROP INDEX IF EXISTS idx_alerts_channel;
+            DROP INDEX IF EXISTS idx_alerts_status;
+            CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts(started_at);
+            CREATE INDEX IF NOT EXISTS idx_alerts_channel_time ON alerts(channel_id, started_at);
+            CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts(status, started_at);
+            CREATE INDEX IF NOT EXISTS idx_alerts_type_time ON alerts(alert_type, started_at);
+            CREATE INDEX IF NOT EXISTS idx_alerts_open ON alerts(channel_id, alert_type, status);
+            CREATE INDEX IF NOT EXISTS idx_alerts_resolved ON alerts(resolved_at) WHERE status = 'RESOLVED';
+
+            CREATE TABLE IF NOT EXISTS alert_stats_daily (
+                day TEXT NOT NULL,
+                group_name TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                opened INTEGER DEFAULT 0,
+                resolved INTEGER DEFAULT 0,
+                resolve_seconds REAL DEFAULT 0,
+                PRIMARY KEY (day, group_name, alert_type)
+            );
+
+            CREATE TABLE IF NOT EXISTS channel_stats_daily (
+                day TEXT NOT NULL,
+                channel_id TEXT NOT NULL,
+                alerts INTEGER DEFAULT 0,
+                outage_seconds REAL DEFAULT 0,
+                PRIMARY KEY (day, channel_id)
+            );
         """)
+        async with self._db.execute("PRAGMA table_info(channels)") as cur:
+            existing = {row["name"] for row in await cur.fetchall()}
+        for column, col_type in _CHANNEL_METADATA_COLUMNS.items():
+            if column not in existing:
+                await self._db.execute(f"ALTER TABLE channels ADD COLUMN {column} {col_type}")
         await self._db.commit()
 
     async def get_enabled_channels(self) -> List[ChannelConfig]:
@@ -123,20 +233,103 @@ class SQLiteDB:
             (channel_id, channel_name, alert_type, severity, message, thumbnail_path),
         ) as cur:
             row_id = cur.lastrowid
+        await self._rollup_alerts([row_id], opened=True)
         await self._db.commit()
         return row_id
 
     async def resolve_alert(self, channel_id: str, alert_type: str):
-        await self._db.execute(
-            """UPDATE alerts SET status='RESOLVED', resolved_at=CURRENT_TIMESTAMP
-               WHERE channel_id=? AND alert_type=? AND status='ACTIVE'""",
-            (channel_id, alert_type),
-        )
+        await self.resolve_alerts([(channel_id, alert_type)])
+
+    async def resolve_alerts(self, pairs: List[Tuple[str, str]]):
+        """批量解除 (channel_id, alert_type)，一次提交；已确认的告警同样记录恢复时间"""
+        resolved_ids: List[int] = []
+        for channel_id, alert_type in pairs:
+            async with self._db.execute(
+                """UPDATE alerts SET status='RESOLVED', resolved_at=CURRENT_TIMESTAMP
+                   WHERE channel_id=? AND alert_type=? AND status IN ('ACTIVE', 'ACKNOWLEDGED')
+                   RETURNING id""",
+                (channel_id, alert_type),
+            ) as cur:
+                resolved_ids += [row["id"] for row in await cur.fetchall()]
+        if resolved_ids:
+            await self._rollup_alerts(resolved_ids, opened=False)
+        await self._db.commit()
+
+    async def _rollup_alerts(self, alert_ids: List[int], opened: bool):
+        where = f"a.id IN ({','.join('?' * len(alert_ids))})"
+        statements = (_STATS_OPENED_SQL, _CHANNEL_OPENED_SQL) if opened else (_STATS_RESOLVED_SQL, _CHANNEL_OUTAGE_SQL)
+        for sql in statements:
+            await self._db.execute(sql.format(source="alerts", where=where), alert_ids)
+
+    async def rebuild_alert_stats(self) -> int:
+        """从 alerts 及归档表全量重建汇总表，返回参与统计的告警数"""
+        async with self._db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'alerts_archive_%'"
+        ) as cur:
+            archives = [row["name"] for row in await cur.fetchall()]
+        source = "(" + " UNION ALL ".join(f"SELECT * FROM {t}" for t in ["alerts", *archives]) + ")"
+
+        await self._db.execute("DELETE FROM alert_stats_daily")
+        await self._db.execute("DELETE FROM channel_stats_daily")
+        for sql in (_STATS_OPENED_SQL, _STATS_RESOLVED_SQL, _CHANNEL_OPENED_SQL, _CHANNEL_OUTAGE_SQL):
+            await self._db.execute(sql.format(source=source, where="1"))
+        async with self._db.execute(f"SELECT COUNT(*) AS n FROM {source}") as cur:
+            total = (await cur.fetchone())["n"]
         await self._db.commit()
+        return total
+
+    async def archive_resolved_alerts(self, retention_days: int, batch_size: int = 5000) -> int:
+        """把恢复时间早于 retention_days 的已恢复告警按开始月份搬到 alerts_archive_YYYYMM 表；
+        已确认（ACKNOWLEDGED）但未恢复的告警可能仍在持续，不归档"""
+        archived = 0
+        while True:
+            async with self._db.execute(
+                """SELECT id, strftime('%Y%m', started_at) AS month FROM alerts
+                   WHERE status = 'RESOLVED' AND resolved_at < datetime('now', ?)
+                   ORDER BY resolved_at LIMIT ?""",
+                (f"-{retention_days} days", batch_size),
+            ) as cur:
+                rows = await cur.fetchall()
+            if not rows:
+                break
+
+            by_month: Dict[str, List[int]] = {}
+            for row in rows:
+                by_month.setdefault(row["month"] or "000000", []).append(row["id"])
+            for month, ids in by_month.items():
+                table = f"alerts_archive_{month}"
+                placeholders = ",".join("?" * len(ids))
+                await self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM alerts WHERE 0")
+                await self._db.execute(f"INSERT INTO {table} SELECT * FROM alerts WHERE id IN ({placeholders})", ids)
+                await self._db.execute(f"DELETE FROM alerts WHERE id IN ({placeholders})", ids)
+            await self._db.commit()
+
+            archived += len(rows)
+            if len(rows) < batch_size:
+                break
+            # 分批提交，给探针的告警写入让出写锁
+            await asyncio.sleep(0.1)
+        return archived
 
-    async def update_channel_name(self, channel_id: str, name: str):
-        await self._db.execute(
-            "UPDATE channels SET name=? WHERE id=?",
-            (name, channel_id),
+    async def update_channel_metadata(self, batch: Dict[str, "ChannelMetadata"]):
+        await self._db.executemany(
+            """UPDATE channels SET service_name=?, provider_name=?, event_name=?,
+                   video_pid=?, audio_pid=?, pcr_pid=?, video_codec=?, audio_codec=?,
+                   metadata_updated_at=CURRENT_TIMESTAMP
+               WHERE id=?""",
+            [
+                (
+                    m.service_name,
+                    m.provider_name,
+                    m.event_name,
+                    m.video_pid,
+                    m.audio_pid,
+                    m.pcr_pid,
+                    m.video_codec,
+                    m.audio_codec,
+                    channel_id,
+                )
+                for channel_id, m in batch.items()
+            ],
         )
         await self._db.commit()
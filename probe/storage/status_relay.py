@@ -0,0 +1,77 @@
+"""本机直连的状态通道（STATUS_TRANSPORT=uds）。
+
+发布进程在 STATUS_SOCKET 上监听 Unix 域套接字，每个 API 进程连接一次；
+每个状态批次编码为 msgpack，帧格式为 <长度 u32 大端> + 载荷，直接写给所有连接，
+不经过 Redis Stream。发送只写入各连接的传输缓冲区，积压超过 STATUS_RELAY_MAX_BUFFER
+的连接直接断开，API 重连后从 Redis 状态 hash 重新播种。
+只承载状态批次；告警事件仍写 Redis 告警 Stream（见 RedisStateWriter.publish_alert）。
+"""
+import asyncio
+import logging
+import os
+import struct
+from typing import Any, Dict, Set
+
+import msgpack
+
+from config import STATUS_RELAY_MAX_BUFFER, STATUS_SOCKET
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+
+def encode_frame(msg: Dict[str, Any]) -> bytes:
+    body = msgpack.packb(msg, use_bin_type=True)
+    return _LENGTH.pack(len(body)) + body
+
+
+class StatusRelay:
+    def __init__(self, path: str = STATUS_SOCKET):
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self.sent = 0
+        self.evicted = 0
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # 上次退出遗留的套接字文件
+        self._server = await asyncio.start_unix_server(self._on_connect, path=self.path)
+        os.chmod(self.path, 0o666)
+        logger.info("Status relay listening on %s", self.path)
+
+    async def stop(self):
+        for writer in list(self._clients):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        logger.info("Status relay client connected, total: %d", len(self._clients))
+        try:
+            # API 不发送数据；读到 EOF 即断开
+            await reader.read()
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+            logger.info("Status relay client disconnected, total: %d", len(self._clients))
+
+    def publish(self, msg: Dict[str, Any]):
+        if not self._clients:
+            return
+        frame = encode_frame(msg)
+        for writer in list(self._clients):
+            if writer.transport.get_write_buffer_size() > STATUS_RELAY_MAX_BUFFER:
+                logger.warning("Status relay client too slow, disconnecting")
+                self.evicted += 1
+                self._clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+        self.sent += 1
@@ -31,7 +31,10 @@ class TSParserState:
     video_pid: int = -1
     audio_pid: int = -1
     pcr_pid: int = -1
+    video_stream_type: int = -1
+    audio_stream_type: int = -1
     service_name: str = ""
+    provider_name: str = ""
     event_name: str = ""
     pid_cc: Dict[int, int] = field(default_factory=dict)
     cc_errors: int = 0
@@ -45,6 +48,21 @@ class TSParserState:
 STREAM_TYPE_VIDEO = {0x01, 0x02, 0x1B, 0x24, 0x10}
 STREAM_TYPE_AUDIO = {0x03, 0x04, 0x0F, 0x11, 0x81, 0x82, 0x06}
 
+STREAM_TYPE_CODECS = {
+    0x01: "MPEG-1",
+    0x02: "MPEG-2",
+    0x10: "MPEG-4",
+    0x1B: "H.264",
+    0x24: "HEVC",
+    0x03: "MPEG-1 Audio",
+    0x04: "MPEG-2 Audio",
+    0x0F: "AAC",
+    0x11: "AAC-LATM",
+    0x81: "AC-3",
+    0x82: "DTS",
+    0x06: "PES private",
+}
+
 PAT_PID = 0x0000
 CAT_PID = 0x0001
 SDT_PID = 0x0011
@@ -85,10 +103,26 @@ class TSParser:
     def service_name(self) -> str:
         return self.state.service_name
 
+    @property
+    def provider_name(self) -> str:
+        return self.state.provider_name
+
     @property
     def event_name(self) -> str:
         return self.state.event_name
 
+    @property
+    def pcr_pid(self) -> int:
+        return self.state.pcr_pid
+
+    @property
+    def video_codec(self) -> str:
+        return STREAM_TYPE_CODECS.get(self.state.video_stream_type, "")
+
+    @property
+    def audio_codec(self) -> str:
+        return STREAM_TYPE_CODECS.get(self.state.audio_stream_type, "")
+
     @property
     def video_pid(self) -> int:
         return self.state.video_pid
@@ -261,8 +295,10 @@ class TSParser:
             es_info_length = ((data[i + 3] & 0x0F) << 8) | data[i + 4]
             if stream_type in STREAM_TYPE_VIDEO and self.state.video_pid == -1:
                 self.state.video_pid = es_pid
+                self.state.video_stream_type = stream_type
             elif stream_type in STREAM_TYPE_AUDIO and self.state.audio_pid == -1:
                 self.state.audio_pid = es_pid
+                self.state.audio_stream_type = stream_type
             i += 5 + es_info_length
 
     def _parse_sdt(self, data: bytes):
@@ -283,6 +319,7 @@ class TSParser:
                 desc_data = data[j + 2:j + 2 + desc_len]
                 if desc_tag == 0x48 and len(desc_data) >= 3:
                     provider_len = desc_data[1]
+                    self.state.provider_name = _dvb_decode_string(desc_data[2:2 + provider_len])
                     name_offset = 2 + provider_len
                     if name_offset < len(desc_data):
                         name_len = desc_data[name_offset]
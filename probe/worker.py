@@ -15,71 +15,139 @@ from analyzers.audio_analyzer import AudioAnalyzer
 from analyzers.bitrate import BitrateCalculator
 from analyzers.video_analyzer import VideoAnalyzer
 from config import (
-    CHANNELS_PER_WORKER,
+    ANALYSIS_CHUNK_BYTES,
+    ANALYSIS_QUEUE_SIZE,
     FRAME_SAMPLE_INTERVAL_SEC,
+    INGEST_BATCH_DATAGRAMS,
+    UDP_RECV_BUFFER,
     UDP_TIMEOUT_SEC,
 )
-from status_machine import AlertType, ChannelMetrics, ChannelStatus, evaluate_status, get_active_alerts
-from storage.influx_writer import InfluxBatchWriter
-from storage.redis_writer import RedisStateWriter
-from storage.sqlite_db import ChannelConfig, SQLiteDB
+from status_machine import ChannelMetrics, ChannelStatus, evaluate_status
+from status_table import StatusTable
+from storage.metadata_sync import ChannelMetadata
+from storage.sqlite_db import ChannelConfig
 from ts_parser import TSParser
 
 logger = logging.getLogger(__name__)
 
+# Linux 的 SO_RXQ_OVFL（socket 模块未导出）
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+_U32 = struct.Struct("=I")
+_CMSG_SPACE = socket.CMSG_SPACE(_U32.size)
+
 
 class ChannelMonitor:
     def __init__(
         self,
         config: ChannelConfig,
-        redis_writer: RedisStateWriter,
-        influx_writer: InfluxBatchWriter,
-        sqlite_db: SQLiteDB,
+        table: StatusTable,
+        row: int,
         executor: ThreadPoolExecutor,
     ):
         self.config = config
-        self.redis_writer = redis_writer
-        self.influx_writer = influx_writer
-        self.sqlite_db = sqlite_db
+        self.table = table
+        self.row = row
         self.executor = executor
         self.ts_parser = TSParser(config.id)
         self.bitrate_calc = BitrateCalculator(window_sec=5.0)
         self.video_analyzer = VideoAnalyzer(config.id)
         self.audio_analyzer = AudioAnalyzer()
         self._last_frame_time = 0.0
-        self._cc_window_start = time.monotonic()
-        self._cc_window_count = 0
-        self._prev_status: Optional[ChannelStatus] = None
-        self._published_alerts: Dict[str, int] = {}  # "channel_id:alert_type" -> alert_id
-        self._frame_buffer: List[bytes] = []
-        self._audio_buffer: List[np.ndarray] = []
-        self._av_container: Optional[av.container.InputContainer] = None
-        self._ts_fifo = io.BytesIO()
-        self._ts_fifo_size = 0
-        self._last_audio_pts: Optional[float] = None
+        self._last_data_time = 0.0
+        self._bind_failed = False
+        self._metadata: Optional[ChannelMetadata] = None
+        self._ts_buffer = bytearray()
+        # 收流到分析之间的有界队列：元素为 (TS 片段, 墙钟时间)
+        self._analysis_queue: asyncio.Queue = asyncio.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+        self.analysis_dropped = 0
+        self._rx_dropped = 0  # SO_RXQ_OVFL 累计值
+        self._frame_result: Dict = {
+            "is_black": False,
+            "is_frozen": False,
+            "brightness": 100.0,
+            "thumbnail_path": "",
+        }
+        self._audio_result: Dict = {
+            "rms": 0.1,
+            "is_silent": False,
+            "is_clipping": False,
+            "clip_ratio": 0.0,
+        }
 
     def _create_socket(self) -> socket.socket:
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECV_BUFFER)
+        try:
+            # 每个数据报附带该套接字因接收缓冲区满被内核丢弃的累计数
+            sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        except OSError:
+            pass
         sock.bind(("", self.config.multicast_port))
         mreq = struct.pack("4sL", socket.inet_aton(self.config.multicast_ip), socket.INADDR_ANY)
         sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
         sock.setblocking(False)
         return sock
 
-    async def _recv_udp(self, sock: socket.socket) -> Optional[bytes]:
-        loop = asyncio.get_event_loop()
-        try:
-            data = await asyncio.wait_for(
-                loop.run_in_executor(None, sock.recv, 65536),
-                timeout=UDP_TIMEOUT_SEC,
-            )
-            return data
-        except asyncio.TimeoutError:
-            return None
-        except Exception:
-            return None
+    # ── 收流与解析：事件循环的可读回调，不等待分析 ─────────────────
+    def _on_readable(self, sock: socket.socket):
+        for _ in range(INGEST_BATCH_DATAGRAMS):
+            try:
+                data, ancdata, _, _ = sock.recvmsg(65536, _CMSG_SPACE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug("Recv error on %s: %s", self.config.id, e)
+                return
+            for level, kind, payload in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(payload) >= 4:
+                    self._rx_dropped = _U32.unpack_from(payload)[0]
+            self._ingest(data)
+
+    def _ingest(self, data: bytes):
+        now = time.monotonic()
+        self._last_data_time = now
+        self.ts_parser.feed(data)
+        self.bitrate_calc.update(len(data), now)
+        if len(self._ts_buffer) < ANALYSIS_CHUNK_BYTES:
+            self._ts_buffer.extend(data)
+
+        if now - self._last_frame_time >= FRAME_SAMPLE_INTERVAL_SEC:
+            if len(self._ts_buffer) >= 1316:
+                chunk = bytes(self._ts_buffer[:ANALYSIS_CHUNK_BYTES])
+                self._ts_buffer.clear()
+                if self._analysis_queue.full():
+                    # 分析跟不上时丢弃最旧的样本，只分析最新的
+                    self._analysis_queue.get_nowait()
+                    self.analysis_dropped += 1
+                    logger.debug("Analysis behind on %s, %d samples dropped", self.config.id, self.analysis_dropped)
+                self._analysis_queue.put_nowait((chunk, time.time()))
+            self._last_frame_time = now
+
+    # ── 分析：解码与画面/音频分析在线程池中执行 ────────────────────
+    async def _analysis_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk, ts = await self._analysis_queue.get()
+            try:
+                decode_result = await loop.run_in_executor(self.executor, self._decode_av_frame, chunk)
+                if decode_result is not None:
+                    decoded_img, corrupt_ratio = decode_result
+                    self._frame_result = await self._analyze_video_frame(decoded_img, ts, corrupt_ratio)
+
+                # 同时解码音频进行卡顿检测
+                audio_decode_result = await loop.run_in_executor(self.executor, self._decode_audio_pts, chunk)
+                if audio_decode_result is not None:
+                    a_samples, a_sr, a_pts, a_count = audio_decode_result
+                    self._audio_result = await loop.run_in_executor(
+                        self.executor,
+                        lambda: self.audio_analyzer.analyze_chunk(
+                            a_samples, a_sr, ts,
+                            pts=a_pts, samples_count=a_count
+                        )
+                    )
+            except Exception as e:
+                logger.debug("Analysis error on %s: %s", self.config.id, e)
 
     async def _analyze_video_frame(self, frame_bgr: np.ndarray, ts: float, corrupt_ratio: float = 0.0) -> Dict:
         loop = asyncio.get_event_loop()
@@ -140,240 +208,99 @@ class ChannelMonitor:
         return None
 
     async def run(self):
+        loop = asyncio.get_running_loop()
+        analysis = asyncio.create_task(self._analysis_loop())
         sock = None
         try:
-            sock = self._create_socket()
-        except OSError as e:
-            logger.warning("Cannot bind socket for %s: %s", self.config.id, e)
+            while sock is None:
+                try:
+                    sock = self._create_socket()
+                except OSError as e:
+                    if not self._bind_failed:
+                        logger.warning("Cannot bind socket for %s: %s", self.config.id, e)
+                        self._bind_failed = True
+                    await asyncio.sleep(5)
+            loop.add_reader(sock.fileno(), self._on_readable, sock)
+            await self._metrics_loop()
+        finally:
+            analysis.cancel()
+            if sock is not None:
+                loop.remove_reader(sock.fileno())
+                sock.close()
 
-        frame_result = {
-            "is_black": False,
-            "is_frozen": False,
-            "brightness": 100.0,
-            "thumbnail_path": "",
-        }
-        audio_result = {
-            "rms": 0.1,
-            "is_silent": False,
-            "is_clipping": False,
-            "clip_ratio": 0.0,
-        }
-        ts_buffer = bytearray()
-        last_metrics_time = time.monotonic()
-        cc_count_in_window = 0
+    # ── 每秒汇总：只读取各阶段的最新结果 ────────────────────────────
+    async def _metrics_loop(self):
         window_start = time.monotonic()
-
+        rx_dropped = self._rx_dropped
         while True:
+            await asyncio.sleep(1.0)
             now = time.monotonic()
             now_wall = time.time()
-
-            if sock is None:
-                await asyncio.sleep(5)
-                try:
-                    sock = self._create_socket()
-                except OSError:
-                    pass
-                continue
-
-            data = await self._recv_udp(sock)
-            if data is None:
+            elapsed = now - window_start
+            window_start = now
+            cc_errors = self.ts_parser.cc_errors
+            self.ts_parser.reset_cc_errors()
+            rx_dropped_per_sec = ((self._rx_dropped - rx_dropped) & 0xFFFFFFFF) / elapsed
+            rx_dropped = self._rx_dropped
+
+            channel_name = self.ts_parser.service_name or self.config.name
+            if now - self._last_data_time > UDP_TIMEOUT_SEC:
                 metrics = ChannelMetrics(
                     channel_id=self.config.id,
-                    channel_name=self.ts_parser.service_name or self.config.name,
+                    channel_name=channel_name,
                     is_offline=True,
                     timestamp=now_wall,
                 )
-                status = ChannelStatus.OFFLINE
-                await self._handle_status_change(metrics, status)
-                await asyncio.sleep(1.0)
+                self.table.write(self.row, metrics, ChannelStatus.OFFLINE, self._metadata)
                 continue
 
-            self.ts_parser.feed(data)
-            self.bitrate_calc.update(len(data), now)
-
-            ts_buffer.extend(data)
-
-            if now - self._last_frame_time >= FRAME_SAMPLE_INTERVAL_SEC:
-                if len(ts_buffer) >= 1316:
-                    chunk = bytes(ts_buffer[:65536])
-                    ts_buffer.clear()
-                    loop = asyncio.get_event_loop()
-                    decode_result = await loop.run_in_executor(
-                        self.executor, self._decode_av_frame, chunk
-                    )
-                    if decode_result is not None:
-                        decoded_img, corrupt_ratio = decode_result
-                        frame_result = await self._analyze_video_frame(decoded_img, now_wall, corrupt_ratio)
-
-                    # 同时解码音频进行卡顿检测
-                    audio_decode_result = await loop.run_in_executor(
-                        self.executor, self._decode_audio_pts, chunk
-                    )
-                    if audio_decode_result is not None:
-                        a_samples, a_sr, a_pts, a_count = audio_decode_result
-                        audio_result = await loop.run_in_executor(
-                            self.executor,
-                            lambda: self.audio_analyzer.analyze_chunk(
-                                a_samples, a_sr, now_wall,
-                                pts=a_pts, samples_count=a_count
-                            )
-                        )
-                self._last_frame_time = now
-
-            if now - last_metrics_time >= 1.0:
-                elapsed = now - window_start
-                cc_per_sec = cc_count_in_window / elapsed if elapsed > 0 else 0.0
-                cc_count_in_window = self.ts_parser.cc_errors
-                self.ts_parser.reset_cc_errors()
-                window_start = now
-
-                channel_name = self.ts_parser.service_name or self.config.name
-                metrics = ChannelMetrics(
-                    channel_id=self.config.id,
-                    channel_name=channel_name,
-                    is_offline=False,
-                    is_black=frame_result["is_black"],
-                    is_frozen=frame_result["is_frozen"],
-                    is_silent=audio_result["is_silent"],
-                    is_clipping=audio_result["is_clipping"],
-                    is_mosaic=frame_result.get("is_mosaic", False),
-                    mosaic_ratio=frame_result.get("mosaic_ratio", 0.0),
-                    is_stuttering=audio_result.get("is_stuttering", False),
-                    stutter_count=audio_result.get("stutter_count", 0),
-                    cc_errors_per_sec=cc_per_sec,
-                    pcr_jitter_ms=self.ts_parser.pcr_jitter_ms,
-                    bitrate_kbps=self.bitrate_calc.bitrate_kbps,
-                    expected_bitrate_kbps=self.config.expected_bitrate_kbps,
-                    audio_rms=audio_result["rms"],
-                    video_brightness=frame_result["brightness"],
-                    thumbnail_path=frame_result.get("thumbnail_path", ""),
-                    timestamp=now_wall,
-                )
-
-                if channel_name != self.config.name and channel_name:
-                    asyncio.create_task(
-                        self.sqlite_db.update_channel_name(self.config.id, channel_name)
-                    )
-
-                status = evaluate_status(metrics)
-                await self._handle_status_change(metrics, status)
-                last_metrics_time = now
-
-    async def _handle_status_change(self, metrics: ChannelMetrics, status: ChannelStatus):
-        await self.redis_writer.update_channel_status(metrics, status)
-
-        try:
-            await self.influx_writer.write_metrics(metrics, status)
-        except Exception as e:
-            logger.debug("Influx write skipped: %s", e)
-
-        alerts = get_active_alerts(metrics)
-        severity_map = {
-            AlertType.BLACK_SCREEN: "CRITICAL",
-            AlertType.FROZEN: "CRITICAL",
-            AlertType.SILENT: "CRITICAL",
-            AlertType.OFFLINE: "CRITICAL",
-            AlertType.CLIPPING: "WARNING",
-            AlertType.CC_ERROR: "WARNING",
-            AlertType.PCR_JITTER: "WARNING",
-            AlertType.BITRATE_ABNORMAL: "WARNING",
-            AlertType.MOSAIC: "WARNING",
-            AlertType.AUDIO_STUTTER: "WARNING",
-        }
-
-        for alert_type in alerts:
-            key = f"{metrics.channel_id}:{alert_type.value}"
-            try:
-                alert_id = await self.sqlite_db.upsert_alert(
-                    channel_id=metrics.channel_id,
-                    channel_name=metrics.channel_name,
-                    alert_type=alert_type.value,
-                    severity=severity_map.get(alert_type, "WARNING"),
-                    message=f"{metrics.channel_name}: {alert_type.value}",
-                    thumbnail_path=metrics.thumbnail_path,
-                )
-                if self._published_alerts.get(key) != alert_id:
-                    self._published_alerts[key] = alert_id
-                    await self.redis_writer.publish_alert(
-                        {
-                            "type": "alert_new",
-                            "alert_id": alert_id,
-                            "channel_id": metrics.channel_id,
-                            "channel_name": metrics.channel_name,
-                            "alert_type": alert_type.value,
-                            "severity": severity_map.get(alert_type, "WARNING"),
-                            "status": status.value,
-                            "ts": metrics.timestamp,
-                        }
-                    )
-            except Exception as e:
-                logger.debug("Alert upsert error: %s", e)
-
-        # 解除已恢复的 CRITICAL 告警
-        if not metrics.is_offline:
-            key = f"{metrics.channel_id}:{AlertType.OFFLINE.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.OFFLINE.value)
-            except Exception:
-                pass
-
-        if not metrics.is_black:
-            key = f"{metrics.channel_id}:{AlertType.BLACK_SCREEN.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.BLACK_SCREEN.value)
-            except Exception:
-                pass
-
-        if not metrics.is_frozen:
-            key = f"{metrics.channel_id}:{AlertType.FROZEN.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.FROZEN.value)
-            except Exception:
-                pass
-
-        if not metrics.is_silent:
-            key = f"{metrics.channel_id}:{AlertType.SILENT.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.SILENT.value)
-            except Exception:
-                pass
-
-        # 解除已恢复的 WARNING 告警
-        if not metrics.is_mosaic:
-            key = f"{metrics.channel_id}:{AlertType.MOSAIC.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.MOSAIC.value)
-            except Exception:
-                pass
-
-        if not metrics.is_stuttering:
-            key = f"{metrics.channel_id}:{AlertType.AUDIO_STUTTER.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.AUDIO_STUTTER.value)
-            except Exception:
-                pass
-
-        if not metrics.is_clipping:
-            key = f"{metrics.channel_id}:{AlertType.CLIPPING.value}"
-            self._published_alerts.pop(key, None)
-            try:
-                await self.sqlite_db.resolve_alert(metrics.channel_id, AlertType.CLIPPING.value)
-            except Exception:
-                pass
+            frame_result = self._frame_result
+            audio_result = self._audio_result
+            metrics = ChannelMetrics(
+                channel_id=self.config.id,
+                channel_name=channel_name,
+                is_offline=False,
+                is_black=frame_result["is_black"],
+                is_frozen=frame_result["is_frozen"],
+                is_silent=audio_result["is_silent"],
+                is_clipping=audio_result["is_clipping"],
+                is_mosaic=frame_result.get("is_mosaic", False),
+                mosaic_ratio=frame_result.get("mosaic_ratio", 0.0),
+                is_stuttering=audio_result.get("is_stuttering", False),
+                stutter_count=audio_result.get("stutter_count", 0),
+                cc_errors_per_sec=cc_errors / elapsed,
+                rx_dropped_per_sec=rx_dropped_per_sec,
+                pcr_jitter_ms=self.ts_parser.pcr_jitter_ms,
+                bitrate_kbps=self.bitrate_calc.bitrate_kbps,
+                expected_bitrate_kbps=self.config.expected_bitrate_kbps,
+                audio_rms=audio_result["rms"],
+                video_brightness=frame_result["brightness"],
+                thumbnail_path=frame_result.get("thumbnail_path", ""),
+                timestamp=now_wall,
+            )
 
-        self._prev_status = status
+            self._metadata = ChannelMetadata(
+                service_name=self.ts_parser.service_name,
+                provider_name=self.ts_parser.provider_name,
+                event_name=self.ts_parser.event_name,
+                video_pid=self.ts_parser.video_pid,
+                audio_pid=self.ts_parser.audio_pid,
+                pcr_pid=self.ts_parser.pcr_pid,
+                video_codec=self.ts_parser.video_codec,
+                audio_codec=self.ts_parser.audio_codec,
+            )
+            self.table.write(self.row, metrics, evaluate_status(metrics), self._metadata)
 
 
 class ChannelWorker:
-    def __init__(self, worker_id: int, channels: List[ChannelConfig]):
+    """只负责收流与分析，结果写入共享内存状态表，存储写入由发布进程完成"""
+
+    def __init__(self, worker_id: int, channels: List[ChannelConfig], table_name: str, table_rows: int, first_row: int):
         self.worker_id = worker_id
         self.channels = channels
+        self.table_name = table_name
+        self.table_rows = table_rows
+        self.first_row = first_row
 
     def run(self):
         asyncio.run(self._async_run())
@@ -385,29 +312,12 @@ class ChannelWorker:
         )
         logger.info("Worker %d starting with %d channels", self.worker_id, len(self.channels))
 
-        sqlite_db = SQLiteDB()
-        await sqlite_db.start()
-
-        redis_writer = RedisStateWriter()
-        await redis_writer.start()
-
-        influx_writer = InfluxBatchWriter()
-        try:
-            await influx_writer.start()
-        except Exception as e:
-            logger.warning("InfluxDB not available: %s", e)
-
+        table = StatusTable.attach(self.table_name, self.table_rows)
         executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"worker{self.worker_id}")
 
         monitors = [
-            ChannelMonitor(
-                config=ch,
-                redis_writer=redis_writer,
-                influx_writer=influx_writer,
-                sqlite_db=sqlite_db,
-                executor=executor,
-            )
-            for ch in self.channels
+            ChannelMonitor(config=ch, table=table, row=self.first_row + i, executor=executor)
+            for i, ch in enumerate(self.channels)
         ]
 
         tasks = [asyncio.create_task(m.run()) for m in monitors]
@@ -417,6 +327,4 @@ class ChannelWorker:
             logger.error("Worker %d error: %s", self.worker_id, e)
         finally:
             executor.shutdown(wait=False)
-            await redis_writer.stop()
-            await influx_writer.stop()
-            await sqlite_db.stop()
+            table.close()
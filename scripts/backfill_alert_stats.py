@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Rebuild the alert analytics summary tables from existing alert history.
+
+The probe maintains alert_stats_daily / channel_stats_daily incrementally;
+run this once after upgrading (or after manual edits to the alerts table).
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "probe"))
+
+from storage.sqlite_db import SQLiteDB  # noqa: E402
+
+
+async def backfill():
+    db = SQLiteDB()
+    await db.start()
+    try:
+        total = await db.rebuild_alert_stats()
+    finally:
+        await db.stop()
+    print(f"✅ Rebuilt alert summary tables from {total} alerts in {db.db_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
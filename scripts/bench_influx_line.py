@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Benchmark: Influx point encoding throughput, Point builder vs direct line protocol.
+
+The Point builder variant uses the original schema (channel_name/status tags).
+
+Reports points/s on a single core for formatting only (the part that runs on
+the probe hot path), and batch size / gzip cost for a flush of --batch points.
+The aggregated variant feeds the same samples through the probe-side
+aggregator (INFLUX_EXPORT_INTERVAL_SEC windows) and reports how many points
+are actually exported.
+
+    python3 scripts/bench_influx_line.py --points 100000 --batch 5000
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "probe"))
+
+from influxdb_client import Point, WritePrecision  # noqa: E402
+
+from status_machine import ChannelMetrics, ChannelStatus  # noqa: E402
+from aggregator import ChannelAggregator, WindowStats  # noqa: E402
+from storage.influx_writer import _tag_prefix, format_window  # noqa: E402
+
+
+def sample(i: int, ts: float) -> ChannelMetrics:
+    return ChannelMetrics(
+        channel_id=f"ch{i % 300:03d}",
+        channel_name=f"频道 {i % 300:03d}",
+        bitrate_kbps=random.uniform(2000, 12000),
+        cc_errors_per_sec=random.random(),
+        pcr_jitter_ms=random.uniform(0, 10),
+        video_brightness=random.uniform(30, 200),
+        audio_rms=random.random() * 0.3,
+        mosaic_ratio=random.random() * 0.02,
+        stutter_count=random.randrange(3),
+        timestamp=ts,
+    )
+
+
+def with_point(m: ChannelMetrics, status: ChannelStatus) -> str:
+    return (
+        Point("channel_metrics")
+        .tag("channel_id", m.channel_id)
+        .tag("channel_name", m.channel_name)
+        .tag("status", status.value)
+        .field("bitrate_kbps", float(m.bitrate_kbps))
+        .field("cc_errors_per_sec", float(m.cc_errors_per_sec))
+        .field("pcr_jitter_ms", float(m.pcr_jitter_ms))
+        .field("video_brightness", float(m.video_brightness))
+        .field("audio_rms", float(m.audio_rms))
+        .field("is_black", int(m.is_black))
+        .field("is_frozen", int(m.is_frozen))
+        .field("is_silent", int(m.is_silent))
+        .field("is_clipping", int(m.is_clipping))
+        .field("is_mosaic", int(m.is_mosaic))
+        .field("mosaic_ratio", float(m.mosaic_ratio))
+        .field("is_stuttering", int(m.is_stuttering))
+        .field("stutter_count", int(m.stutter_count))
+        .time(int(m.timestamp), WritePrecision.S)
+        .to_line_protocol()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    now = time.time()
+    samples = [sample(i, now + i // 300) for i in range(args.points)]
+    status = ChannelStatus.NORMAL
+
+    start = time.process_time()
+    for m in samples:
+        with_point(m, status)
+    point_rate = args.points / (time.process_time() - start)
+
+    prefixes = {}
+    start = time.process_time()
+    lines = []
+    for m in samples:
+        prefix = prefixes.get(m.channel_id)
+        if prefix is None:
+            prefix = prefixes[m.channel_id] = _tag_prefix(m.channel_id)
+        lines.append(format_window(prefix, WindowStats.of(m, status)))
+    line_rate = args.points / (time.process_time() - start)
+
+    aggregators = {}
+    exported = []
+    start = time.process_time()
+    for m in samples:
+        agg = aggregators.get(m.channel_id)
+        if agg is None:
+            agg = aggregators[m.channel_id] = ChannelAggregator()
+        for w in agg.add(m, status):
+            exported.append(format_window(prefixes[m.channel_id], w))
+    for cid, agg in aggregators.items():
+        exported.extend(format_window(prefixes[cid], w) for w in agg.drain())
+    agg_rate = args.points / (time.process_time() - start)
+
+    body = "\n".join(lines[: args.batch]).encode()
+    start = time.process_time()
+    compressed = gzip.compress(body, 1)
+    gzip_ms = (time.process_time() - start) * 1000
+
+    print(f"Point builder:        {point_rate:>10,.0f} points/s per core")
+    print(f"Direct line protocol: {line_rate:>10,.0f} points/s per core  ({line_rate / point_rate:.1f}x)")
+    print(
+        f"Aggregated:           {agg_rate:>10,.0f} samples/s per core, "
+        f"{len(exported):,} points exported ({args.points / max(len(exported), 1):.1f}x fewer)"
+    )
+    print(
+        f"Batch of {args.batch}: {len(body) / 1024:.0f} KiB raw, {len(compressed) / 1024:.0f} KiB gzip "
+        f"({len(body) / len(compressed):.1f}x), gzip {gzip_ms:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
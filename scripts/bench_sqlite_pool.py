@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Load test: channel-list read latency while slow alert-history queries run.
+
+Compares a single shared read connection (pool size 1, the old behaviour)
+with the read-only WAL connection pool used by the API.
+
+    python3 scripts/bench_sqlite_pool.py --alerts 500000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="iptv-bench-"), "bench.db")
+os.environ["SQLITE_PATH"] = DB_FILE
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+import sqlite3  # noqa: E402
+
+from db import sqlite as api_sqlite  # noqa: E402
+
+
+def build_db(n_channels: int, n_alerts: int):
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE channels (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, multicast_ip TEXT NOT NULL,
+            multicast_port INTEGER DEFAULT 1234, group_name TEXT DEFAULT 'default',
+            sort_order INTEGER DEFAULT 0, enabled BOOLEAN DEFAULT 1, sim_video TEXT,
+            expected_bitrate_kbps REAL DEFAULT 0, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, channel_id TEXT NOT NULL, channel_name TEXT,
+            alert_type TEXT NOT NULL, severity TEXT NOT NULL, status TEXT DEFAULT 'ACTIVE',
+            message TEXT, started_at DATETIME DEFAULT CURRENT_TIMESTAMP, resolved_at DATETIME,
+            ack_at DATETIME, thumbnail_path TEXT
+        );
+    """)
+    conn.executemany(
+        "INSERT INTO channels (id, name, multicast_ip, sort_order) VALUES (?, ?, ?, ?)",
+        [(f"ch{i:03d}", f"频道{i:03d}", f"239.1.{i // 250}.{i % 250}", i) for i in range(n_channels)],
+    )
+    types = ["BLACK_SCREEN", "FROZEN", "SILENT", "CC_ERROR", "OFFLINE"]
+    conn.executemany(
+        "INSERT INTO alerts (channel_id, alert_type, severity, status, started_at) "
+        "VALUES (?, ?, 'WARNING', 'RESOLVED', datetime('now', ?))",
+        (
+            (f"ch{random.randrange(n_channels):03d}", random.choice(types), f"-{random.randrange(10_000_000)} seconds")
+            for _ in range(n_alerts)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def channel_list_query() -> float:
+    t0 = time.perf_counter()
+    async with api_sqlite.read_db() as db:
+        async with db.execute(
+            "SELECT id, name, group_name, sort_order FROM channels WHERE enabled=1 ORDER BY sort_order ASC"
+        ) as cur:
+            await cur.fetchall()
+    return time.perf_counter() - t0
+
+
+async def slow_history_query():
+    # 无索引的深分页，模拟运维翻阅历史告警
+    async with api_sqlite.read_db() as db:
+        async with db.execute(
+            "SELECT * FROM alerts WHERE message IS NULL ORDER BY started_at DESC LIMIT 100 OFFSET 200000"
+        ) as cur:
+            await cur.fetchall()
+
+
+async def run_case(pool_size: int, concurrency: int, duration: float) -> list:
+    api_sqlite.SQLITE_READ_POOL_SIZE = pool_size
+    await api_sqlite.close_db()
+    await api_sqlite.init_db()
+    latencies: list = []
+    deadline = time.perf_counter() + duration
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            latencies.append(await channel_list_query())
+
+    async def history():
+        while time.perf_counter() < deadline:
+            await slow_history_query()
+
+    workers = [reader() for _ in range(concurrency)] + [history() for _ in range(max(1, concurrency // 16))]
+    await asyncio.gather(*workers)
+    await api_sqlite.close_db()
+    return latencies
+
+
+def report(label: str, latencies: list):
+    lat = sorted(x * 1000 for x in latencies)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    p999 = lat[min(len(lat) - 1, int(len(lat) * 0.999))]
+    stalled = sum(1 for x in lat if x > 100)
+    print(
+        f"{label:<18} n={len(lat):>6}  p50={statistics.median(lat):8.2f}ms  "
+        f"p99={p99:8.2f}ms  p99.9={p999:8.2f}ms  max={lat[-1]:8.2f}ms  >100ms={stalled}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=300)
+    parser.add_argument("--alerts", type=int, default=300_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"Building {DB_FILE} ({args.channels} channels, {args.alerts} alerts)...")
+    build_db(args.channels, args.alerts)
+
+    report("single connection", await run_case(1, args.concurrency, args.duration))
+    report(f"pool size {args.pool_size}", await run_case(args.pool_size, args.concurrency, args.duration))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
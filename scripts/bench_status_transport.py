@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Benchmark: live status delivery, Redis stream vs Unix-domain-socket relay.
+
+Both paths run in this process, doing what the probe publisher and one API
+process do per status batch:
+
+  redis  json.dumps -> XADD stream -> XREADGROUP -> json.loads
+  uds    msgpack.packb -> Unix socket -> msgpack.unpackb -> json.dumps
+         (the API still renders JSON text for WebSocket clients)
+
+Reports delivery latency (send to decoded in the consumer) and CPU per batch
+in this process. For the Redis path the Redis server's own CPU (INFO cpu
+delta) is reported separately, because it is saved entirely by the relay.
+
+    python3 scripts/bench_status_transport.py --batches 500 --rate 20 --channels 300
+    python3 scripts/bench_status_transport.py --transport uds
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "probe"))
+
+import msgpack  # noqa: E402
+import redis.asyncio as aioredis  # noqa: E402
+
+from config import REDIS_URL  # noqa: E402
+from storage.status_relay import StatusRelay  # noqa: E402
+
+BENCH_STREAM = "bench:status"
+STATUSES = ["NORMAL"] * 90 + ["WARNING"] * 7 + ["ALARM"] * 3
+
+
+def batch(n: int, seq: int, keyframe: bool) -> dict:
+    # 增量批次约 20% 频道有字段越过死区；关键帧为全部频道的全量字段
+    ids = range(n) if keyframe else random.sample(range(n), max(1, n // 5))
+    channels = []
+    for i in ids:
+        entry = {"channel_id": f"ch{i:03d}", "bitrate_kbps": round(random.uniform(2000, 12000), 1)}
+        if keyframe:
+            entry.update(
+                channel_name=f"频道{i:03d}", status=random.choice(STATUSES), is_black=0, is_frozen=0,
+                is_silent=0, cc_errors_per_sec=round(random.random(), 2), pcr_jitter_ms=round(random.uniform(0, 10), 2),
+                audio_rms=round(random.random() * 0.3, 5), video_brightness=round(random.uniform(30, 200), 1),
+                thumbnail_path=f"/data/thumbnails/ch{i:03d}.jpg",
+            )
+        channels.append(entry)
+    return {
+        "type": "channel_status_batch", "worker_id": 0, "epoch": 1, "seq": seq, "keyframe": keyframe,
+        "ts": time.time(), "channels": channels,
+    }
+
+
+async def _produce(args, send):
+    interval = 1.0 / args.rate
+    for seq in range(1, args.batches + 1):
+        msg = batch(args.channels, seq, keyframe=seq % 10 == 0)
+        msg["sent"] = time.perf_counter()
+        await send(msg)
+        await asyncio.sleep(interval)
+
+
+async def bench_redis(args) -> dict:
+    r = aioredis.from_url(REDIS_URL, decode_responses=True)
+    await r.delete(BENCH_STREAM)
+    await r.xgroup_create(BENCH_STREAM, "bench", id="$", mkstream=True)
+    cpu_before = await r.info("cpu")
+    latencies = []
+
+    async def consume():
+        while len(latencies) < args.batches:
+            resp = await r.xreadgroup("bench", "c", {BENCH_STREAM: ">"}, count=100, block=1000)
+            for _, entries in resp or []:
+                for _, fields in entries:
+                    msg = json.loads(fields["data"])
+                    latencies.append(time.perf_counter() - msg["sent"])
+                await r.xack(BENCH_STREAM, "bench", *(sid for sid, _ in entries))
+
+    async def send(msg):
+        payload = json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+        await r.xadd(BENCH_STREAM, {"data": payload}, maxlen=2000, approximate=True)
+
+    start = time.process_time()
+    consumer = asyncio.create_task(consume())
+    await _produce(args, send)
+    await asyncio.wait_for(consumer, timeout=10)
+    cpu = time.process_time() - start
+    cpu_after = await r.info("cpu")
+    await r.delete(BENCH_STREAM)
+    await r.aclose()
+    server = sum(cpu_after[k] - cpu_before[k] for k in ("used_cpu_sys", "used_cpu_user"))
+    return {"latencies": latencies, "cpu": cpu, "server_cpu": server}
+
+
+async def bench_uds(args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "status.sock")
+    relay = StatusRelay(path)
+    await relay.start()
+    reader, writer = await asyncio.open_unix_connection(path)
+    await asyncio.sleep(0.1)
+    latencies = []
+
+    async def consume():
+        while len(latencies) < args.batches:
+            header = await reader.readexactly(4)
+            msg = msgpack.unpackb(await reader.readexactly(int.from_bytes(header, "big")))
+            json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+            latencies.append(time.perf_counter() - msg["sent"])
+
+    async def send(msg):
+        relay.publish(msg)
+
+    start = time.process_time()
+    consumer = asyncio.create_task(consume())
+    await _produce(args, send)
+    await asyncio.wait_for(consumer, timeout=10)
+    cpu = time.process_time() - start
+    writer.close()
+    await relay.stop()
+    return {"latencies": latencies, "cpu": cpu, "server_cpu": 0.0}
+
+
+def report(name: str, result: dict, batches: int):
+    lat = sorted(result["latencies"])
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000  # noqa: E731
+    print(
+        f"{name:<6} latency p50 {p(0.5):6.3f} ms  p99 {p(0.99):6.3f} ms  max {lat[-1] * 1000:6.3f} ms | "
+        f"CPU {result['cpu'] / batches * 1000:6.3f} ms/batch in-process, "
+        f"{result['server_cpu'] / batches * 1000:6.3f} ms/batch redis-server"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=["redis", "uds", "both"], default="both")
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=20.0, help="batches per second")
+    parser.add_argument("--channels", type=int, default=300)
+    args = parser.parse_args()
+
+    if args.transport in ("uds", "both"):
+        report("uds", await bench_uds(args), args.batches)
+    if args.transport in ("redis", "both"):
+        try:
+            report("redis", await bench_redis(args), args.batches)
+        except (OSError, aioredis.ConnectionError) as e:
+            print(f"redis  skipped: {e}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark: WebSocket payload size and encode CPU, JSON vs msgpack.
+
+Compression is measured as permessage-deflate would apply it (raw deflate,
+context takeover per connection). Encode cost is per message, shared by all
+clients since each Frame is encoded once.
+
+    python3 scripts/bench_ws_codec.py --channels 300 --seconds 60
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from websocket import codec  # noqa: E402
+
+STATUSES = ["NORMAL"] * 90 + ["WARNING"] * 7 + ["ALARM"] * 3
+
+
+def full_entry(i: int) -> dict:
+    return {
+        "channel_id": f"ch{i:03d}",
+        "channel_name": f"频道{i:03d}",
+        "status": random.choice(STATUSES),
+        "bitrate_kbps": round(random.uniform(2000, 12000), 1),
+        "is_black": 0, "is_frozen": 0, "is_silent": 0, "is_clipping": 0, "is_mosaic": 0,
+        "mosaic_ratio": round(random.random() * 0.02, 4),
+        "is_stuttering": 0, "stutter_count": random.randrange(3),
+        "cc_errors_per_sec": round(random.random(), 2),
+        "pcr_jitter_ms": round(random.uniform(0, 10), 2),
+        "audio_rms": round(random.random() * 0.3, 5),
+        "video_brightness": round(random.uniform(30, 200), 1),
+        "thumbnail_path": f"/data/thumbnails/ch{i:03d}.jpg",
+        "updated_at": time.time(),
+    }
+
+
+def snapshot(n: int) -> dict:
+    return {"type": "batch_update", "channels": [full_entry(i) for i in range(n)], "ts": time.time()}
+
+
+def delta(n: int, seq: int) -> dict:
+    # 约 20% 频道有字段越过死区
+    changed = random.sample(range(n), max(1, n // 5))
+    return {
+        "stream": "status", "sid": f"{int(time.time() * 1000)}-{seq}",
+        "type": "channel_status_batch", "worker_id": 0, "epoch": 1, "seq": seq, "keyframe": False,
+        "ts": time.time(),
+        "channels": [
+            {"channel_id": f"ch{i:03d}", "bitrate_kbps": round(random.uniform(2000, 12000), 1)}
+            for i in changed
+        ],
+    }
+
+
+def run(label: str, messages: list, encoder):
+    deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+    raw = compressed = 0
+    t0 = time.process_time()
+    for msg in messages:
+        data = encoder(msg)
+        raw += len(data)
+    encode_cpu = time.process_time() - t0
+    for msg in messages:
+        data = encoder(msg)
+        compressed += len(deflate.compress(data) + deflate.flush(zlib.Z_SYNC_FLUSH))
+    return label, raw, compressed, encode_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=300)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(1)
+    snap = snapshot(args.channels)
+    per_worker = args.channels // args.workers
+    stream = [delta(per_worker, s) for s in range(args.seconds * args.workers)]
+
+    def json_text(m):
+        return json.dumps(m, ensure_ascii=False, separators=(",", ":")).encode()
+
+    assert codec.decode(codec.encode(snap))["channels"][0]["status"] == snap["channels"][0]["status"]
+
+    cases = (
+        ("connect snapshot, per message", [snap], 1),
+        (f"delta stream ({args.workers} workers), per second", stream, args.seconds),
+    )
+    for title, messages, per in cases:
+        print(f"\n{title}")
+        print(f"{'format':<10}{'raw bytes':>12}{'deflate bytes':>15}{'encode cpu ms':>15}")
+        for label, encoder in (("json", json_text), ("msgpack", codec.encode)):
+            _, raw, compressed, cpu = run(label, messages, encoder)
+            print(f"{label:<10}{raw // per:>12}{compressed // per:>15}{cpu * 1000 / per:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -69,7 +69,16 @@ async def init_db():
             enabled BOOLEAN DEFAULT 1,
             sim_video TEXT,
             expected_bitrate_kbps REAL DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            service_name TEXT,
+            provider_name TEXT,
+            event_name TEXT,
+            video_pid INTEGER,
+            audio_pid INTEGER,
+            pcr_pid INTEGER,
+            video_codec TEXT,
+            audio_codec TEXT,
+            metadata_updated_at DATETIME
         );
 
         CREATE TABLE IF NOT EXISTS alerts (
@@ -94,8 +103,33 @@ async def init_db():
             PRIMARY KEY (channel_id, alert_type)
         );
 
-        CREATE INDEX IF NOT EXISTS idx_alerts_channel ON alerts(channel_id, started_at DESC);
-        CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status, started_at DESC);
+        -- (过滤列, started_at) 升序索引可反向扫描，满足 ORDER BY started_at DESC, id DESC 的游标分页
+        DROP INDEX IF EXISTS idx_alerts_channel;
+        DROP INDEX IF EXISTS idx_alerts_status;
+        CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts(started_at);
+        CREATE INDEX IF NOT EXISTS idx_alerts_channel_time ON alerts(channel_id, started_at);
+        CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts(status, started_at);
+        CREATE INDEX IF NOT EXISTS idx_alerts_type_time ON alerts(alert_type, started_at);
+        CREATE INDEX IF NOT EXISTS idx_alerts_open ON alerts(channel_id, alert_type, status);
+        CREATE INDEX IF NOT EXISTS idx_alerts_resolved ON alerts(resolved_at) WHERE status = 'RESOLVED';
+
+        CREATE TABLE IF NOT EXISTS alert_stats_daily (
+            day TEXT NOT NULL,
+            group_name TEXT NOT NULL,
+            alert_type TEXT NOT NULL,
+            opened INTEGER DEFAULT 0,
+            resolved INTEGER DEFAULT 0,
+            resolve_seconds REAL DEFAULT 0,
+            PRIMARY KEY (day, group_name, alert_type)
+        );
+
+        CREATE TABLE IF NOT EXISTS channel_stats_daily (
+            day TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            alerts INTEGER DEFAULT 0,
+            outage_seconds REAL DEFAULT 0,
+            PRIMARY KEY (day, channel_id)
+        );
     """)
 
     idx = 0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Rewrite channel_metrics points from the old schema to the current one.
+
+Old points carry channel_name and status tags, so every rename or status flip
+started a new series. The current schema tags only channel_id and stores the
+status as an integer field, status_code (0 NORMAL, 1 WARNING, 2 ALARM,
+3 OFFLINE).
+
+Each time chunk is rewritten server-side with a Flux to(). The old-schema
+points in that chunk are then removed with the delete API, which keeps disk
+usage bounded. The rewrite is idempotent, so an interrupted run can simply be
+restarted.
+
+    python3 scripts/migrate_influx_schema.py --chunk-hours 1
+    python3 scripts/migrate_influx_schema.py --dry-run
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "probe"))
+
+from influxdb_client import InfluxDBClient  # noqa: E402
+
+from config import INFLUXDB_BUCKET, INFLUXDB_ORG, INFLUXDB_TOKEN, INFLUXDB_URL  # noqa: E402
+
+STATUSES = ("NORMAL", "WARNING", "ALARM", "OFFLINE")
+OLD_SCHEMA = 'r._measurement == "channel_metrics" and exists r.status'
+
+
+def _ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def earliest_old_point(client: InfluxDBClient, bucket: str):
+    flux = f"""
+from(bucket: "{bucket}")
+  |> range(start: 0)
+  |> filter(fn: (r) => {OLD_SCHEMA} and r._field == "bitrate_kbps")
+  |> first()
+"""
+    times = [r.get_time() for t in client.query_api().query(flux) for r in t.records]
+    return min(times) if times else None
+
+
+def rewrite_chunk(client: InfluxDBClient, bucket: str, start: datetime, stop: datetime) -> int:
+    flux = f"""
+data = from(bucket: "{bucket}")
+  |> range(start: {_ts(start)}, stop: {_ts(stop)})
+  |> filter(fn: (r) => {OLD_SCHEMA})
+codes = data
+  |> filter(fn: (r) => r._field == "bitrate_kbps")
+  |> map(fn: (r) => ({{r with _field: "status_code",
+      _value: if r.status == "WARNING" then 1 else if r.status == "ALARM" then 2
+        else if r.status == "OFFLINE" then 3 else 0}}))
+union(tables: [data, codes])
+  |> drop(columns: ["status", "channel_name"])
+  |> to(bucket: "{bucket}", org: "{INFLUXDB_ORG}", tagColumns: ["channel_id"])
+  |> keep(columns: ["_time"])
+  |> group()
+  |> count(column: "_time")
+"""
+    rows = [r.values.get("_time") for t in client.query_api().query(flux) for r in t.records]
+    return int(rows[0]) if rows else 0
+
+
+def delete_chunk(client: InfluxDBClient, bucket: str, start: datetime, stop: datetime):
+    # The delete API range includes stop, Flux range() does not: stop 1ns short
+    # so points on a chunk boundary survive until the next chunk rewrites them.
+    last = (stop.replace(microsecond=0) - timedelta(seconds=1)).strftime("%Y-%m-%dT%H:%M:%S.999999999Z")
+    api = client.delete_api()
+    for status in STATUSES:
+        api.delete(
+            _ts(start), last, f'_measurement="channel_metrics" AND status="{status}"',
+            bucket=bucket, org=INFLUXDB_ORG,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", default=INFLUXDB_BUCKET)
+    parser.add_argument("--chunk-hours", type=float, default=1.0)
+    parser.add_argument("--dry-run", action="store_true", help="only report the range to migrate")
+    args = parser.parse_args()
+
+    with InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG, timeout=600_000) as client:
+        first = earliest_old_point(client, args.bucket)
+        if first is None:
+            print(f"✅ No old-schema points in {args.bucket}, nothing to do")
+            return
+        chunk = timedelta(hours=args.chunk_hours)
+        start = first.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        end = datetime.now(timezone.utc) + timedelta(minutes=1)
+        chunks = int((end - start) / chunk) + 1
+        print(f"Migrating {args.bucket} from {_ts(start)} in {chunks} chunks of {args.chunk_hours}h")
+        if args.dry_run:
+            return
+
+        total = 0
+        while start < end:
+            stop = min(start + chunk, end)
+            t0 = time.monotonic()
+            rows = rewrite_chunk(client, args.bucket, start, stop)
+            delete_chunk(client, args.bucket, start, stop)
+            total += rows
+            print(f"  {_ts(start)} .. {_ts(stop)}: {rows} rows rewritten ({time.monotonic() - t0:.1f}s)")
+            start = stop
+        print(f"✅ Migrated {total} rows in {args.bucket}")
+
+
+if __name__ == "__main__":
+    main()